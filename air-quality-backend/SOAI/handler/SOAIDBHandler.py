@@ -1,12 +1,16 @@
 from .SOAIDataHandler import SOAIDataHandler
 from .SOAIDiskHandler import SOAIDiskHandler
+from .SOAIQueryCache import SOAIQueryCache
+from .SOAIInfluxDecoder import SOAIInfluxDecoder
+from .SOAIParquetDataset import SOAIParquetDataset
+from SOAI.tools.SOAIChunkScheduler import SOAIChunkScheduler
 
-import numpy as np
 import pandas as pd
 from influxdb import DataFrameClient
-import time
 import datetime
 import os
+import queue
+import threading
 import logging
 
 logger = logging.getLogger()
@@ -18,123 +22,356 @@ class SOAIDBHandler(SOAIDataHandler):
     ## Constructor
     #
     # Sets the permission to use the database to False by default
-    def __init__(self):
+    # @param compactDtypes If True the loaded data uses compact dtypes (see SOAIDataHandler._fCompactDtypes)
+    # @param rulesOpenAir Optional list of rules of valid OpenAir data, by default SOAIDataHandler.RULES_OPENAIR
+    # @param rulesLanuv Optional list of rules of valid Lanuv data, by default SOAIDataHandler.RULES_LANUV
+    def __init__(self, compactDtypes=False, rulesOpenAir=None, rulesLanuv=None):
+        super().__init__(rulesOpenAir, rulesLanuv)
         self.permissionDB = False
+        self.compactDtypes = compactDtypes
+        self.clientPool = queue.LifoQueue()
+        self.poolLock = threading.Lock()
+        self.poolStats = {"created": 0, "reused": 0, "discarded": 0, "queries": 0}
+        self.poolSize = 0
+        self.nClients = 0
+        self.chunkScheduler = SOAIChunkScheduler()
+        self.queryCache = None
+
+    ## Sets up the clients to a database. has to be called before a query is performed.
+    #
+    # The clients are created on demand, kept open (HTTP keep-alive) and reused for all following queries.
+    # @param poolSize Maximal number of clients, i.e. of queries which run at the same time
+    # @param timeout Timeout of a request to the database in seconds
+    # @param retries Number of retries of a request if the connection fails (0 retries forever)
+    # @param parallelism Number of chunks of a long time range which are loaded at the same time
+    # @param queryRate Maximal number of chunk queries per second
+    # @param cachePath Folder of the query cache for closed time blocks. The cache is disabled by default (None) and
+    #                  enabled by this parameter or the environment variable OAC_CACHE_PATH.
+    # @param cacheSize Maximal size of the query cache in MB
+    # @param cacheBlock Size of the time blocks of the query cache
+    # @param cacheSettle Time after the end of a block until it is stored in the query cache. Data which arrives late
+    #                    (see FETCH_OVERLAP_HOURS) would be missing in a block which is stored too early, so it has to
+    #                    be at least as long as the overlap of the incremental fetch.
+    def fSetupDB(self, host=os.environ.get("OAC_HOST"), port=os.environ.get("OAC_PORT"), database=os.environ.get("OAC_DB"),
+                 poolSize=int(os.environ.get("OAC_POOL_SIZE", 2)), timeout=float(os.environ.get("OAC_TIMEOUT", 60)),
+                 retries=int(os.environ.get("OAC_RETRIES", 3)), parallelism=int(os.environ.get("OAC_PARALLELISM", 2)),
+                 queryRate=float(os.environ.get("OAC_QUERY_RATE", 0.2)),
+                 cachePath=os.environ.get("OAC_CACHE_PATH"),
+                 cacheSize=int(os.environ.get("OAC_CACHE_SIZE", 512)), cacheBlock="1d",
+                 cacheSettle=os.environ.get("OAC_CACHE_SETTLE", "6h")):
+        self.fCloseDB()
+
+        # Every chunk which is loaded at the same time needs its own client
+        poolSize = max(poolSize, parallelism)
+        self.chunkScheduler = SOAIChunkScheduler(parallelism, queryRate)
+        self.queryCache = SOAIQueryCache(cachePath, cacheSize * 1024 ** 2) if cachePath else None
+        self.cacheBlock = pd.Timedelta(cacheBlock)
+        self.cacheSettle = pd.Timedelta(cacheSettle)
 
-    ## Sets up a client to a database. has to be called before a query is performed.
-    def fSetupDB(self, host=os.environ.get("OAC_HOST"), port=os.environ.get("OAC_PORT"), database=os.environ.get("OAC_DB")):
         self.host = host
         self.port = port
         self.database = database
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.retries = retries
 
         self.permissionDB = True
 
+    ## Closes all idle clients to the database
+    def fCloseDB(self):
+        while True:
+            try:
+                self.clientPool.get_nowait().close()
+            except queue.Empty:
+                break
+            with self.poolLock:
+                self.nClients -= 1
+
+    ## Returns the statistics of the client pool
+    #
+    # @returns Dictionary with the number of created, reused and discarded clients and the number of queries
+    def fGetPoolStats(self):
+        with self.poolLock:
+            stats = dict(self.poolStats)
+        stats["idle"] = self.clientPool.qsize()
+        return stats
+
+    ## Takes a client from the pool. A new client is created if all clients are in use and the pool is not full.
+    def __fAcquireClient(self):
+        try:
+            client = self.clientPool.get_nowait()
+            with self.poolLock:
+                self.poolStats["reused"] += 1
+            return client
+        except queue.Empty:
+            pass
+
+        with self.poolLock:
+            create = self.nClients < self.poolSize
+            if create:
+                self.nClients += 1
+                self.poolStats["created"] += 1
+
+        if create:
+            logger.debug(f"Create client {self.nClients} of {self.poolSize} to the database.")
+            return DataFrameClient(host=self.host, port=self.port, database=self.database,
+                                   timeout=self.timeout, retries=self.retries)
+
+        client = self.clientPool.get()
+        with self.poolLock:
+            self.poolStats["reused"] += 1
+        return client
+
+    ## Returns a client to the pool. A client whose query failed is closed instead, its connection may be broken.
+    def __fReleaseClient(self, client, failed=False):
+        if failed:
+            client.close()
+            with self.poolLock:
+                self.nClients -= 1
+                self.poolStats["discarded"] += 1
+        else:
+            self.clientPool.put(client)
+
     ## Query the databse. Only word if fSetupDB was called.
-    def __fQueryInflux(self, query: str) -> dict:
+    #
+    # @param raw If True the body of the response (JSON with timestamps in ms) is returned instead of data frames
+    def __fQueryInflux(self, query: str, raw=False):
         if self.permissionDB is True:
             logger.debug(f"Perform the query {query} to the database.")
 
-            client = DataFrameClient(host=self.host, port=self.port, database=self.database)
-            result = client.query(query)
-            client.close()
+            client = self.__fAcquireClient()
+            try:
+                if raw:
+                    result = client.request(url="query", method="GET", params={"q": query, "db": self.database, "epoch": "ms"},
+                                            expected_response_code=200).content
+                else:
+                    result = client.query(query)
+            except Exception:
+                self.__fReleaseClient(client, failed=True)
+                raise
+            self.__fReleaseClient(client)
+
+            with self.poolLock:
+                self.poolStats["queries"] += 1
         else:
             logger.error("No permission to connect to the database.")
             result = None
 
         return result
 
-    ## Get the data for Lanuv sensors in the time frame now()-dStart to now()-dEnd
-    def __fGetLanuvData(self, dStart, dEnd=0):
-        lanuv_dict = self.__fQueryInflux("SELECT station, NO, OZON, NO2 AS no2, "
-                                         "WRI AS wr, WGES AS wg, LTEM AS temp, "
-                                         "WTIME as wtime, RFEU as hum "
-                                         "FROM lanuv_f2 "
-                                         f"WHERE time >= now() - "f"{dStart}d "
-                                         "AND time <= now() - "f"{dEnd}d ")
-
-        if len(lanuv_dict) == 0:
-            logger.error(f"No data was found for time range now-{dStart} - now-{dEnd}. Return empty data frame.")
+    ## Returns the statistics (rows, latency) of the chunks of the last fGetOpenAir or fGetLanuv call
+    def fGetChunkStats(self):
+        return list(self.chunkScheduler.stats)
+
+    ## Splits the time frame now()-dStart to now() into chunks of dStep days, the oldest chunk first
+    def __fChunks(self, dStart, dStep):
+        if dStep > 31:
+            logger.error("In order not to overuse the data base the step size is set to a monthly frequency.")
+            dStep = 31
+
+        return [(d, max(d - dStep, 0)) for d in range(dStart, 0, -dStep)]
+
+    ## Returns the condition of a query for the time frame now()-dStart to now()-dEnd
+    def __fRelativeTimeCondition(self, dStart, dEnd=0):
+        return f"time >= now() - {dStart}d AND time <= now() - {dEnd}d"
+
+    ## Returns the condition of a query for all data since the timestamp tStart (and before tEnd)
+    #
+    # @param tStart Timestamp (e.g. pandas.Timestamp), timestamps without time zone are interpreted as UTC
+    # @param tEnd Optional timestamp, the data before tEnd is selected
+    def __fAbsoluteTimeCondition(self, tStart, tEnd=None):
+        def fFormat(t):
+            t = pd.Timestamp(t)
+            if t.tzinfo is None:
+                t = t.tz_localize("UTC")
+            return t.tz_convert('UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        if tEnd is None:
+            return f"time >= '{fFormat(tStart)}'"
+        return f"time >= '{fFormat(tStart)}' AND time < '{fFormat(tEnd)}'"
+
+    ## Returns the statistics (hits, misses, size) of the query cache
+    def fGetCacheStats(self):
+        return self.queryCache.fGetStats() if self.queryCache is not None else None
+
+    ## Get the data in the time frame now()-dStart to now()-dEnd, closed time blocks are taken from the query cache
+    #
+    # The time frame is split into blocks of cacheBlock. A block is closed once its end is cacheSettle in the past.
+    # Consecutive closed blocks which are not in the cache are loaded with one query and stored. The newer, open
+    # blocks are always loaded from the database and never stored.
+    # The start and end of the time frame are aligned to the granularity, so the time frames of consecutive chunks
+    # do not overlap.
+    # @param measurement Name of the measurement, used as key of the cache
+    # @param fLoad Function which loads the data for a time condition and returns a data frame with a timestamp column
+    # @param shift Shift of the timestamps of the result with respect to the timestamps in the database
+    # @param now Current time (UTC), by default the time of the call
+    def __fGetCachedData(self, measurement, fLoad, dStart, dEnd=0, granularity="1h", shift=pd.Timedelta(0), now=None):
+        if now is None:
+            now = pd.Timestamp.now(tz="UTC")
+        tStart = (now - pd.Timedelta(days=dStart)).floor(granularity)
+        tEnd = (now - pd.Timedelta(days=dEnd)).floor(granularity) if dEnd > 0 else now + pd.Timedelta(granularity)
+        tClosed = now - self.cacheSettle
+
+        def fBlock(df, bStart, bEnd):
+            if len(df) == 0:
+                return df
+            t = df["timestamp"] - shift
+            return df[(t >= bStart) & (t < bEnd)]
+
+        blocks = {}
+        missing = []
+        b = tStart.floor(self.cacheBlock)
+        while b < tEnd and b + self.cacheBlock <= tClosed:
+            blocks[b] = self.queryCache.fGet(measurement, granularity, b)
+            if blocks[b] is None:
+                missing.append(b)
+            b += self.cacheBlock
+
+        # Load the runs of consecutive missing blocks with one query each
+        while len(missing) > 0:
+            run = 1
+            while run < len(missing) and missing[run] == missing[0] + run * self.cacheBlock:
+                run += 1
+
+            df = fLoad(self.__fAbsoluteTimeCondition(missing[0], missing[0] + run * self.cacheBlock))
+            for bStart in missing[:run]:
+                blocks[bStart] = fBlock(df, bStart, bStart + self.cacheBlock)
+                self.queryCache.fPut(measurement, granularity, bStart, blocks[bStart])
+            missing = missing[run:]
+
+        # The open blocks
+        if b < tEnd:
+            blocks[b] = fLoad(self.__fAbsoluteTimeCondition(b))
+
+        frames = [blocks[b] for b in sorted(blocks) if len(blocks[b]) > 0]
+        if len(frames) == 0:
             return pd.DataFrame()
 
-        # make clean data frame
-        df_lanuv = lanuv_dict['lanuv_f2'] \
-            .rename_axis('timestamp').reset_index()
+        df = pd.concat(frames, ignore_index=True, sort=False)
+        return fBlock(df, tStart, tEnd).reset_index(drop=True)
+
+    ## Get the data for Lanuv sensors in the time frame now()-dStart to now()-dEnd
+    #
+    # @param timeCondition Optional condition on the time which replaces the time frame given by dStart and dEnd
+    def __fGetLanuvData(self, dStart, dEnd=0, timeCondition=None):
+        if timeCondition is None:
+            timeCondition = self.__fRelativeTimeCondition(dStart, dEnd)
+
+        body = self.__fQueryInflux("SELECT station, NO, OZON, NO2 AS no2, "
+                                   "WRI AS wr, WGES AS wg, LTEM AS temp, "
+                                   "WTIME as wtime, RFEU as hum "
+                                   "FROM lanuv_f2 "
+                                   f"WHERE {timeCondition} ", raw=True)
+
+        # decode the response with timestamps in ms to one data frame
+        df_lanuv = SOAIInfluxDecoder().fDecode(body)
+
+        if len(df_lanuv) == 0:
+            logger.error(f"No data was found for {timeCondition}. Return empty data frame.")
+            return pd.DataFrame()
 
         df_lanuv = df_lanuv[df_lanuv.timestamp.dt.minute == 0]
         df_lanuv = df_lanuv[df_lanuv.timestamp.dt.second == 0]
 
-        df_lanuv = df_lanuv.assign(timestamp=pd.to_datetime(df_lanuv.timestamp.astype(np.int64) // 10 ** 6, unit='ms', utc=True))
-        return df_lanuv
+        return df_lanuv.reset_index(drop=True)
 
     ## Get the data for OpenAir Cologne sensors in the time frame now()-dStart to now()-dEnd
-    def __fGetOpenAirData(self, dStart, dEnd=0, granularity="1h"):
-        openair_dict = self.__fQueryInflux("SELECT "
-                                           "median(hum) AS hum, median(pm10) AS pm10, "
-                                           "median(pm25) AS pm25, median(r1) AS r1, "
-                                           "median(r2) AS r2, median(rssi) AS rssi, "
-                                           "median(temp) AS temp "
-                                           "FROM all_openair "
-                                           f"WHERE time >= now() - "f"{dStart}d "
-                                           "AND time <= now() - "f"{dEnd}d "
-                                           f"GROUP BY feed, time({granularity}) fill(-1)")
-        if len(openair_dict) == 0:
-            logger.error(f"No data was found for time range now-{dStart} - now-{dEnd}. Return empty data frame.")
+    #
+    # @param timeCondition Optional condition on the time which replaces the time frame given by dStart and dEnd
+    def __fGetOpenAirData(self, dStart, dEnd=0, granularity="1h", timeCondition=None):
+        if timeCondition is None:
+            timeCondition = self.__fRelativeTimeCondition(dStart, dEnd)
+
+        body = self.__fQueryInflux("SELECT "
+                                   "median(hum) AS hum, median(pm10) AS pm10, "
+                                   "median(pm25) AS pm25, median(r1) AS r1, "
+                                   "median(r2) AS r2, median(rssi) AS rssi, "
+                                   "median(temp) AS temp "
+                                   "FROM all_openair "
+                                   f"WHERE {timeCondition} "
+                                   f"GROUP BY feed, time({granularity}) fill(-1)", raw=True)
+
+        # decode all feeds at once to one data frame with feed as categorical column
+        df_openair = SOAIInfluxDecoder(tag="feed").fDecode(body)
+
+        if len(df_openair) == 0:
+            logger.error(f"No data was found for {timeCondition}. Return empty data frame.")
             return pd.DataFrame()
 
-        # clean dictionary keys
-        openair_dict_clean = {k[1][0][1]: openair_dict[k]
-                              for k in openair_dict.keys()}
-
-        # initialize empty data frame
-        df_openair = pd.DataFrame()
-
-        # fill data frame with data from all frames
-        # OPTIONAL: replace for-loop with map-reduce
-        for feed in list(openair_dict_clean.keys()):
-            df_feed = pd.DataFrame.from_dict(openair_dict_clean[feed]) \
-                .assign(feed=feed) \
-                .rename_axis('timestamp').reset_index()
-            df_openair = df_openair.append(df_feed)
-
         # shift timestamp one hour into the future
         df_openair_shifted = df_openair \
             .assign(timestamp=lambda d: d.timestamp + pd.Timedelta(granularity))
 
         return df_openair_shifted
 
+    ## Load data of the OpenAirCologne sensors from the DB chunk by chunk
+    #
+    # The chunks are yielded as soon as they arrive, oldest chunk first, so only a few chunks are in memory at once.
+    # @param dStart The amount of days in the past to start (interpreted now() - dStart)
+    # @param dStep The amount of days which is fetched at once from the DB
+    # @param granularity Granularity of the data as string (e.g. 1h or 5m)
+    # @returns Generator of checked data frames with timestamp as index. Chunks without data are skipped.
+    def fIterOpenAir(self, dStart, dStep=31, granularity="1h"):
+        chunks = self.__fChunks(dStart, dStep)
+        logger.info(f"Load from DB from now-{dStart}d to now-0d in {len(chunks)} chunks.")
+
+        def fLoadChunk(chunk):
+            if self.queryCache is None:
+                return self.__fGetOpenAirData(chunk[0], chunk[1], granularity)
+            return self.__fGetCachedData("all_openair", lambda condition: self.__fGetOpenAirData(None, granularity=granularity, timeCondition=condition),
+                                         chunk[0], chunk[1], granularity, shift=pd.Timedelta(granularity))
+
+        for df in self.chunkScheduler.fIter(chunks, fLoadChunk):
+            if len(df) == 0:
+                continue
+
+            # Check the OpenAir data
+            df = self._fCheckOpenAir(df)
+            if len(df) > 0:
+                yield df.set_index("timestamp", drop=True)
+
+    ## Load data of the Lanuv sensors from the DB chunk by chunk
+    #
+    # @param dStart The amount of days in the past to start (interpreted now() - dStart)
+    # @param dStep The amount of days which is fetched at once from the DB
+    # @returns Generator of checked data frames with timestamp as index. Chunks without data are skipped.
+    def fIterLanuv(self, dStart, dStep=31):
+        chunks = self.__fChunks(dStart, dStep)
+        logger.info(f"Load from DB from now-{dStart}d to now-0d in {len(chunks)} chunks.")
+
+        def fLoadChunk(chunk):
+            if self.queryCache is None:
+                return self.__fGetLanuvData(chunk[0], chunk[1])
+            return self.__fGetCachedData("lanuv_f2", lambda condition: self.__fGetLanuvData(None, timeCondition=condition),
+                                         chunk[0], chunk[1], "1h")
+
+        for df in self.chunkScheduler.fIter(chunks, fLoadChunk):
+            if len(df) == 0:
+                continue
+
+            # Check the Lanuv data
+            df = self._fCheckLanuv(df)
+            if len(df) > 0:
+                yield df.set_index("timestamp", drop=True)
+
     ## Load data of the OpenAirCologne sensors from the DB
     #
     # @param dStart The amount of days in the past to start (interpreted now() - dStart)
     # @param dStep The amount of days which is fetched at once from the DB
     # @param granularity Granularity of the data as string (e.g. 1h or 5m)
     def fGetOpenAir(self, dStart, dStep=31, granularity="1h"):
-        if dStep > 31:
-            logger.error("In order not to overuse the data base the step size is set to a monthly frequency.")
-            dStep = 31
+        frames = list(self.fIterOpenAir(dStart, dStep, granularity))
 
-        df = pd.DataFrame()
-        for d in range(dStart, 0, -dStep):
-
-            if (d - dStep) >= 0:
-                logger.info(f"Load from DB from now-{d}d to now-{d-dStep}d.")
-                df = df.append(self.__fGetOpenAirData(d, d - dStep, granularity), ignore_index=True)
-            else:
-                logger.info(f"Load from DB from now-{d}d to now-0d.")
-                df = df.append(self.__fGetOpenAirData(d, 0, granularity), ignore_index=True)
-                break
-
-            # Be nice to the DB
-            time.sleep(10)
-
-        # Check the OpenAir data
-        df = self._fCheckOpenAir(df)
+        if len(frames) == 0:
+            logger.error(f"No data was found for the last {dStart} days.")
+            return pd.DataFrame()
 
-        if df is None:
-            logger.error("No data was found for the last {dStart} days.")
-        else:
-            logger.info(f"Loaded {len(df)} rows for the last {dStart} days.")
+        df = pd.concat(frames, sort=False)
+        logger.info(f"Loaded {len(df)} rows for the last {dStart} days.")
 
-        df = df.set_index("timestamp", drop=True)
+        # The categories of the chunks differ, so the concatenated sensorID has to be converted again
+        if self.compactDtypes:
+            df = self._fCompactDtypes(df)
 
         return df
 
@@ -143,69 +380,130 @@ class SOAIDBHandler(SOAIDataHandler):
     # @param dStart The amount of days in the past to start (interpreted now() - dStart)
     # @param dStep The amount of days which is fetched at once from the DB
     def fGetLanuv(self, dStart, dStep=31):
-        if dStep > 31:
-            logger.error("In order not to overuse the data base the step size is set to a monthly frequency.")
-            dStep = 31
+        frames = list(self.fIterLanuv(dStart, dStep))
 
-        df = pd.DataFrame()
-        for d in range(dStart, 0, -dStep):
-            if (d - dStep) >= 0:
-                logger.info(f"Load from DB from now-{d}d to now-{d-dStep}d.")
-                df = df.append(self.__fGetLanuvData(d, d - dStep), ignore_index=True)
-            else:
-                logger.info(f"Load from DB from now-{d}d to now-0d.")
-                df = df.append(self.__fGetLanuvData(d, 0), ignore_index=True)
-                break
+        if len(frames) == 0:
+            logger.error(f"No data was found for the last {dStart} days.")
+            return pd.DataFrame()
+
+        df = pd.concat(frames, sort=False)
+        logger.info(f"Loaded {len(df)} rows for the last {dStart} days.")
+
+        if self.compactDtypes:
+            df = self._fCompactDtypes(df)
+
+        return df
+
+    ## Load data of the OpenAirCologne sensors from the DB which is newer than a given timestamp
+    #
+    # Only the data since tStart is queried, which allows to update already loaded data incrementally.
+    # @param tStart Timestamp of the first value to load. The timestamps refer to the end of the interval (see __fGetOpenAirData).
+    # @param granularity Granularity of the data as string (e.g. 1h or 5m)
+    # @returns Checked data frame with timestamp as index. Empty data frame if no data is found.
+    def fGetOpenAirSince(self, tStart, granularity="1h"):
+        # The timestamps are shifted to the end of the interval, the query needs the start of the interval
+        timeCondition = self.__fAbsoluteTimeCondition(pd.Timestamp(tStart) - pd.Timedelta(granularity))
+        logger.info(f"Load from DB with {timeCondition}.")
+
+        df = self.__fGetOpenAirData(None, granularity=granularity, timeCondition=timeCondition)
+        if len(df) == 0:
+            return df
+
+        df = self._fCheckOpenAir(df)
+        logger.info(f"Loaded {len(df)} rows since {tStart}.")
 
-            # Be nice to the DB
-            time.sleep(10)
+        return df.set_index("timestamp", drop=True)
+
+    ## Load data of the Lanuv sensors from the DB which is newer than a given timestamp
+    #
+    # @param tStart Timestamp of the first value to load
+    # @returns Checked data frame with timestamp as index. Empty data frame if no data is found.
+    def fGetLanuvSince(self, tStart):
+        timeCondition = self.__fAbsoluteTimeCondition(tStart)
+        logger.info(f"Load from DB with {timeCondition}.")
+
+        df = self.__fGetLanuvData(None, timeCondition=timeCondition)
+        if len(df) == 0:
+            return df
 
-        # Check the Lanuv data
         df = self._fCheckLanuv(df)
+        logger.info(f"Loaded {len(df)} rows since {tStart}.")
 
-        if df is None:
-            logger.error("No data was found for the last {dStart} days.")
-        else:
-            logger.info(f"Loaded {len(df)} rows for the last {dStart} days.")
+        return df.set_index("timestamp", drop=True)
+
+    ## Returns the time condition for the last complete buckets
+    #
+    # @param granularity Size of a bucket as string (e.g. 1h)
+    # @param nBuckets Number of buckets before the current, open bucket
+    # @param completeOnly If False the current, open bucket is included
+    def __fLatestBucketsCondition(self, granularity, nBuckets, completeOnly):
+        tEnd = pd.Timestamp.now(tz="UTC").floor(granularity)
+        tStart = tEnd - nBuckets * pd.Timedelta(granularity)
+        return self.__fAbsoluteTimeCondition(tStart, tEnd if completeOnly else None)
+
+    ## Keeps the newest row of every sensor
+    def __fLatestPerSensor(self, df):
+        return df.drop_duplicates("sensorID", keep="last").set_index("timestamp", drop=True)
+
+    ## Load the latest bucket of every OpenAirCologne sensor from the DB
+    #
+    # Only the last nBuckets buckets are aggregated (median per bucket like in fGetOpenAir) and transferred,
+    # so the size of the result does not depend on a look-back window. Buckets filled with -1 are discarded
+    # by the check, in this case the newest valid bucket is taken.
+    # @param granularity Granularity of the data as string (e.g. 1h or 5m)
+    # @param nBuckets Number of buckets which are queried
+    # @param completeOnly If True the current, not yet complete bucket is not queried
+    # @returns Checked data frame with timestamp as index and one row per sensor. Empty data frame if no data is found.
+    def fGetOpenAirLatest(self, granularity="1h", nBuckets=2, completeOnly=True):
+        timeCondition = self.__fLatestBucketsCondition(granularity, nBuckets, completeOnly)
+        logger.debug(f"Load latest buckets from DB with {timeCondition}.")
 
-        df = df.set_index("timestamp", drop=True)
+        df = self.__fGetOpenAirData(None, granularity=granularity, timeCondition=timeCondition)
+        if len(df) == 0:
+            return df
 
-        return df
+        return self.__fLatestPerSensor(self._fCheckOpenAir(df))
+
+    ## Load the latest value of every Lanuv station from the DB
+    #
+    # @param nHours Number of hours which are queried
+    # @returns Checked data frame with timestamp as index and one row per station. Empty data frame if no data is found.
+    def fGetLanuvLatest(self, nHours=3):
+        timeCondition = self.__fLatestBucketsCondition("1h", nHours, False)
+        logger.debug(f"Load latest values from DB with {timeCondition}.")
+
+        df = self.__fGetLanuvData(None, timeCondition=timeCondition)
+        if len(df) == 0:
+            return df
+
+        return self.__fLatestPerSensor(self._fCheckLanuv(df))
 
     ## Update the data on the disk
     #
+    # The new data is loaded chunk by chunk and written to the datasets partitioned by year and month
+    # (see SOAIParquetDataset), so the memory is bounded by one chunk and only the touched months are written.
     # @param folderOpenAir Folder to OpenAir data
     # @param folderLanuv Folder to Lanuv data
-    def fUpdateDiskData(self, folderOpenAir=os.environ.get("SOAI") + "/data/openair", folderLanuv=os.environ.get("SOAI") + "/data/lanuv"):
+    # @param dStartEmpty The amount of days in the past which are loaded into a folder without data
+    def fUpdateDiskData(self, folderOpenAir=os.environ.get("SOAI") + "/data/openair", folderLanuv=os.environ.get("SOAI") + "/data/lanuv",
+                        dStartEmpty=int(os.environ.get("OAC_UPDATE_START_DAYS", 365))):
         diskHandler = SOAIDiskHandler()
 
-        dfOpenAir = diskHandler.fGetOpenAir(os.environ.get("SOAI") + "/data/openair/", selectValidData=True)
-        dfLanuv = diskHandler.fGetLanuv(os.environ.get("SOAI") + "/data/lanuv/")
-
-        day1 = dfOpenAir.index.max().to_pydatetime().replace(tzinfo=None)
-        day2 = datetime.datetime.now()
-        days = (day2 - day1).days
-        dfOpenAir_fromDB = self.fGetOpenAir(dStart=days)
-
-        day1 = dfLanuv.index.max().to_pydatetime().replace(tzinfo=None)
-        day2 = datetime.datetime.now()
-        days = (day2 - day1).days
-        dfLanuv_fromDB = self.fGetLanuv(dStart=days)
+        days = self.__fDaysSince(diskHandler.fGetLatestTimestamp(folderOpenAir + "/"), dStartEmpty, folderOpenAir)
+        self.__fWriteChunks(self.fIterOpenAir(dStart=days), SOAIParquetDataset(folderOpenAir))
 
-        i = 0
-        while True:
-            if os.path.exists(folderOpenAir + f"/df_openair{i}.parquet"):
-                i += 1
-            else:
-                break
-
-        dfOpenAir_fromDB.reset_index().to_parquet(folderOpenAir + f"/df_openair{i}.parquet")
+        days = self.__fDaysSince(diskHandler.fGetLatestTimestamp(folderLanuv + "/"), dStartEmpty, folderLanuv)
+        self.__fWriteChunks(self.fIterLanuv(dStart=days), SOAIParquetDataset(folderLanuv))
 
-        i = 0
-        while True:
-            if os.path.exists(folderLanuv + f"/df_lanuv{i}.parquet"):
-                i += 1
-            else:
-                break
+    ## Returns the number of full days since the newest timestamp of a folder, dStartEmpty if the folder has no data
+    def __fDaysSince(self, latest, dStartEmpty, folder):
+        if latest is None:
+            logger.warning(f"No data was found in {folder}. Load the last {dStartEmpty} days.")
+            return dStartEmpty
+        return (datetime.datetime.now() - latest.to_pydatetime().replace(tzinfo=None)).days
 
-        dfLanuv_fromDB.reset_index().to_parquet(folderLanuv + f"/df_lanuv{i}.parquet")
+    ## Writes every data frame of a generator to a dataset
+    def __fWriteChunks(self, frames, dataset):
+        for df in frames:
+            files = dataset.fWrite(df.reset_index())
+            logger.info(f"Write {len(df)} rows to {len(files)} files in {dataset.path}.")
@@ -1,3 +1,7 @@
+from .SOAIValidator import SOAIValidator, SOAIRangeRule, SOAISentinelRule, SOAIDuplicateRule
+
+import numpy as np
+import pandas as pd
 import logging
 
 logger = logging.getLogger()
@@ -6,9 +10,70 @@ logger = logging.getLogger()
 ## Class which is the base of the different handlers. At the moment the SOAIDBHandler and SOAIDiskHandler exists.
 class SOAIDataHandler:
 
+    # If True the checked data uses compact dtypes (see _fCompactDtypes)
+    compactDtypes = False
+
+    # Rules of valid OpenAir data, the same as the query {hum <= 100 and r1!=-1 and r2!=-1}
+    RULES_OPENAIR = (SOAIRangeRule("hum", high=100),
+                     SOAISentinelRule("r1", [-1]),
+                     SOAISentinelRule("r2", [-1]))
+
+    # Rules of valid Lanuv data, the stations do not measure every component, so missing values are valid.
+    # A timestamp which is repeated for a station keeps its last row, like SOAIParquetDataset.
+    RULES_LANUV = (SOAIRangeRule("no2", low=0, allowNaN=True),
+                   SOAIRangeRule("NO", low=0, allowNaN=True),
+                   SOAIRangeRule("OZON", low=0, allowNaN=True),
+                   SOAIDuplicateRule("timestamp", by="sensorID", keep="last"))
+
     ## Constructor
-    def __init__(self):
-        pass
+    #
+    # @param rulesOpenAir Optional list of rules of valid OpenAir data, by default RULES_OPENAIR
+    # @param rulesLanuv Optional list of rules of valid Lanuv data, by default RULES_LANUV
+    def __init__(self, rulesOpenAir=None, rulesLanuv=None):
+        self.validatorOpenAir = SOAIValidator(self.RULES_OPENAIR if rulesOpenAir is None else rulesOpenAir)
+        self.validatorLanuv = SOAIValidator(self.RULES_LANUV if rulesLanuv is None else rulesLanuv)
+
+    ## Returns the number of checked and rejected rows per source and rule (see SOAIValidator.fGetStats)
+    def fGetValidationStats(self):
+        return {"openair": self.validatorOpenAir.fGetStats(), "lanuv": self.validatorLanuv.fGetStats()}
+
+    ## Sorts data by time, data which is already sorted (e.g. a compacted month of the dataset) is not sorted again.
+    # The sort is stable, so rows with the same timestamp keep the order in which they were loaded.
+    def __fSortByTime(self, data):
+        if not data["timestamp"].is_monotonic_increasing:
+            data = data.sort_values("timestamp", kind="mergesort")
+        return data.reset_index(drop=True)
+
+    ## Converts data to compact dtypes: categorical sensorID, float32 measurements and timestamps as int64
+    # nanoseconds since epoch (UTC). The conversion can be applied more than once.
+    #
+    # @param data Pandas data frame with a timestamp column or index
+    # @returns The converted pandas data frame
+    def _fCompactDtypes(self, data):
+        data = data.astype({column: np.float32 for column in data.columns if data[column].dtype == np.float64})
+
+        if "sensorID" in data.columns:
+            data = data.assign(sensorID=data["sensorID"].astype("category"))
+        if "timestamp" in data.columns and not pd.api.types.is_integer_dtype(data["timestamp"]):
+            data = data.assign(timestamp=self.__fEpoch(data["timestamp"]))
+        if data.index.name == "timestamp" and not pd.api.types.is_integer_dtype(data.index):
+            data.index = pd.Index(self.__fEpoch(data.index), name="timestamp")
+
+        return data
+
+    ## Returns timestamps as int64 nanoseconds since epoch
+    def __fEpoch(self, timestamps):
+        timestamps = pd.DatetimeIndex(timestamps)
+        if timestamps.tz is not None:
+            timestamps = timestamps.tz_convert("UTC").tz_localize(None)
+        return timestamps.values.astype("datetime64[ns]").astype(np.int64)
+
+    ## Returns the part of the feed before the first '-' (e.g. 807f153a for 807f153a-d0f6-...).
+    # The feeds are split once per distinct feed instead of once per row.
+    def __fSplitFeed(self, feed):
+        codes, feeds = pd.factorize(feed)
+        sensorIDs = pd.Series([f.split('-')[0] for f in feeds], dtype=object)
+        return sensorIDs.reindex(codes).values
 
     ## This function applies general rules to the OpenAirCologne data.
     #
@@ -19,14 +84,16 @@ class SOAIDataHandler:
     def _fCheckOpenAir(self, data, selectValidData=True):
         data = data.rename(columns={"feed": "sensorID"})
 
-        data = data.assign(sensorID=lambda d: d["sensorID"].str.split('-').map(lambda x: x[0]))
-        data = data.sort_values("timestamp").reset_index(drop=True)
+        data = data.assign(sensorID=self.__fSplitFeed(data["sensorID"]))
+        data = self.__fSortByTime(data)
 
         # If set to True unvalid data will be discarded
         if selectValidData:
-            logger.info("Select only valid data with query {hum <= 100 and r1!=-1 and r2!=-1}")
-            data = data.query("hum <= 100 and r1!=-1 and r2!=-1")
-            data = data.reset_index(drop=True)
+            logger.info("Select only valid data with the rules of RULES_OPENAIR")
+            data = self.validatorOpenAir.fValidate(data)
+
+        if self.compactDtypes:
+            data = self._fCompactDtypes(data)
 
         return data
 
@@ -39,10 +106,15 @@ class SOAIDataHandler:
     def _fCheckLanuv(self, data, selectValidData=True):
         data = data.rename(columns={"station": "sensorID"})
 
-        data = data.sort_values("timestamp").reset_index(drop=True)
+        data = self.__fSortByTime(data)
 
-        if selectValidData is True:
-            logger.warning("Select valid data is set to true, but no rules for valid data are given.")
+        # If set to True unvalid data will be discarded
+        if selectValidData:
+            logger.info("Select only valid data with the rules of RULES_LANUV")
+            data = self.validatorLanuv.fValidate(data)
+
+        if self.compactDtypes:
+            data = self._fCompactDtypes(data)
 
         return data
 
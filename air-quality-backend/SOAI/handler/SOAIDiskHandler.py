@@ -1,6 +1,9 @@
 from .SOAIDataHandler import SOAIDataHandler
+from .SOAIParquetDataset import SOAIParquetDataset
 
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import pyarrow.parquet as pq
 import glob
 import logging
 import json
@@ -12,25 +15,177 @@ logger = logging.getLogger()
 ## Class which handles the loading of data from disk.
 class SOAIDiskHandler(SOAIDataHandler):
 
+    # Columns which are always read, since they identify a row
+    KEY_COLUMNS = ("timestamp", "sensorID", "feed", "station")
+
     ## Constructor
-    def __init__(self):
-        pass
+    #
+    # @param nThreads Number of threads which load files at the same time, by default the number of CPUs
+    # @param compactDtypes If True the loaded data uses compact dtypes (see SOAIDataHandler._fCompactDtypes)
+    # @param rulesOpenAir Optional list of rules of valid OpenAir data, by default SOAIDataHandler.RULES_OPENAIR
+    # @param rulesLanuv Optional list of rules of valid Lanuv data, by default SOAIDataHandler.RULES_LANUV
+    def __init__(self, nThreads=None, compactDtypes=False, rulesOpenAir=None, rulesLanuv=None):
+        super().__init__(rulesOpenAir, rulesLanuv)
+        self.compactDtypes = compactDtypes
+        if nThreads is None:
+            nThreads = int(os.environ.get("SOAI_DISK_THREADS", os.cpu_count() or 1))
+        self.nThreads = max(1, nThreads)
+
+    ## Calls fLoad for every item with a pool of nThreads threads
+    #
+    # @returns List of the results in the order of the items
+    def __fMap(self, fLoad, items):
+        items = list(items)
+        if self.nThreads == 1 or len(items) <= 1:
+            return [fLoad(item) for item in items]
+
+        # Decoding parquet files releases the GIL, so the files are loaded in parallel
+        with ThreadPoolExecutor(max_workers=min(self.nThreads, len(items))) as executor:
+            return list(executor.map(fLoad, items))
+
+    ## Returns a timestamp in UTC, timestamps without time zone are interpreted as UTC
+    def __fTimestamp(self, t):
+        t = pd.Timestamp(t)
+        return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+    ## Returns the filters for the time frame and the sensors which are pushed down to the row groups of a file
+    #
+    # @param names Columns of the file
+    def __fFilters(self, names, start, end, sensorIDs):
+        filters = []
+        if start is not None:
+            filters.append(("timestamp", ">=", self.__fTimestamp(start)))
+        if end is not None:
+            filters.append(("timestamp", "<", self.__fTimestamp(end)))
+
+        # The feed of the flat OpenAir files is longer than the sensorID, these files are filtered after loading
+        sensorColumn = next((c for c in ("sensorID", "station") if c in names), None)
+        if sensorIDs is not None and sensorColumn is not None:
+            filters.append((sensorColumn, "in", list(sensorIDs)))
+
+        return filters if len(filters) > 0 else None
+
+    ## Loads the files of a folder one by one
+    #
+    # A folder can contain flat parquet files (e.g. df_openair0.parquet) and a dataset partitioned by year and month
+    # (see SOAIParquetDataset). The flat files are loaded first, the months of the dataset one by one.
+    # The columns, the time frame and the sensors are pushed down to the files, so only the needed columns and
+    # row groups are decoded. The result still has to be filtered exactly (see __fSelect).
+    # @param path Path to folder with files
+    # @param columns Optional list of columns to load, the key columns are always loaded
+    # @param start Optional timestamp, only data since start is loaded
+    # @param end Optional timestamp, only data before end is loaded
+    # @param sensorIDs Optional list of sensors to load
+    # @returns Generator of pandas data frames
+    def __fIterFiles(self, path, columns=None, start=None, end=None, sensorIDs=None):
+        for fLoad in self.__fLoaders(path, columns, start, end, sensorIDs):
+            df = fLoad()
+            if len(df) > 0:
+                yield df
+
+    ## Loads the files of a folder in parallel (see __fIterFiles)
+    #
+    # @returns List of pandas data frames in the order of the files
+    def __fLoadFiles(self, path, columns=None, start=None, end=None, sensorIDs=None):
+        frames = self.__fMap(lambda fLoad: fLoad(), self.__fLoaders(path, columns, start, end, sensorIDs))
+        return [df for df in frames if len(df) > 0]
+
+    ## Returns one function per flat file and per month of the dataset which loads it
+    def __fLoaders(self, path, columns, start, end, sensorIDs):
+        def fLoadFile(filename):
+            logger.debug(f"\t- Load {filename}")
+            names = pq.read_schema(filename).names
+            readColumns = None if columns is None else [c for c in names if c in columns or c in self.KEY_COLUMNS]
+            return pd.read_parquet(filename, columns=readColumns, filters=self.__fFilters(names, start, end, sensorIDs))
+
+        dataset = SOAIParquetDataset(path)
+        filters = self.__fFilters(["sensorID"], start, end, sensorIDs)
+
+        loaders = [lambda filename=filename: fLoadFile(filename) for filename in sorted(glob.glob(path + "*.parquet"))]
+        loaders += [lambda partition=partition: dataset.fReadPartition(partition, columns, filters) for partition in dataset.fPartitions(start, end)]
+        return loaders
+
+    ## Filters checked data with timestamp index exactly to the time frame, the sensors and the columns
+    def __fSelect(self, data, columns, start, end, sensorIDs):
+        # With compact dtypes the index holds nanoseconds since epoch
+        fBound = (lambda t: self.__fTimestamp(t).value) if self.compactDtypes else self.__fTimestamp
+        if start is not None:
+            data = data[data.index >= fBound(start)]
+        if end is not None:
+            data = data[data.index < fBound(end)]
+        if sensorIDs is not None:
+            data = data[data["sensorID"].isin(list(sensorIDs))]
+        if columns is not None:
+            data = data[[c for c in data.columns if c in columns or c == "sensorID"]]
+        return data
+
+    ## Returns the columns which are loaded, the check of valid data needs the columns of the rules of the validator
+    def __fRuleColumns(self, columns, selectValidData, validator):
+        if columns is None or not selectValidData:
+            return columns
+        return list(columns) + validator.fColumns()
+
+    ## Returns the newest timestamp of the data in a folder
+    #
+    # Only the timestamps of the flat files and of the newest month of the dataset are read.
+    # @param path Path to folder with files
+    # @returns Timestamp or None if there is no data
+    def fGetLatestTimestamp(self, path):
+        latest = [pd.read_parquet(filename, columns=["timestamp"])["timestamp"].max() for filename in glob.glob(path + "*.parquet")]
+        latest.append(SOAIParquetDataset(path).fLatestTimestamp())
+
+        latest = [t for t in latest if t is not None and not pd.isnull(t)]
+        return max(latest) if len(latest) > 0 else None
+
+    ## Compacts the dataset of a folder and optionally moves the flat files into the dataset
+    #
+    # @param path Path to folder with files
+    # @param fCheck Function which checks the data of a flat file (adds the sensorID)
+    # @param migrateFiles If True the flat files are written to the dataset and moved to the subfolder legacy
+    # @returns Number of compacted months
+    def __fCompact(self, path, fCheck, migrateFiles):
+        dataset = SOAIParquetDataset(path)
+
+        if migrateFiles:
+            os.makedirs(path + "legacy", exist_ok=True)
+            for filename in sorted(glob.glob(path + "*.parquet")):
+                logger.info(f"Move {filename} to the dataset.")
+                dataset.fWrite(fCheck(pd.read_parquet(filename), selectValidData=False))
+                os.replace(filename, os.path.join(path + "legacy", os.path.basename(filename)))
+
+        return dataset.fCompact()
+
+    ## Compacts the OpenAir Cologne dataset (see SOAIParquetDataset.fCompact)
+    #
+    # @param path Path to folder with files
+    # @param migrateFiles If True the flat files are written to the dataset and moved to the subfolder legacy
+    def fCompactOpenAir(self, path=os.environ.get("SOAI") + "/data/openair/", migrateFiles=False):
+        return self.__fCompact(path, self._fCheckOpenAir, migrateFiles)
+
+    ## Compacts the Lanuv dataset (see SOAIParquetDataset.fCompact)
+    #
+    # @param path Path to folder with files
+    # @param migrateFiles If True the flat files are written to the dataset and moved to the subfolder legacy
+    def fCompactLanuv(self, path=os.environ.get("SOAI") + "/data/lanuv/", migrateFiles=False):
+        return self.__fCompact(path, self._fCheckLanuv, migrateFiles)
 
     ## Load data from OpenAir Cologne
     #
     # @param path Path to folder with files
     # @param selectValidData Boolean if only valid data shall be loaded
+    # @param columns Optional list of columns to load (sensorID is always returned)
+    # @param start Optional timestamp, only data since start is loaded
+    # @param end Optional timestamp, only data before end is loaded
+    # @param sensorIDs Optional list of sensors to load
     # @returns Pandas data frame with measurment values depending on time
-    def fGetOpenAir(self, path=os.environ.get("SOAI") + "/data/openair/", selectValidData=True):
+    def fGetOpenAir(self, path=os.environ.get("SOAI") + "/data/openair/", selectValidData=True, columns=None, start=None, end=None, sensorIDs=None):
         logger.debug(f"Load OpenAir Cologne data from {path}.")
 
-        # Since the measurments are saved in multiple files, use a glob-string and wildcards in order to load the data
-        filesOpenAir = glob.glob(path + "*.parquet")
-        listOpenAir = []
-        for filename in filesOpenAir:
-            logger.debug(f"\t- Load {filename}")
-            df = pd.read_parquet(filename)
-            listOpenAir.append(df)
+        # Since the measurments are saved in multiple files, load the files one by one
+        listOpenAir = self.__fLoadFiles(path, self.__fRuleColumns(columns, selectValidData, self.validatorOpenAir), start, end, sensorIDs)
+        if len(listOpenAir) == 0:
+            logger.error(f"No OpenAir Cologne data was found in {path}.")
+            return pd.DataFrame()
 
         # Sort the values depending on time
         dataOpenAir = pd.concat(listOpenAir, sort=False)
@@ -38,9 +193,27 @@ class SOAIDiskHandler(SOAIDataHandler):
         # Check the OpenAir data
         dataOpenAir = self._fCheckOpenAir(dataOpenAir, selectValidData)
         dataOpenAir = dataOpenAir.set_index("timestamp", drop=True)
+        dataOpenAir = self.__fSelect(dataOpenAir, columns, start, end, sensorIDs)
 
         return dataOpenAir
 
+    ## Load data from OpenAir Cologne file by file
+    #
+    # Only one file (or month of the dataset) is in memory at once. Every data frame is sorted by time,
+    # but the flat files can overlap in time.
+    # @param path Path to folder with files
+    # @param selectValidData Boolean if only valid data shall be loaded
+    # @param columns Optional list of columns to load (sensorID is always returned)
+    # @param start Optional timestamp, only data since start is loaded
+    # @param end Optional timestamp, only data before end is loaded
+    # @param sensorIDs Optional list of sensors to load
+    # @returns Generator of pandas data frames with measurment values depending on time
+    def fIterOpenAir(self, path=os.environ.get("SOAI") + "/data/openair/", selectValidData=True, columns=None, start=None, end=None, sensorIDs=None):
+        for df in self.__fIterFiles(path, self.__fRuleColumns(columns, selectValidData, self.validatorOpenAir), start, end, sensorIDs):
+            # Check the OpenAir data
+            df = self._fCheckOpenAir(df, selectValidData)
+            yield self.__fSelect(df.set_index("timestamp", drop=True), columns, start, end, sensorIDs)
+
     ## Load properties of OpenAir Cologn sensors
     #
     # @param pathToFile Path to file where sensor data is saved
@@ -68,17 +241,19 @@ class SOAIDiskHandler(SOAIDataHandler):
     #
     # @param path Path to folder with files
     # @param selectValidData Boolean if only valid data shall be loaded
+    # @param columns Optional list of columns to load (sensorID is always returned)
+    # @param start Optional timestamp, only data since start is loaded
+    # @param end Optional timestamp, only data before end is loaded
+    # @param sensorIDs Optional list of stations to load
     # @returns Pandas data frame with measurment values depending on time
-    def fGetLanuv(self, path=os.environ.get("SOAI") + "/data/lanuv/", selectValidData=False):
+    def fGetLanuv(self, path=os.environ.get("SOAI") + "/data/lanuv/", selectValidData=False, columns=None, start=None, end=None, sensorIDs=None):
         logger.debug(f"Load Lanuv data from {path}.")
 
-        # Since the measurments are saved in multiple files, use a glob-string and wildcards in order to load the data
-        filesLanuv = glob.glob(path + "*.parquet")
-        listLanuv = []
-        for filename in filesLanuv:
-            logger.debug(f"\t- Load {filename}")
-            df = pd.read_parquet(filename)
-            listLanuv.append(df)
+        # Since the measurments are saved in multiple files, load the files one by one
+        listLanuv = self.__fLoadFiles(path, self.__fRuleColumns(columns, selectValidData, self.validatorLanuv), start, end, sensorIDs)
+        if len(listLanuv) == 0:
+            logger.error(f"No Lanuv data was found in {path}.")
+            return pd.DataFrame()
 
         # Concat data
         dataLanuv = pd.concat(listLanuv, ignore_index=True, sort=False)
@@ -86,9 +261,27 @@ class SOAIDiskHandler(SOAIDataHandler):
         # Check the Lanuv data
         dataLanuv = self._fCheckLanuv(dataLanuv, selectValidData)
         dataLanuv = dataLanuv.set_index("timestamp", drop=True)
+        dataLanuv = self.__fSelect(dataLanuv, columns, start, end, sensorIDs)
 
         return dataLanuv
 
+    ## Load data from Lanuv file by file
+    #
+    # Only one file (or month of the dataset) is in memory at once. Every data frame is sorted by time,
+    # but the flat files can overlap in time.
+    # @param path Path to folder with files
+    # @param selectValidData Boolean if only valid data shall be loaded
+    # @param columns Optional list of columns to load (sensorID is always returned)
+    # @param start Optional timestamp, only data since start is loaded
+    # @param end Optional timestamp, only data before end is loaded
+    # @param sensorIDs Optional list of stations to load
+    # @returns Generator of pandas data frames with measurment values depending on time
+    def fIterLanuv(self, path=os.environ.get("SOAI") + "/data/lanuv/", selectValidData=False, columns=None, start=None, end=None, sensorIDs=None):
+        for df in self.__fIterFiles(path, self.__fRuleColumns(columns, selectValidData, self.validatorLanuv), start, end, sensorIDs):
+            # Check the Lanuv data
+            df = self._fCheckLanuv(df, selectValidData)
+            yield self.__fSelect(df.set_index("timestamp", drop=True), columns, start, end, sensorIDs)
+
     ## Load properties of OpenAir Cologn sensors
     #
     # @param pathToFile Path to file where sensor data is saved
@@ -105,48 +298,21 @@ class SOAIDiskHandler(SOAIDataHandler):
         logger.debug(f"Load traffic data from {path}.")
 
         # Since the data are saved in multiple files, use a glob-string and wildcards in order to load the data
-        files = glob.glob(path + "*.csv")
-        listData = []
-        for filename in files:
+        files = []
+        for filename in sorted(glob.glob(path + "*.csv")):
             infos = filename[filename.rfind("/") + 1:].split("_")
-            logger.debug(f"\t- Load {filename} with informations {infos}.")
 
             if len(infos) < 3:
                 logger.error("csv-file with traffic data have a different format as epected. Expect filename with format station_pixel_time.csv")
                 raise Exception("csv-file with traffic data have a different format as epected.")
             if pixelSize is not None and pixelSize != int(infos[1]):
-                logger.debug(f"Skip file since pixel size is set to {pixelSize}.")
-                continue
-
-            df = pd.read_csv(filename, sep=",")
-
-            if len(df) == 0:
-                logger.warning("Not data was found. Skip this file.")
+                logger.debug(f"Skip file {filename} since pixel size is set to {pixelSize}.")
                 continue
 
-            df["date"] = pd.to_datetime(df["date"])
-            df = df.set_index("date", drop=True)
-            df.index = pd.to_datetime(df.index, format='%Y-%m-%d %H:%M:%S')
-            df.index = df.index.tz_localize(None)
-            df.loc[df['green_X'].isnull() == False, 'green'] = 1
-            df.loc[df['orange_X'].isnull() == False, 'orange'] = 1
-            df.loc[df['red_X'].isnull() == False, 'red'] = 1
-            df.loc[df['brown_X'].isnull() == False, 'brown'] = 1
-            df = df.resample('15min').agg({"green": 'sum', "orange": 'sum', "red": "sum", "brown": "sum"})
-            df["pixelCounterSensor"] = df["green"] + df["orange"] + df["red"] + df["brown"]
-            # df = df[df["pixelCounterSensor"] > 0]
+            files.append((filename, infos))
 
-            df["rgreen"] = df.apply(lambda x: x["green"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
-            df["rorange"] = df.apply(lambda x: x["orange"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
-            df["rred"] = df.apply(lambda x: x["red"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
-            df["rbrown"] = df.apply(lambda x: x["brown"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
-
-            df["sensorID"] = [infos[0] for i in range(len(df))]
-            df["pixel"] = [int(infos[1]) for i in range(len(df))]
-
-            df = df.reset_index()
-
-            listData.append(df)
+        # Load the files in parallel
+        listData = [df for df in self.__fMap(lambda file: self.__fLoadTrafficFile(*file), files) if df is not None]
 
         # Concat data
         try:
@@ -161,3 +327,39 @@ class SOAIDiskHandler(SOAIDataHandler):
         data = data.set_index("date", drop=True)
 
         return data
+
+    ## Load one file with traffic data
+    #
+    # @param filename Path to the csv-file
+    # @param infos Informations of the filename (station, pixel, time)
+    # @returns Pandas data frame with the share of the colors per 15 minutes or None if the file is empty
+    def __fLoadTrafficFile(self, filename, infos):
+        logger.debug(f"\t- Load {filename} with informations {infos}.")
+
+        df = pd.read_csv(filename, sep=",")
+
+        if len(df) == 0:
+            logger.warning("Not data was found. Skip this file.")
+            return None
+
+        df["date"] = pd.to_datetime(df["date"])
+        df = df.set_index("date", drop=True)
+        df.index = pd.to_datetime(df.index, format='%Y-%m-%d %H:%M:%S')
+        df.index = df.index.tz_localize(None)
+        df.loc[df['green_X'].isnull() == False, 'green'] = 1
+        df.loc[df['orange_X'].isnull() == False, 'orange'] = 1
+        df.loc[df['red_X'].isnull() == False, 'red'] = 1
+        df.loc[df['brown_X'].isnull() == False, 'brown'] = 1
+        df = df.resample('15min').agg({"green": 'sum', "orange": 'sum', "red": "sum", "brown": "sum"})
+        df["pixelCounterSensor"] = df["green"] + df["orange"] + df["red"] + df["brown"]
+        # df = df[df["pixelCounterSensor"] > 0]
+
+        df["rgreen"] = df.apply(lambda x: x["green"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
+        df["rorange"] = df.apply(lambda x: x["orange"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
+        df["rred"] = df.apply(lambda x: x["red"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
+        df["rbrown"] = df.apply(lambda x: x["brown"] / x["pixelCounterSensor"] if x["pixelCounterSensor"] > 0 else 0, axis=1)
+
+        df["sensorID"] = [infos[0] for i in range(len(df))]
+        df["pixel"] = [int(infos[1]) for i in range(len(df))]
+
+        return df.reset_index()
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger()
+
+
+## Class which decodes the raw JSON response of an InfluxDB query into one data frame
+#
+# The values of all series are collected in one list and converted to one NumPy array at once, instead of
+# building one data frame per series and appending them. The tag of the series becomes a categorical column.
+class SOAIInfluxDecoder():
+
+    ## Constructor
+    #
+    # @param tag Name of the tag of the series (e.g. feed for GROUP BY feed), None if the query has no GROUP BY tag
+    def __init__(self, tag=None):
+        self.tag = tag
+
+    ## Parses the body of the response
+    #
+    # @param body Bytes of the response (JSON with epoch timestamps in ms)
+    def fParse(self, body):
+        if orjson is not None:
+            return orjson.loads(body)
+        return json.loads(body)
+
+    ## Decodes the body of the response of one statement
+    #
+    # @param body Bytes of the response or the already parsed JSON
+    # @returns Pandas data frame with a timestamp column (UTC), one column per field and a categorical tag column.
+    #          Empty data frame if the response has no series.
+    def fDecode(self, body):
+        result = self.fParse(body) if isinstance(body, (bytes, str)) else body
+
+        statement = result["results"][0]
+        if "error" in statement:
+            logger.error(f"The query failed with {statement['error']}.")
+            raise Exception(f"The query failed with {statement['error']}.")
+
+        series = statement.get("series", [])
+        if len(series) == 0:
+            return pd.DataFrame()
+
+        columns = series[0]["columns"]
+        values = []
+        lengths = []
+        tags = []
+        for s in series:
+            if s["columns"] != columns:
+                raise Exception("The series of the response have different columns.")
+            values.extend(s["values"])
+            lengths.append(len(s["values"]))
+            if self.tag is not None:
+                tags.append(s.get("tags", {}).get(self.tag))
+
+        data = self.__fToColumns(values, columns)
+        data[columns[0]] = pd.to_datetime(data[columns[0]].astype(np.int64), unit="ms", utc=True)
+
+        df = pd.DataFrame(data, columns=columns).rename(columns={columns[0]: "timestamp"})
+        if self.tag is not None:
+            codes = np.repeat(np.arange(len(tags)), lengths)
+            df[self.tag] = pd.Categorical.from_codes(codes, categories=pd.Index(tags))
+
+        return df
+
+    ## Converts the rows to columns. The fast path converts all rows at once to float, columns with other values
+    # (e.g. strings) are converted one by one.
+    def __fToColumns(self, values, columns):
+        try:
+            array = np.array(values, dtype=np.float64).reshape(len(values), len(columns))
+            return {column: array[:, i] for i, column in enumerate(columns)}
+        except (TypeError, ValueError):
+            pass
+
+        array = np.array(values, dtype=object).reshape(len(values), len(columns))
+        data = {}
+        for i, column in enumerate(columns):
+            try:
+                data[column] = array[:, i].astype(np.float64)
+            except (TypeError, ValueError):
+                data[column] = pd.Categorical(array[:, i])
+        return data
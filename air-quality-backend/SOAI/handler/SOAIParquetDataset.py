@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import glob
+import time
+import os
+import logging
+
+logger = logging.getLogger()
+
+
+## Class which stores measurements in a parquet dataset partitioned by year and month
+#
+# The files of a month are saved in path/year=YYYY/month=MM/. Every write adds a new file to the touched months,
+# so writes and reads only depend on the months which are touched. Rows with the same sensorID and timestamp are
+# deduplicated when a month is read (the newest file wins) and when a month is compacted into one file.
+class SOAIParquetDataset():
+
+    ## Constructor
+    #
+    # @param path Folder of the dataset (e.g. data/openair)
+    # @param keys Columns which identify a row
+    # @param rowGroupSize Number of rows of a row group of compacted files
+    def __init__(self, path, keys=("sensorID", "timestamp"), rowGroupSize=100000):
+        self.path = path
+        self.keys = list(keys)
+        self.rowGroupSize = rowGroupSize
+
+    ## Returns the folder of a month
+    def __fPartition(self, year, month):
+        return os.path.join(self.path, f"year={year}", f"month={month:02d}")
+
+    ## Returns the files of a month ordered by the time they were written
+    def __fFiles(self, partition):
+        return sorted(glob.glob(os.path.join(partition, "part-*.parquet")))
+
+    ## Writes a data frame to a new file of a month. The file is renamed when it is complete, so readers never see
+    # half written files.
+    def __fWriteFile(self, partition, data):
+        os.makedirs(partition, exist_ok=True)
+        filename = os.path.join(partition, f"part-{time.time_ns():020d}-{os.getpid()}.parquet")
+        tmp = os.path.join(partition, f".{os.path.basename(filename)}.tmp")
+
+        data.to_parquet(tmp, index=False, row_group_size=self.rowGroupSize)
+        os.replace(tmp, filename)
+        return filename
+
+    ## Converts compact dtypes (see SOAIDataHandler._fCompactDtypes) back, so all files of the dataset have the same schema
+    def __fNormalize(self, data):
+        if pd.api.types.is_integer_dtype(data["timestamp"]):
+            data = data.assign(timestamp=pd.to_datetime(data["timestamp"], unit="ns", utc=True))
+        if "sensorID" in data.columns and isinstance(data["sensorID"].dtype, pd.CategoricalDtype):
+            data = data.assign(sensorID=data["sensorID"].astype(object))
+        return data.astype({column: np.float64 for column in data.columns if data[column].dtype == np.float32})
+
+    ## Removes duplicates of the keys, the last row wins
+    def __fDeduplicate(self, data):
+        return data.drop_duplicates(self.keys, keep="last")
+
+    ## Returns the months of the dataset
+    #
+    # @param tStart Optional timestamp, only months which contain data after tStart are returned
+    # @param tEnd Optional timestamp, only months which contain data before tEnd are returned
+    # @returns Ordered list of the folders of the months
+    def fPartitions(self, tStart=None, tEnd=None):
+        partitions = []
+        for partition in sorted(glob.glob(os.path.join(self.path, "year=*", "month=*"))):
+            year = int(os.path.basename(os.path.dirname(partition))[len("year="):])
+            month = int(os.path.basename(partition)[len("month="):])
+            if tStart is not None and (year, month) < (pd.Timestamp(tStart).year, pd.Timestamp(tStart).month):
+                continue
+            if tEnd is not None and (year, month) > (pd.Timestamp(tEnd).year, pd.Timestamp(tEnd).month):
+                continue
+            partitions.append(partition)
+        return partitions
+
+    ## Writes data to the dataset
+    #
+    # @param data Pandas data frame with a timestamp column (UTC) and the key columns
+    # @returns List of the written files
+    def fWrite(self, data):
+        if len(data) == 0:
+            return []
+
+        data = self.__fDeduplicate(self.__fNormalize(data))
+        timestamps = pd.DatetimeIndex(data["timestamp"])
+
+        files = []
+        for (year, month), part in data.groupby([timestamps.year, timestamps.month], sort=True):
+            files.append(self.__fWriteFile(self.__fPartition(year, month), part.reset_index(drop=True)))
+            logger.debug(f"Write {len(part)} rows to {files[-1]}.")
+
+        return files
+
+    ## Reads one month
+    #
+    # @param partition Folder of the month
+    # @param columns Optional list of columns to read, the key columns are always read
+    # @param filters Optional filters which are pushed down to the row groups (see pyarrow.parquet.read_table)
+    # @returns Deduplicated pandas data frame
+    def fReadPartition(self, partition, columns=None, filters=None):
+        if columns is not None:
+            columns = list(dict.fromkeys(self.keys + list(columns)))
+
+        frames = [pd.read_parquet(filename, columns=columns, filters=filters) for filename in self.__fFiles(partition)]
+        if len(frames) == 0:
+            return pd.DataFrame()
+
+        return self.__fDeduplicate(pd.concat(frames, ignore_index=True, sort=False)).reset_index(drop=True)
+
+    ## Reads the dataset month by month
+    #
+    # @param tStart Optional timestamp, only months which contain data after tStart are read
+    # @param tEnd Optional timestamp, only months which contain data before tEnd are read
+    # @param columns Optional list of columns to read
+    # @param filters Optional filters which are pushed down to the row groups (see pyarrow.parquet.read_table)
+    # @returns Generator of deduplicated pandas data frames, one per month in the order of time
+    def fIterPartitions(self, tStart=None, tEnd=None, columns=None, filters=None):
+        for partition in self.fPartitions(tStart, tEnd):
+            df = self.fReadPartition(partition, columns, filters)
+            if len(df) > 0:
+                yield df
+
+    ## Returns the newest timestamp of the dataset or None if the dataset is empty
+    def fLatestTimestamp(self):
+        for partition in reversed(self.fPartitions()):
+            df = self.fReadPartition(partition, columns=["timestamp"])
+            if len(df) > 0:
+                return df["timestamp"].max()
+        return None
+
+    ## Merges the files of every month into one deduplicated file, sorted by time, with row groups of rowGroupSize
+    #
+    # The new file is written before the old files are removed. If the compaction is interrupted, the rows are
+    # deduplicated when the month is read.
+    # @param minFiles Only months with at least minFiles files are compacted
+    # @returns Number of compacted months
+    def fCompact(self, minFiles=2):
+        compacted = 0
+        for partition in self.fPartitions():
+            files = self.__fFiles(partition)
+            if len(files) < minFiles:
+                continue
+
+            df = self.fReadPartition(partition)
+            df = df.sort_values("timestamp", kind="mergesort").reset_index(drop=True)
+            filename = self.__fWriteFile(partition, df)
+
+            for old in files:
+                os.remove(old)
+
+            logger.info(f"Compacted {len(files)} files with {len(df)} rows to {filename}.")
+            compacted += 1
+
+        return compacted
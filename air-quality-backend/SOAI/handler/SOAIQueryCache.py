@@ -0,0 +1,114 @@
+import pandas as pd
+import threading
+import glob
+import os
+import logging
+
+logger = logging.getLogger()
+
+
+## Class which caches the results of DB queries on disk
+#
+# A result is stored per measurement, granularity and time block as parquet file. Only closed time blocks
+# (which do not change anymore) shall be stored. If the files need more than maxSize bytes, the least recently
+# used files are deleted.
+class SOAIQueryCache():
+
+    ## Constructor
+    #
+    # @param path Folder of the cache files
+    # @param maxSize Maximal size of all cache files in bytes
+    def __init__(self, path=os.path.join(os.environ.get("SOAI", "."), "data", "cache"), maxSize=512 * 1024 ** 2):
+        self.path = path
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+
+    ## Returns the file of a time block
+    def __fFile(self, measurement, granularity, tStart):
+        return os.path.join(self.path, f"{measurement}_{granularity}_{pd.Timestamp(tStart).strftime('%Y%m%dT%H%M%S')}.parquet")
+
+    ## Returns the cached result of a time block
+    #
+    # A file which can not be read (e.g. truncated or corrupt) is deleted and counted as a miss, so the block is
+    # queried again.
+    # @param measurement Name of the measurement
+    # @param granularity Granularity of the data as string (e.g. 1h)
+    # @param tStart Start of the time block
+    # @returns Pandas data frame or None if the time block is not in the cache
+    def fGet(self, measurement, granularity, tStart):
+        filename = self.__fFile(measurement, granularity, tStart)
+        try:
+            df = pd.read_parquet(filename)
+            # The modification time marks the last use
+            os.utime(filename)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Remove unreadable file {filename} from the query cache: {e}")
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return df
+
+    ## Stores the result of a closed time block
+    #
+    # @param measurement Name of the measurement
+    # @param granularity Granularity of the data as string (e.g. 1h)
+    # @param tStart Start of the time block
+    # @param data Pandas data frame with the result of the time block
+    def fPut(self, measurement, granularity, tStart, data):
+        filename = self.__fFile(measurement, granularity, tStart)
+
+        # Write to a temporary file first, so a crash never leaves a broken file in the cache
+        tmp = f"{filename}.{threading.get_ident()}.tmp"
+        data.reset_index(drop=True).to_parquet(tmp)
+        os.replace(tmp, filename)
+
+        self.fEvict()
+
+    ## Deletes the least recently used files until all files need less than maxSize bytes
+    def fEvict(self):
+        with self.lock:
+            files = []
+            for filename in glob.glob(os.path.join(self.path, "*.parquet")):
+                try:
+                    stat = os.stat(filename)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, filename))
+
+            size = sum(f[1] for f in files)
+            for _, fileSize, filename in sorted(files):
+                if size <= self.maxSize:
+                    break
+                logger.debug(f"Evict {filename} from the query cache.")
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+                size -= fileSize
+
+    ## Deletes all files of the cache
+    def fClear(self):
+        with self.lock:
+            for filename in glob.glob(os.path.join(self.path, "*.parquet")):
+                os.remove(filename)
+
+    ## Returns the statistics of the cache
+    #
+    # @returns Dictionary with the number of hits and misses, the number of files and their size in bytes
+    def fGetStats(self):
+        files = glob.glob(os.path.join(self.path, "*.parquet"))
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "files": len(files),
+                    "size": sum(os.path.getsize(f) for f in files if os.path.exists(f))}
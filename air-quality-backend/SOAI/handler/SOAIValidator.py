@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+import threading
+import logging
+
+logger = logging.getLogger()
+
+
+## Rule which accepts the values of a column in the range [low, high]
+class SOAIRangeRule():
+
+    ## Constructor
+    #
+    # @param column Name of the column
+    # @param low Optional lower bound (inclusive)
+    # @param high Optional upper bound (inclusive)
+    # @param allowNaN If True missing values are accepted
+    def __init__(self, column, low=None, high=None, allowNaN=False):
+        self.column = column
+        self.low = low
+        self.high = high
+        self.allowNaN = allowNaN
+        self.name = f"{column} in [{'-inf' if low is None else low}, {'inf' if high is None else high}]"
+
+    ## Returns a boolean array which is True for the accepted rows
+    def fMask(self, data):
+        values = np.asarray(data[self.column], dtype=np.float64)
+
+        # NaN fails every comparison, so it is rejected unless allowNaN is set
+        with np.errstate(invalid="ignore"):
+            mask = np.ones(len(values), dtype=bool)
+            if self.low is not None:
+                np.logical_and(mask, values >= self.low, out=mask)
+            if self.high is not None:
+                np.logical_and(mask, values <= self.high, out=mask)
+        if self.allowNaN:
+            np.logical_or(mask, np.isnan(values), out=mask)
+        return mask
+
+
+## Rule which rejects sentinel values of a column (e.g. -1 for a missing measurement)
+class SOAISentinelRule():
+
+    ## Constructor
+    #
+    # @param column Name of the column
+    # @param sentinels List of the rejected values
+    # @param allowNaN If True missing values are accepted
+    def __init__(self, column, sentinels=(-1,), allowNaN=True):
+        self.column = column
+        self.sentinels = list(sentinels)
+        self.allowNaN = allowNaN
+        self.name = f"{column} not in {self.sentinels}"
+
+    ## Returns a boolean array which is True for the accepted rows
+    def fMask(self, data):
+        values = np.asarray(data[self.column], dtype=np.float64)
+
+        mask = ~np.isin(values, self.sentinels)
+        if not self.allowNaN:
+            np.logical_and(mask, ~np.isnan(values), out=mask)
+        return mask
+
+
+## Rule which accepts only rows whose timestamp is after all earlier rows of the same sensor
+#
+# With strict=True a repeated timestamp of a sensor is rejected, only the first row is kept.
+class SOAIMonotonicRule():
+
+    ## Constructor
+    #
+    # @param column Name of the time column
+    # @param by Name of the column of the sensor, None if the whole frame shall be monotonic
+    # @param strict If True the timestamps have to increase, otherwise they must not decrease
+    def __init__(self, column="timestamp", by="sensorID", strict=True):
+        self.column = column
+        self.by = by
+        self.strict = strict
+        self.name = f"{column} {'increasing' if strict else 'not decreasing'}" + ("" if by is None else f" per {by}")
+
+    ## Returns a boolean array which is True for the accepted rows
+    def fMask(self, data):
+        values = self.__fOrdinal(data[self.column])
+        if len(values) == 0:
+            return np.ones(0, dtype=bool)
+
+        # The maximum of all earlier rows of the same sensor
+        if self.by is None:
+            previous = np.empty_like(values)
+            previous[0] = np.iinfo(np.int64).min
+            np.maximum.accumulate(values[:-1], out=previous[1:])
+        else:
+            codes = pd.factorize(data[self.by])[0]
+            running = pd.Series(values).groupby(codes).cummax()
+            previous = running.groupby(codes).shift(1, fill_value=np.iinfo(np.int64).min).values
+
+        return values > previous if self.strict else values >= previous
+
+    ## Returns the timestamps as int64 nanoseconds since epoch, so they can be compared without loss
+    def __fOrdinal(self, values):
+        if pd.api.types.is_integer_dtype(values):
+            return np.asarray(values, dtype=np.int64)
+        timestamps = pd.DatetimeIndex(values)
+        if timestamps.tz is not None:
+            timestamps = timestamps.tz_convert("UTC").tz_localize(None)
+        return timestamps.values.astype("datetime64[ns]").astype(np.int64)
+
+
+## Rule which rejects repeated values of a column per sensor, e.g. a timestamp which is loaded twice
+#
+# Only the last of the repeated rows is kept, like in SOAIParquetDataset where the newest file wins. Sort the data
+# with a stable sort before (e.g. mergesort), so the repeated rows keep the order in which they were loaded.
+class SOAIDuplicateRule():
+
+    ## Constructor
+    #
+    # @param column Name of the column, e.g. the time column
+    # @param by Name of the column of the sensor, None if the values of the whole frame shall be unique
+    # @param keep Which of the repeated rows is accepted, "first" or "last"
+    def __init__(self, column="timestamp", by="sensorID", keep="last"):
+        self.column = column
+        self.by = by
+        self.keep = keep
+        self.name = f"{column} unique" + ("" if by is None else f" per {by}")
+
+    ## Returns a boolean array which is True for the accepted rows
+    def fMask(self, data):
+        keys = [self.column] if self.by is None else [self.by, self.column]
+        return ~data.duplicated(keys, keep=self.keep).values
+
+
+## Class which checks data with a set of rules
+#
+# The masks of all rules are combined into one boolean mask, so the data frame is filtered only once, whatever the
+# number of rules. The number of rejected rows is counted per rule. A row which fails several rules is counted
+# for every rule it fails. Rules whose column is not in the data are skipped.
+class SOAIValidator():
+
+    ## Constructor
+    #
+    # @param rules List of rules (e.g. SOAIRangeRule, SOAISentinelRule, SOAIMonotonicRule, SOAIDuplicateRule)
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.lock = threading.Lock()
+        self.stats = {"rows": 0, "rejected": 0, "rules": {rule.name: 0 for rule in self.rules}}
+
+    ## Returns the columns which are needed by the rules
+    def fColumns(self):
+        columns = []
+        for rule in self.rules:
+            columns += [rule.column] + ([rule.by] if getattr(rule, "by", None) is not None else [])
+        return list(dict.fromkeys(columns))
+
+    ## Returns the mask of the accepted rows and the number of rejected rows per rule
+    #
+    # @param data Pandas data frame
+    # @returns Boolean NumPy array and dictionary with the name of the rule and the number of rejected rows
+    def fMask(self, data):
+        mask = np.ones(len(data), dtype=bool)
+        rejected = {}
+        for rule in self.rules:
+            if rule.column not in data.columns:
+                logger.debug(f"Skip the rule {rule.name}, since the data has no column {rule.column}.")
+                continue
+
+            ruleMask = rule.fMask(data)
+            rejected[rule.name] = len(data) - int(np.count_nonzero(ruleMask))
+            np.logical_and(mask, ruleMask, out=mask)
+
+        return mask, rejected
+
+    ## Removes the rows which fail at least one rule
+    #
+    # @param data Pandas data frame
+    # @returns The pandas data frame with the accepted rows and a new index
+    def fValidate(self, data):
+        mask, rejected = self.fMask(data)
+        nRejected = len(data) - int(np.count_nonzero(mask))
+
+        with self.lock:
+            self.stats["rows"] += len(data)
+            self.stats["rejected"] += nRejected
+            for name, n in rejected.items():
+                self.stats["rules"][name] += n
+
+        if nRejected == 0:
+            return data.reset_index(drop=True)
+
+        logger.info(f"Rejected {nRejected} of {len(data)} rows ({', '.join(f'{name}: {n}' for name, n in rejected.items() if n > 0)}).")
+        return data[mask].reset_index(drop=True)
+
+    ## Returns the statistics of the checked rows
+    #
+    # @returns Dictionary with the number of checked and rejected rows and the number of rejected rows per rule
+    def fGetStats(self):
+        with self.lock:
+            return {"rows": self.stats["rows"], "rejected": self.stats["rejected"], "rules": dict(self.stats["rules"])}
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger()
+
+
+## Class which evaluates the calibration models of many sensors at once
+#
+# All calibration models have the architecture of SOAIOpenAirCalibrationModel.fCreateModel. Their scaler parameters
+# and weights are stacked to arrays of shape [models, 3], [models, 3, n] and [models, n, 1], so the readings of all
+# sensors are converted with a few NumPy operations instead of one Keras call per sensor. Every row selects the
+# parameters of its sensor.
+class SOAICalibrationEngine():
+
+    ## Initializes an empty engine
+    #
+    # @param blockSize Number of rows which are evaluated at once, limits the memory of the gathered weights
+    def __init__(self, blockSize=65536):
+        self.blockSize = blockSize
+        self.sensorIndex = {}
+        self.parameters = None
+
+    ## Stacks the parameters of the models
+    #
+    # Sensors which share one model instance (see SOAIModelRegistry) share one entry of the stacked arrays.
+    # Models without parameters (see SOAIOpenAirCalibrationModel.fGetParameters) or with another number of hidden
+    # units than the first model are skipped.
+    # @param models Dictionary with the sensorID and its calibration model (or a dictionary of parameters)
+    # @returns List of the sensorIDs which are evaluated by the engine
+    def fBuild(self, models):
+        self.sensorIndex = {}
+        stacked = []
+        modelIndex = {}
+
+        for ID, model in models.items():
+            if id(model) not in modelIndex:
+                try:
+                    parameters = model if isinstance(model, dict) else model.fGetParameters()
+                except Exception as e:
+                    logger.warning(f"The calibration model of sensor {ID} can not be used by the engine: {e}")
+                    continue
+
+                if len(stacked) > 0 and parameters["W1"].shape != stacked[0]["W1"].shape:
+                    logger.warning(f"The calibration model of sensor {ID} has the shape {parameters['W1'].shape} "
+                                   f"instead of {stacked[0]['W1'].shape}. Skip it.")
+                    continue
+
+                modelIndex[id(model)] = len(stacked)
+                stacked.append(parameters)
+
+            self.sensorIndex[ID] = modelIndex[id(model)]
+
+        if len(stacked) == 0:
+            self.parameters = None
+        else:
+            self.parameters = {key: np.stack([p[key] for p in stacked]) for key in stacked[0].keys()}
+
+        logger.info(f"Calibration engine uses {len(stacked)} models for {len(self.sensorIndex)} sensors.")
+        return list(self.sensorIndex.keys())
+
+    ## Returns a boolean whether the engine evaluates the sensor
+    def fHasSensor(self, ID):
+        return ID in self.sensorIndex
+
+    ## Converts the features of many sensors to NO2 values
+    #
+    # @param sensorIDs Array with the sensorID of every row
+    # @param features NumPy array with shape (rows, 3) and the features hum, temp and r2
+    # @returns NumPy array with one NO2 value per row
+    def fPredict(self, sensorIDs, features):
+        codes, IDs = pd.factorize(np.asarray(sensorIDs))
+        index = np.array([self.sensorIndex.get(ID, -1) for ID in IDs], dtype=np.int64)
+        if (codes < 0).any() or (index < 0).any():
+            missing = [ID for ID, i in zip(IDs, index) if i < 0]
+            raise Exception(f"The engine has no calibration model for the sensors {missing}.")
+
+        return self.fPredictIndexed(index[codes], features)
+
+    ## Converts the features to NO2 values with the stacked parameters
+    #
+    # @param index NumPy array with the index of the model (see fBuild) of every row
+    # @param features NumPy array with shape (rows, 3)
+    # @returns NumPy array with one NO2 value per row
+    def fPredictIndexed(self, index, features):
+        if self.parameters is None:
+            raise Exception("Build the engine first.")
+
+        features = np.asarray(features, dtype=np.float64)
+        p = self.parameters
+        no2 = np.empty(len(features))
+
+        for start in range(0, len(features), self.blockSize):
+            i = index[start:start + self.blockSize]
+            x = features[start:start + self.blockSize] * p["scalerScale"][i] + p["scalerOffset"][i]
+
+            hidden = np.einsum("ri,rih->rh", x, p["W1"][i]) + p["b1"][i]
+            np.maximum(hidden, 0, out=hidden)
+
+            no2[start:start + self.blockSize] = np.einsum("rh,rh->r", hidden, p["W2"][i][:, :, 0]) + p["b2"][i][:, 0]
+
+        return no2
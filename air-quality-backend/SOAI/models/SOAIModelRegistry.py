@@ -0,0 +1,71 @@
+import os
+import logging
+
+logger = logging.getLogger()
+
+
+## Class which keeps loaded models in memory so that they are only read once from disk
+#
+# Models are identified by the paths to the model and the scaler. If one of the files changes on disk
+# (different modification time) the model is loaded again on the next request.
+class SOAIModelRegistry():
+
+    ## Initializes an empty registry
+    def __init__(self):
+        self.models = {}
+        self.loads = 0
+        self.hits = 0
+
+    ## Returns the key under which a model is stored
+    #
+    # @param pathToModel Path to the model
+    # @param pathToScaler Path to the scaler
+    def __fKey(self, pathToModel, pathToScaler):
+        return (os.path.abspath(pathToModel), os.path.abspath(pathToScaler))
+
+    ## Returns the modification times of the model and scaler files
+    def __fVersion(self, pathToModel, pathToScaler):
+        mtimeModel = os.path.getmtime(pathToModel) if os.path.isfile(pathToModel) else None
+        mtimeScaler = os.path.getmtime(pathToScaler) if os.path.isfile(pathToScaler) else None
+        return (mtimeModel, mtimeScaler)
+
+    ## Returns a loaded model. The model is only loaded from disk if it is not yet in the registry or the files changed.
+    #
+    # @param modelClass Class of the model which provides a fLoad(pathToModel, pathToScaler) function
+    # @param pathToModel Path to the model
+    # @param pathToScaler Path to the scaler
+    # @returns Instance of modelClass with loaded model and scaler
+    def fGetModel(self, modelClass, pathToModel, pathToScaler):
+        key = self.__fKey(pathToModel, pathToScaler)
+        version = self.__fVersion(pathToModel, pathToScaler)
+
+        entry = self.models.get(key)
+        if entry is not None and entry[0] == version and isinstance(entry[1], modelClass):
+            self.hits += 1
+            return entry[1]
+
+        logger.debug(f"Load model {pathToModel} into the registry.")
+        model = modelClass()
+        model.fLoad(pathToModel, pathToScaler)
+        self.models[key] = (version, model)
+        self.loads += 1
+
+        return model
+
+    ## Removes all models which are not in use anymore
+    #
+    # @param modelsInUse List of model instances which shall be kept in the registry
+    def fPrune(self, modelsInUse):
+        idsInUse = {id(model) for model in modelsInUse}
+        for key in list(self.models.keys()):
+            if id(self.models[key][1]) not in idsInUse:
+                logger.debug(f"Remove model {key[0]} from the registry.")
+                del self.models[key]
+
+    ## Removes all models from the registry
+    def fClear(self):
+        self.models = {}
+
+    ## Returns the number of models in the registry
+    def __len__(self):
+        return len(self.models)
@@ -0,0 +1,128 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger()
+
+
+## Class which predicts with the weights of a Keras model of dense layers using only NumPy
+#
+# The weights and the parameters of the scaler are saved in one .npz file (see fSave and exportModels.py), so the
+# prediction needs neither TensorFlow nor scikit-learn. It can replace SOAIOpenAirCalibrationModel and
+# SOAITrafficRegression once the models are exported.
+class SOAINumpyModel():
+
+    # Activations of the dense layers which are supported
+    activations = {"relu": lambda x: np.maximum(x, 0),
+                   "linear": lambda x: x,
+                   "tanh": np.tanh,
+                   "sigmoid": lambda x: 1 / (1 + np.exp(-x))}
+
+    ## Initilizes an empty model
+    def __init__(self):
+        self.layers = None
+        self.activationNames = None
+        self.scalerScale = None
+        self.scalerOffset = None
+
+    ## Loads the model from a .npz file
+    #
+    # @param pathToModel Path to the .npz file
+    # @param pathToScaler Not used, the scaler is saved in the .npz file. Exists to match fLoad of the other models.
+    def fLoad(self, pathToModel, pathToScaler=None):
+        logger.debug(f"Load model from path {pathToModel}")
+        with np.load(pathToModel, allow_pickle=False) as f:
+            self.activationNames = [str(a) for a in f["activations"]]
+            self.layers = [(f[f"W{i}"], f[f"b{i}"]) for i in range(1, len(self.activationNames) + 1)]
+            self.scalerScale = f["scalerScale"]
+            self.scalerOffset = f["scalerOffset"]
+
+    ## Saves the model to a .npz file
+    #
+    # @param pathToModel Path to the .npz file
+    def fSave(self, pathToModel):
+        if self.layers is None:
+            raise Exception("Load the model etc. first.")
+
+        arrays = {"activations": np.array(self.activationNames), "scalerScale": self.scalerScale, "scalerOffset": self.scalerOffset}
+        for i, (W, b) in enumerate(self.layers, 1):
+            arrays[f"W{i}"] = W
+            arrays[f"b{i}"] = b
+
+        with open(pathToModel, "wb") as f:
+            np.savez(f, **arrays)
+
+    ## Takes over the weights of a Keras model and the parameters of its scaler
+    #
+    # @param model Keras model which consists of Dense layers (input, dropout etc. layers without weights are skipped)
+    # @param scaler Fitted MinMaxScaler or StandardScaler
+    # @returns The model itself
+    def fFromKeras(self, model, scaler):
+        layers = []
+        activationNames = []
+        for layer in model.layers:
+            if len(layer.get_weights()) == 0:
+                continue
+
+            activation = layer.get_config().get("activation")
+            if type(layer).__name__ != "Dense" or activation not in self.activations:
+                raise Exception(f"Layer {layer.name} of type {type(layer).__name__} with activation {activation} is not supported.")
+
+            W, b = layer.get_weights()
+            layers.append((W.astype(np.float64), b.astype(np.float64)))
+            activationNames.append(activation)
+
+        if hasattr(scaler, "min_"):
+            # MinMaxScaler: x * scale_ + min_
+            scalerScale, scalerOffset = scaler.scale_, scaler.min_
+        elif hasattr(scaler, "mean_"):
+            # StandardScaler: (x - mean_) / scale_
+            scalerScale = 1 / scaler.scale_
+            scalerOffset = -scaler.mean_ / scaler.scale_
+        else:
+            raise Exception(f"Scaler of type {type(scaler).__name__} is not supported.")
+
+        self.layers = layers
+        self.activationNames = activationNames
+        self.scalerScale = np.asarray(scalerScale, dtype=np.float64)
+        self.scalerOffset = np.asarray(scalerOffset, dtype=np.float64)
+
+        return self
+
+    ## Predicts the value given some features
+    #
+    # @param data Numpy array with shape (None, nFeatures). These are the features and need to be given in the correct order.
+    # @param normalize Boolean whether the data needs to be normalized or not
+    # @returns value Predicted value with shape (None, 1) like Keras predict
+    def fPredict(self, data, normalize=True):
+        if self.layers is None:
+            raise Exception("Load the model etc. first.")
+
+        value = np.asarray(data, dtype=np.float64)
+        if normalize:
+            value = self.fNormalize(value)
+
+        for (W, b), activation in zip(self.layers, self.activationNames):
+            value = self.activations[activation](value @ W + b)
+
+        return value
+
+    ## Applies the scaler the model was trained with
+    #
+    # @param data Numpy array with shape (None, nFeatures)
+    # @returns Normalized data
+    def fNormalize(self, data):
+        return np.asarray(data, dtype=np.float64) * self.scalerScale + self.scalerOffset
+
+    ## Returns the parameters of the scaler and the model for the SOAICalibrationEngine
+    #
+    # The model needs the architecture of SOAIOpenAirCalibrationModel.fCreateModel (Dense(n, relu) followed by Dense(1)).
+    # @returns Dictionary with scalerScale (3), scalerOffset (3), W1 (3, n), b1 (n), W2 (n, 1) and b2 (1)
+    def fGetParameters(self):
+        if self.layers is None:
+            raise Exception("Load the model etc. first.")
+
+        if self.activationNames != ["relu", "linear"] or self.layers[1][0].shape[1] != 1:
+            raise Exception(f"The model has not the architecture of fCreateModel (activations {self.activationNames}).")
+
+        return {"scalerScale": self.scalerScale, "scalerOffset": self.scalerOffset,
+                "W1": self.layers[0][0], "b1": self.layers[0][1], "W2": self.layers[1][0], "b2": self.layers[1][1]}
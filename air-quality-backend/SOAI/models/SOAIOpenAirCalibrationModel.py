@@ -1,15 +1,15 @@
-import tensorflow as tf
+from SOAI.models.SOAINumpyModel import SOAINumpyModel
+
 import pickle
 from pathlib import Path
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.model_selection import train_test_split
-from tensorflow import keras
 
 import logging
 logger = logging.getLogger()
 
 
 ## Class which represents a calibration model for the OpenAirSensors
+#
+# TensorFlow and scikit-learn are imported when a model is loaded or trained, so importing this module is cheap.
 class SOAIOpenAirCalibrationModel():
 
     ## Initilizes a calibration model which is saved on disk
@@ -18,6 +18,8 @@ class SOAIOpenAirCalibrationModel():
         self.scaler = None
 
     def fLoad(self, pathToModel, pathToScaler):
+        import tensorflow as tf
+
         logger.debug(f"Load model from path {pathToModel}")
         self.model = tf.keras.models.load_model(pathToModel)
         self.scaler = pickle.load(open(Path(pathToScaler), 'rb'))  # Path is needed to deal with Windows and Linux
@@ -48,6 +50,17 @@ class SOAIOpenAirCalibrationModel():
         dataNormalized = self.scaler.transform(data)
         return dataNormalized
 
+    ## Returns the parameters of the scaler and the model as NumPy arrays
+    #
+    # The scaler is given as affine transformation x * scalerScale + scalerOffset. The model needs the architecture
+    # of fCreateModel (Dense(n, relu) followed by Dense(1)).
+    # @returns Dictionary with scalerScale (3), scalerOffset (3), W1 (3, n), b1 (n), W2 (n, 1) and b2 (1)
+    def fGetParameters(self):
+        if self.scaler is None or self.model is None:
+            raise Exception("Load the model etc. first.")
+
+        return SOAINumpyModel().fFromKeras(self.model, self.scaler).fGetParameters()
+
     ## Function to train a calibration model
     #
     # @param features Features for the calibration
@@ -55,6 +68,9 @@ class SOAIOpenAirCalibrationModel():
     # @param split Fraction which is taken as the test set
     # @returns  Parameters of the training process.
     def fTrain(self, features, target, split=0.1, epochs=50, learningRate=0.005):
+        from sklearn.preprocessing import MinMaxScaler
+        from sklearn.model_selection import train_test_split
+
         self.scaler = MinMaxScaler()
         featuresScaled = self.scaler.fit_transform(features)
 
@@ -77,6 +93,8 @@ class SOAIOpenAirCalibrationModel():
 
     ## Creates and returns the model which is used for the calibration.
     def fCreateModel(self, nFeatures, learningRate=0.005, epochs=50):
+        import tensorflow as tf
+        from tensorflow import keras
 
         # Define NN via keras functional API
         input1 = keras.layers.Input(nFeatures)
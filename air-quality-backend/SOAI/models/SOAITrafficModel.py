@@ -1,4 +1,3 @@
-import tensorflow as tf
 import pickle
 from pathlib import Path
 import pandas as pd
@@ -8,6 +7,8 @@ logger = logging.getLogger()
 
 
 ## Class which represents all models which are base on traffic data
+#
+# TensorFlow is imported when a model is loaded or trained, so importing this module is cheap.
 class SOAITrafficModel():
 
     features = ["no2", "rgreen", "rorange", "rred", "rbrown", "hum", "temp", "wg"]
@@ -19,6 +20,8 @@ class SOAITrafficModel():
         self.scaler = None
 
     def fLoad(self, pathToModel, pathToScaler):
+        import tensorflow as tf
+
         logger.debug(f"Load model from path {pathToModel}")
         self.model = tf.keras.models.load_model(pathToModel)
         self.scaler = pickle.load(open(Path(pathToScaler), 'rb'))  # Path is needed to deal with Windows and Linux
@@ -1,7 +1,3 @@
-import tensorflow as tf
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-
 from SOAI.models.SOAITrafficModel import SOAITrafficModel
 
 import logging
@@ -23,6 +19,9 @@ class SOAITrafficRegression(SOAITrafficModel):
     # @param split Fraction which is taken as the test set
     # @returns  Parameters of the training process.
     def fTrain(self, dataSensor, dataTraffic, split=0.1, epochs=50, learningRate=0.005):
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.model_selection import train_test_split
+
         for col in self.features + [self.target]:
             if col not in dataSensor.columns + dataTraffic.columns:
                 raise Exception(f"Column {col} could not be found in training data.")
@@ -46,6 +45,7 @@ class SOAITrafficRegression(SOAITrafficModel):
 
     ## Creates and returns the model which is used for the calibration.
     def fCreateModel(self, nFeatures, learningRate=0.005, epochs=50):
+        import tensorflow as tf
 
         # Define NN via keras functional API
         input1 = tf.keras.Input(nFeatures)
@@ -1,5 +1,6 @@
 from .SOAISensor import SOAISensor
 from SOAI.models.SOAITrafficRegression import SOAITrafficRegression
+from SOAI.models.SOAINumpyModel import SOAINumpyModel
 
 import os
 import logging
@@ -37,27 +38,51 @@ class SOAILanuvSensor(SOAISensor):
 
         return dataDict["no2"]
 
+    ## Since the data is already a calibrated NO2 value this is a dummy function
+    #
+    # @param data Pandas data frame with the column no2 (measurment corresponds to NO2 value)
+    # @returns NumPy array with one NO2 value per row
+    def fDataToNO2Batch(self, data):
+        if "no2" not in data.columns:
+            logger.error("Features have no value for no2.")
+            raise Exception("Features have no value no2.")
+
+        return np.asarray(data["no2"], dtype=np.float64)
+
     ## Loads the traffic model
     #
+    # If an exported model (same path with the extension .npz, see exportModels.py) exists, it is loaded as
+    # SOAINumpyModel and TensorFlow is not needed.
     # @param pathToModel Path to model to use for calibration
     # @param pathToScaler Path to scaler which is used to scale the data before prediction
-    def fLoadTrafficModel(self, pathToModel, pathToScaler):
-        logger.debug(f"Set up calibration model for OpenAir Cologne sensior with ID {self.ID} at location {self.location}")
-        if os.path.isfile(pathToModel):
-            self.trafficModel = SOAITrafficRegression()
-            self.trafficModel.fLoad(pathToModel, pathToScaler)
+    # @param modelRegistry Optional SOAIModelRegistry. If given an already loaded model is reused instead of loading it again.
+    def fLoadTrafficModel(self, pathToModel, pathToScaler, modelRegistry=None):
+        logger.debug(f"Set up traffic model for Lanuv sensor with ID {self.ID} at location {self.location}")
+        pathToNumpyModel = os.path.splitext(pathToModel)[0] + ".npz"
+        if os.path.isfile(pathToNumpyModel):
+            if modelRegistry is not None:
+                self.trafficModel = modelRegistry.fGetModel(SOAINumpyModel, pathToNumpyModel, pathToNumpyModel)
+            else:
+                self.trafficModel = SOAINumpyModel()
+                self.trafficModel.fLoad(pathToNumpyModel)
+        elif os.path.isfile(pathToModel):
+            if modelRegistry is not None:
+                self.trafficModel = modelRegistry.fGetModel(SOAITrafficRegression, pathToModel, pathToScaler)
+            else:
+                self.trafficModel = SOAITrafficRegression()
+                self.trafficModel.fLoad(pathToModel, pathToScaler)
         else:
             logger.warning(f"No traffic model found in path {pathToModel}. Set sensor as inactive.")
             self.fSetInactive()
 
     ## Sets a already loaded traffic model
     #
-    # @param model Instance of the SOAIOpenAirCalibrationModel
+    # @param model Instance of the SOAITrafficRegression or SOAINumpyModel
     def fSetTrafficModel(self, model):
-        if type(model).__name__ == "SOAITrafficRegression":
+        if type(model).__name__ in ["SOAITrafficRegression", "SOAINumpyModel"]:
             self.trafficModel = model
         else:
-            raise Exception(f"Traffic model needs to be of type SOAITrafficModel and not {type(model).__name__}")
+            raise Exception(f"Traffic model needs to be of type SOAITrafficModel or SOAINumpyModel and not {type(model).__name__}")
 
     ## Returns the traffic model
     def fGetTrafficModel(self):
@@ -1,5 +1,6 @@
 from SOAI.sensors.SOAISensor import SOAISensor
 from SOAI.models.SOAIOpenAirCalibrationModel import SOAIOpenAirCalibrationModel
+from SOAI.models.SOAINumpyModel import SOAINumpyModel
 
 import os
 import logging
@@ -26,25 +27,38 @@ class SOAIOpenAirSensor(SOAISensor):
 
     ## Loads the calibration model
     #
+    # If an exported model (same path with the extension .npz, see exportModels.py) exists, it is loaded as
+    # SOAINumpyModel and TensorFlow is not needed.
     # @param pathToModel Path to model to use for calibration
     # @param pathToScaler Path to scaler which is used to scale the data before prediction
-    def fLoadCalibration(self, pathToModel, pathToScaler):
+    # @param modelRegistry Optional SOAIModelRegistry. If given an already loaded model is reused instead of loading it again.
+    def fLoadCalibration(self, pathToModel, pathToScaler, modelRegistry=None):
         logger.debug(f"Set up calibration model for OpenAir Cologne sensior with ID {self.ID} at location {self.location}")
-        if os.path.isfile(pathToModel):
-            self.calibModel = SOAIOpenAirCalibrationModel()
-            self.calibModel.fLoad(pathToModel, pathToScaler)
+        pathToNumpyModel = os.path.splitext(pathToModel)[0] + ".npz"
+        if os.path.isfile(pathToNumpyModel):
+            if modelRegistry is not None:
+                self.calibModel = modelRegistry.fGetModel(SOAINumpyModel, pathToNumpyModel, pathToNumpyModel)
+            else:
+                self.calibModel = SOAINumpyModel()
+                self.calibModel.fLoad(pathToNumpyModel)
+        elif os.path.isfile(pathToModel):
+            if modelRegistry is not None:
+                self.calibModel = modelRegistry.fGetModel(SOAIOpenAirCalibrationModel, pathToModel, pathToScaler)
+            else:
+                self.calibModel = SOAIOpenAirCalibrationModel()
+                self.calibModel.fLoad(pathToModel, pathToScaler)
         else:
             logger.warning(f"No calibration model found in path {pathToModel}. Set sensor as inactive.")
             self.fSetInactive()
 
     ## Sets a already loaded calibration model
     #
-    # @param model Instance of the SOAIOpenAirCalibrationModel
+    # @param model Instance of the SOAIOpenAirCalibrationModel or SOAINumpyModel
     def fSetCalibration(self, model):
-        if type(model).__name__ == "SOAIOpenAirCalibrationModel":
+        if type(model).__name__ in ["SOAIOpenAirCalibrationModel", "SOAINumpyModel"]:
             self.calibModel = model
         else:
-            raise Exception(f"Calibration model needs to be of type SOAIOpenAirCalibrationModel and not {type(model).__name__}")
+            raise Exception(f"Calibration model needs to be of type SOAIOpenAirCalibrationModel or SOAINumpyModel and not {type(model).__name__}")
 
     ## Returns the calibration model
     def fGetCalibration(self):
@@ -77,3 +91,27 @@ class SOAIOpenAirSensor(SOAISensor):
         no2 = self.calibModel.fPredict(data)
 
         return no2
+
+    ## Converts all rows of a data frame to NO2 values with one prediction of the calibration model
+    #
+    # @param data Pandas data frame with the columns r2, temp and hum (in this case measurment corresponds to r2)
+    # @returns NumPy array with one NO2 value per row
+    def fDataToNO2Batch(self, data):
+        if self.calibModel is None:
+            logger.warning("No calibration model found. Is this sensor calibrated?")
+            raise Exception("No calibration model found.")
+
+        # Check if all features are available
+        neededColumns = ["r2", "temp", "hum"]
+        for col in neededColumns:
+            if col not in data.columns:
+                logger.error(f"Features have no value for {col}.")
+                raise Exception(f"Features have no value {col}.")
+
+        if len(data) == 0:
+            return np.zeros(0)
+
+        features = np.asarray(data[["hum", "temp", "r2"]], dtype=np.float64)
+        no2 = self.calibModel.fPredict(features)
+
+        return np.asarray(no2).reshape(-1)
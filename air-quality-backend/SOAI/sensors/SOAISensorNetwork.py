@@ -1,5 +1,6 @@
 from .SOAIOpenAirSensor import SOAIOpenAirSensor
 from .SOAILanuvSensor import SOAILanuvSensor
+from SOAI.models.SOAICalibrationEngine import SOAICalibrationEngine
 
 import pandas as pd
 import logging
@@ -31,8 +32,12 @@ class SOAISensorNetwork():
     #   Sensor calibration: Path to the calibration model for OpenAirCologn sensors
     #
     # @param pathToConfigFile Path and filename of the configuration file
-    def __init__(self, pathToConfigFile):
+    # @param modelRegistry Optional SOAIModelRegistry which keeps the loaded models. If given the models are only loaded once and reused by later networks.
+    def __init__(self, pathToConfigFile, modelRegistry=None):
         self.listSensors = []
+        self.modelRegistry = modelRegistry
+        self.calibrationEngine = None
+        self.engineModels = {}
 
         with open(pathToConfigFile) as f:
             for line in f:
@@ -57,7 +62,7 @@ class SOAISensorNetwork():
                     if len(configs) > 5:
                         pathModel = os.environ.get("SOAI") + "/" + configs[5] + "/" + sensorID + ".h5"
                         pathScaler = os.environ.get("SOAI") + "/" + configs[5] + "/" + sensorID + "_scaler.sav"
-                        sensorTEMP.fLoadCalibration(pathModel, pathScaler)
+                        sensorTEMP.fLoadCalibration(pathModel, pathScaler, self.modelRegistry)
 
                     self.listSensors.append(sensorTEMP)
 
@@ -89,7 +94,7 @@ class SOAISensorNetwork():
                 pathModel = os.environ.get("SOAI") + "/" + configs[2] + "/" + sensorID + ".h5"
                 pathScaler = os.environ.get("SOAI") + "/" + configs[2] + "/" + sensorID + "_scaler.sav"
 
-                self.fFindSensorFromID(sensorType, sensorID).fLoadTrafficModel(pathModel, pathScaler)
+                self.fFindSensorFromID(sensorType, sensorID).fLoadTrafficModel(pathModel, pathScaler, self.modelRegistry)
 
     ## Check if a given sensor type is available in the sensor network
     #
@@ -125,6 +130,35 @@ class SOAISensorNetwork():
 
             logger.info(f"Status of {sensorType} sensors:\n\t{countActive} of {countSum} are active.\n\t{countWronglyActive} of these have an error.")
 
+    ## Returns all models (calibration and traffic models) which are used by the sensors of the network
+    def fGetModels(self):
+        models = []
+        for sensor in self.listSensors:
+            if sensor.fGetType() == "OpenAirCologne" and sensor.fHasCalibration():
+                models.append(sensor.fGetCalibration())
+            elif sensor.fGetType() == "Lanuv" and sensor.fHasTrafficModel():
+                models.append(sensor.fGetTrafficModel())
+
+        return models
+
+    ## Stacks the calibration models of all OpenAir Cologne sensors into one SOAICalibrationEngine
+    #
+    # The engine is built on the first call of fDataToNO2. Sensors whose calibration model is changed afterwards are
+    # converted with their own model until the engine is built again.
+    # @returns The SOAICalibrationEngine
+    def fBuildCalibrationEngine(self):
+        models = {sensor.fGetID(): sensor.fGetCalibration() for sensor in self.listSensors
+                  if sensor.fGetType() == "OpenAirCologne" and sensor.fHasCalibration()}
+
+        self.calibrationEngine = SOAICalibrationEngine()
+        self.engineModels = {ID: models[ID] for ID in self.calibrationEngine.fBuild(models)}
+
+        return self.calibrationEngine
+
+    ## Returns a boolean whether the calibration engine converts the data of a sensor
+    def __fUsesEngine(self, sensor):
+        return self.engineModels.get(sensor.fGetID()) is sensor.fGetCalibration() and sensor.fGetCalibration() is not None
+
     ## Returns the corresponding sensor
     #
     # @param ID of the sensor
@@ -202,29 +236,42 @@ class SOAISensorNetwork():
             logger.error("No column with sensorID's were found.")
             raise Exception("No column with sensorID's were found.")
 
-        # Convert the data to NO2 measurments using the sensor network
+        if self.calibrationEngine is None:
+            self.fBuildCalibrationEngine()
+
+        # Convert the data to NO2 measurments using the sensor network. The rows of a sensor are converted at once,
+        # the rows of the sensors of the calibration engine are converted all together.
         no2 = np.ones((len(data))) * (-1)  # Default values which are filled in the next for loop
-        for ID in data["sensorID"].unique():
-            dataTEMP = data[data["sensorID"] == ID]
-            indexTEMP = data["sensorID"] == ID
-            indexTEMP = [i for i, x in enumerate(indexTEMP.values) if x]
+        engineRows = []
+        codes, IDs = pd.factorize(data["sensorID"])
+        for code, indexTEMP in pd.Series(np.arange(len(data))).groupby(codes).indices.items():
+            # Rows without sensorID have the code -1
+            if code < 0:
+                continue
 
+            ID = IDs[code]
             sensor = self.fFindSensorFromID(ID)
-            no2TEMP = np.ones((len(dataTEMP))) * (-1)
 
             if sensor is None:
                 logger.info(f"Skip non-existing sensor with ID {ID}")
+            elif sensor.fIsActive() is False:
+                logger.info(f"Skip unactive sensor with ID {ID}")
+            elif sensor.fGetType() == "OpenAirCologne" and self.__fUsesEngine(sensor):
+                engineRows.append(indexTEMP)
             else:
-                if sensor.fIsActive() is False:
-                    logger.info(f"Skip unactive sensor with ID {ID}")
-                else:
-                    # Iterate over data frame with rows as dicts and get prediction
-                    countTEMP = 0
-                    for k, row in dataTEMP.iterrows():
-                        no2TEMP[countTEMP] = sensor.fDataToNO2(row)
-                        countTEMP += 1
-
-                no2[indexTEMP] = no2TEMP
+                no2[indexTEMP] = sensor.fDataToNO2Batch(data.iloc[indexTEMP])
+
+        if len(engineRows) > 0:
+            # Check if all features are available
+            neededColumns = ["r2", "temp", "hum"]
+            for col in neededColumns:
+                if col not in data.columns:
+                    logger.error(f"Features have no value for {col}.")
+                    raise Exception(f"Features have no value {col}.")
+
+            rows = np.concatenate(engineRows)
+            features = np.asarray(data[["hum", "temp", "r2"]].iloc[rows], dtype=np.float64)
+            no2[rows] = self.calibrationEngine.fPredict(np.asarray(data["sensorID"].iloc[rows]), features)
 
         data["no2"] = no2
 
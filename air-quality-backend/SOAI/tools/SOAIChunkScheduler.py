@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import time
+import logging
+
+logger = logging.getLogger()
+
+
+## Token bucket which limits the rate of requests
+#
+# The bucket holds at most burst tokens and is refilled with rate tokens per second.
+# Every request takes one token and waits if the bucket is empty.
+class SOAITokenBucket():
+
+    ## Initializes a full bucket
+    #
+    # @param rate Tokens per second
+    # @param burst Size of the bucket
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = burst
+        self.lastRefill = clock()
+        self.lock = threading.Lock()
+
+    ## Takes one token, waits until a token is available if the bucket is empty
+    #
+    # @returns Time in seconds which was waited
+    def fAcquire(self):
+        waited = 0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.lastRefill) * self.rate)
+                self.lastRefill = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                wait = (1 - self.tokens) / self.rate
+
+            self.sleep(wait)
+            waited += wait
+
+
+## Class which loads the chunks of a long time range concurrently
+#
+# At most parallelism chunks are loaded at the same time and the start of the loads is limited by a token bucket
+# in order not to overuse the data base. The results are returned in the order of the chunks.
+class SOAIChunkScheduler():
+
+    ## Constructor
+    #
+    # @param parallelism Maximal number of chunks which are loaded at the same time
+    # @param rate Maximal number of chunks per second which are started
+    # @param burst Number of chunks which can be started at once
+    def __init__(self, parallelism=2, rate=0.2, burst=None):
+        self.parallelism = max(1, parallelism)
+        self.bucket = SOAITokenBucket(rate, self.parallelism if burst is None else burst)
+        self.stats = []
+
+    ## Loads one chunk and records its statistics
+    def __fLoad(self, chunk, fLoadChunk):
+        waited = self.bucket.fAcquire()
+
+        tStart = time.monotonic()
+        result = fLoadChunk(chunk)
+        latency = time.monotonic() - tStart
+
+        rows = len(result) if result is not None else 0
+        self.stats.append({"chunk": chunk, "rows": rows, "latency": latency, "waited": waited})
+        logger.info(f"Loaded chunk {chunk} with {rows} rows in {latency:.2f}s (waited {waited:.2f}s).")
+
+        return result
+
+    ## Loads the chunks and yields the results in the order of the chunks
+    #
+    # Only parallelism chunks are loaded ahead of the consumer, so the memory is bounded by a few chunks.
+    # @param chunks List of chunks (e.g. (start, end) tuples), ordered by time
+    # @param fLoadChunk Function which loads one chunk and returns a data frame
+    def fIter(self, chunks, fLoadChunk):
+        self.stats = []
+        chunks = iter(chunks)
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            futures = deque()
+            try:
+                for chunk in chunks:
+                    futures.append(executor.submit(self.__fLoad, chunk, fLoadChunk))
+                    if len(futures) >= self.parallelism:
+                        break
+
+                while futures:
+                    result = futures.popleft().result()
+                    for chunk in chunks:
+                        futures.append(executor.submit(self.__fLoad, chunk, fLoadChunk))
+                        break
+                    yield result
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    ## Loads the chunks and returns the results in the order of the chunks
+    #
+    # @param chunks List of chunks (e.g. (start, end) tuples), ordered by time
+    # @param fLoadChunk Function which loads one chunk and returns a data frame
+    # @returns List of the results
+    def fRun(self, chunks, fLoadChunk):
+        return list(self.fIter(chunks, fLoadChunk))
+
+    ## Returns the summary of the statistics of the last run
+    def fGetStats(self):
+        latency = [s["latency"] for s in self.stats]
+        return {"chunks": len(self.stats),
+                "rows": sum(s["rows"] for s in self.stats),
+                "maxLatency": max(latency) if latency else 0,
+                "totalLatency": sum(latency),
+                "waited": sum(s["waited"] for s in self.stats)}
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger()
+
+
+## Class which keeps the most recent measurements of one sensor in preallocated NumPy arrays
+#
+# Every field is a fixed size ring. Each value is written twice (at position i and i + capacity),
+# so the last n values of a field are always a contiguous slice and can be returned without copying.
+class SOAIRingBuffer():
+
+    ## Initializes an empty ring buffer
+    #
+    # @param fields List of the names of the fields (e.g. ["r2", "hum", "temp", "no2"])
+    # @param capacity Number of values which are kept per field
+    def __init__(self, fields, capacity):
+        self.fields = list(fields)
+        self.fieldIndex = {field: i for i, field in enumerate(self.fields)}
+        self.capacity = capacity
+
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.values = np.full((len(self.fields), 2 * capacity), np.nan)
+        self.head = 0
+        self.size = 0
+
+    ## Returns the number of values in the buffer
+    def __len__(self):
+        return self.size
+
+    ## Writes values behind the newest value
+    def __fWrite(self, timestamps, values):
+        if len(timestamps) > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[:, -self.capacity:]
+
+        position = (self.head + np.arange(len(timestamps))) % self.capacity
+        for offset in (0, self.capacity):
+            self.timestamps[position + offset] = timestamps
+            self.values[:, position + offset] = values
+
+        self.head = (self.head + len(timestamps)) % self.capacity
+        self.size = min(self.capacity, self.size + len(timestamps))
+
+    ## Overwrites values with timestamps which are already in the buffer. Unknown timestamps are ignored.
+    def __fUpdate(self, timestamps, values):
+        start = self.head - self.size + self.capacity
+        window = self.timestamps[start:self.head + self.capacity]
+
+        idx = np.searchsorted(window, timestamps)
+        found = idx < len(window)
+        found[found] = window[idx[found]] == timestamps[found]
+        if np.any(~found):
+            logger.debug(f"Skip {np.sum(~found)} values which are older than the buffer or not on a known timestamp.")
+
+        position = (start + idx[found]) % self.capacity
+        for offset in (0, self.capacity):
+            self.values[:, position + offset] = values[:, found]
+
+    ## Appends values to the buffer
+    #
+    # Values with a timestamp which is already in the buffer replace the old values (e.g. re-fetched values).
+    # @param timestamps Numpy array with timestamps as int64 (nanoseconds since epoch)
+    # @param values Numpy array with shape (number of fields, number of timestamps)
+    def fAppend(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(self.fields), len(timestamps))
+        if len(timestamps) == 0:
+            return
+
+        order = np.argsort(timestamps, kind="mergesort")
+        timestamps = timestamps[order]
+        values = values[:, order]
+
+        # For equal timestamps the last value wins
+        keep = np.append(timestamps[1:] != timestamps[:-1], True)
+        timestamps = timestamps[keep]
+        values = values[:, keep]
+
+        if self.size > 0:
+            isNew = timestamps > self.fLatestTimestamp()
+            if np.any(~isNew):
+                self.__fUpdate(timestamps[~isNew], values[:, ~isNew])
+            timestamps = timestamps[isNew]
+            values = values[:, isNew]
+
+        if len(timestamps) > 0:
+            self.__fWrite(timestamps, values)
+
+    ## Returns the timestamp of the newest value (int64 nanoseconds) or None if the buffer is empty
+    def fLatestTimestamp(self):
+        if self.size == 0:
+            return None
+        return self.timestamps[self.head - 1 + self.capacity]
+
+    ## Returns the newest value of a field or NaN if the buffer is empty
+    #
+    # @param field Name of the field
+    def fLatest(self, field):
+        if self.size == 0:
+            return np.nan
+        return self.values[self.fieldIndex[field], self.head - 1 + self.capacity]
+
+    ## Returns the newest values of all fields as numpy array
+    def fLatestValues(self):
+        if self.size == 0:
+            return np.full(len(self.fields), np.nan)
+        return self.values[:, self.head - 1 + self.capacity]
+
+    ## Returns the last n values of a field as views on the buffer (no copy)
+    #
+    # @param field Name of the field
+    # @param n Number of values, by default all values in the buffer
+    # @returns timestamps, values Numpy arrays ordered by time. The views are only valid until the next append.
+    def fWindow(self, field, n=None):
+        if n is None or n > self.size:
+            n = self.size
+        end = self.head + self.capacity
+        return self.timestamps[end - n:end], self.values[self.fieldIndex[field], end - n:end]
+
+
+## Class which keeps one SOAIRingBuffer per sensor
+#
+# The store is filled with data frames as they are returned by the handlers (timestamp index and a sensorID column)
+# and returns the latest values of all sensors without building data frames of the whole history.
+class SOAIRingBufferStore():
+
+    ## Initializes an empty store
+    #
+    # @param fields List of the names of the fields which are kept
+    # @param capacity Number of values which are kept per sensor and field
+    def __init__(self, fields, capacity):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.buffers = {}
+
+    ## Returns the number of sensors in the store
+    def __len__(self):
+        return len(self.buffers)
+
+    ## Removes all sensors from the store
+    def fClear(self):
+        self.buffers = {}
+
+    ## Removes the sensors whose newest value is older than a timestamp
+    #
+    # @param before Timestamp (UTC), None keeps all sensors
+    # @returns Number of removed sensors
+    def fEvict(self, before):
+        if before is None:
+            return 0
+        before = pd.Timestamp(before).value
+        stale = [sensorID for sensorID, buffer in self.buffers.items() if len(buffer) == 0 or buffer.fLatestTimestamp() < before]
+        for sensorID in stale:
+            del self.buffers[sensorID]
+        return len(stale)
+
+    ## Appends the rows of a data frame
+    #
+    # @param data Pandas data frame with timestamp index and a sensorID column. Missing fields are filled with NaN.
+    def fAppendFrame(self, data):
+        if len(data) == 0:
+            return
+
+        timestamps = data.index.values.astype("datetime64[ns]").astype(np.int64)
+        values = np.full((len(self.fields), len(data)), np.nan)
+        for i, field in enumerate(self.fields):
+            if field in data.columns:
+                values[i] = np.asarray(data[field], dtype=np.float64)
+
+        codes, sensorIDs = pd.factorize(data["sensorID"])
+        order = np.argsort(codes, kind="mergesort")
+        bounds = np.searchsorted(codes[order], np.arange(len(sensorIDs) + 1))
+
+        for i, sensorID in enumerate(sensorIDs):
+            rows = order[bounds[i]:bounds[i + 1]]
+            if sensorID not in self.buffers:
+                self.buffers[sensorID] = SOAIRingBuffer(self.fields, self.capacity)
+            self.buffers[sensorID].fAppend(timestamps[rows], values[:, rows])
+
+    ## Returns the newest timestamp over all sensors as pandas timestamp (UTC) or None if the store is empty
+    def fWatermark(self):
+        latest = [buffer.fLatestTimestamp() for buffer in self.buffers.values() if len(buffer) > 0]
+        if len(latest) == 0:
+            return None
+        return pd.Timestamp(max(latest), tz="UTC")
+
+    ## Returns the newest value of a field of one sensor or NaN if the sensor is unknown
+    def fLatest(self, sensorID, field):
+        if sensorID not in self.buffers:
+            return np.nan
+        return self.buffers[sensorID].fLatest(field)
+
+    ## Returns the last n values of a field of one sensor as views (see SOAIRingBuffer.fWindow)
+    def fWindow(self, sensorID, field, n=None):
+        if sensorID not in self.buffers:
+            return np.array([], dtype=np.int64), np.array([])
+        return self.buffers[sensorID].fWindow(field, n)
+
+    ## Returns the newest values of all sensors
+    #
+    # @param since Optional timestamp, sensors whose newest value is older are left out
+    # @returns Pandas data frame with one row per sensor, timestamp index, a sensorID column and one column per field
+    def fLatestFrame(self, since=None):
+        since = None if since is None else pd.Timestamp(since).value
+        sensorIDs = [sensorID for sensorID, buffer in self.buffers.items()
+                     if len(buffer) > 0 and (since is None or buffer.fLatestTimestamp() >= since)]
+        timestamps = np.array([self.buffers[sensorID].fLatestTimestamp() for sensorID in sensorIDs], dtype=np.int64)
+        values = np.array([self.buffers[sensorID].fLatestValues() for sensorID in sensorIDs]).reshape(len(sensorIDs), len(self.fields))
+
+        df = pd.DataFrame(values, columns=self.fields)
+        df.insert(0, "sensorID", sensorIDs)
+        df.index = pd.to_datetime(timestamps, utc=True)
+        df.index.name = "timestamp"
+
+        return df
@@ -29,15 +29,12 @@ def main():
 
     # Get data
     dataHandler = SOAIDiskHandler()
-    dfOpenAir = dataHandler.fGetOpenAir(os.environ.get("SOAI") + "/data/openair/", selectValidData=True)
+    # Load only the columns which are needed for the calibration
+    dfOpenAir = dataHandler.fGetOpenAir(os.environ.get("SOAI") + "/data/openair/", selectValidData=True, columns=["hum", "r1", "r2", "temp"])
     dfOpenAirLocation = dataHandler.fGetOpenAirSensors()
-    dfLanuv = dataHandler.fGetLanuv(os.environ.get("SOAI") + "/data/lanuv/", selectValidData=True)
+    dfLanuv = dataHandler.fGetLanuv(os.environ.get("SOAI") + "/data/lanuv/", selectValidData=True, columns=["no2"])
     dfLanuvLocation = dataHandler.fGetLanuvSensors()
 
-    # Remove unecessary information and set time as an index
-    dfOpenAir = dfOpenAir.drop(["pm10", "pm25", "rssi"], axis=1)
-    dfLanuv = dfLanuv.drop(["NO", "OZON"], axis=1)
-
     # Get a list of tuples (lat, lon) for each sensor
     openAirLocations = list(zip(dfOpenAirLocation["lat"], dfOpenAirLocation["lon"]))
     lanuvLocations = list(zip(dfLanuvLocation["lat"], dfLanuvLocation["lon"]))
@@ -0,0 +1,26 @@
+import argparse
+import logging
+import os
+
+from SOAI.handler.SOAIDiskHandler import SOAIDiskHandler
+
+logger = logging.getLogger()
+
+
+# Merge the small files of every month of the OpenAir and Lanuv datasets into one file
+def main():
+    parser = argparse.ArgumentParser(description="Compact the parquet datasets in data/openair and data/lanuv.")
+    parser.add_argument("--migrate", action="store_true", help="Move the flat files (e.g. df_openair0.parquet) into the datasets first.")
+    args = parser.parse_args()
+
+    diskHandler = SOAIDiskHandler()
+
+    compacted = diskHandler.fCompactOpenAir(os.environ.get("SOAI") + "/data/openair/", migrateFiles=args.migrate)
+    logger.info(f"Compacted {compacted} months of OpenAir data.")
+
+    compacted = diskHandler.fCompactLanuv(os.environ.get("SOAI") + "/data/lanuv/", migrateFiles=args.migrate)
+    logger.info(f"Compacted {compacted} months of Lanuv data.")
+
+
+if __name__ == '__main__':
+    main()
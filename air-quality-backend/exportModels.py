@@ -0,0 +1,61 @@
+import argparse
+import logging
+import pickle
+import glob
+import os
+
+import numpy as np
+
+from SOAI.models.SOAINumpyModel import SOAINumpyModel
+
+logger = logging.getLogger()
+
+
+# Converts <id>.h5 and <id>_scaler.sav to <id>.npz and checks that the SOAINumpyModel predicts the same as Keras
+def fExportModel(pathToModel, tolerance, nSamples=1000):
+    import tensorflow as tf
+
+    pathToScaler = pathToModel[:-len(".h5")] + "_scaler.sav"
+    pathToNumpyModel = pathToModel[:-len(".h5")] + ".npz"
+
+    model = tf.keras.models.load_model(pathToModel)
+    with open(pathToScaler, "rb") as f:
+        scaler = pickle.load(f)
+
+    numpyModel = SOAINumpyModel().fFromKeras(model, scaler)
+
+    # Features which cover the normalized range of the training data and a bit more
+    normalized = np.random.RandomState(0).uniform(-0.5, 1.5, size=(nSamples, len(numpyModel.scalerScale)))
+    features = (normalized - numpyModel.scalerOffset) / numpyModel.scalerScale
+
+    expected = model.predict(scaler.transform(features))
+    error = np.max(np.abs(numpyModel.fPredict(features) - expected) / np.maximum(1, np.abs(expected)))
+    if error > tolerance:
+        raise Exception(f"The exported model of {pathToModel} differs by {error} from the Keras model.")
+
+    numpyModel.fSave(pathToNumpyModel)
+    logger.info(f"Exported {pathToModel} to {pathToNumpyModel} (max. relative error {error:.2e}).")
+
+
+# Export the Keras models of the given folders (e.g. savedModels/calibrations/v20191221), so they can be used without TensorFlow
+def main():
+    parser = argparse.ArgumentParser(description="Export the Keras models <id>.h5 and their scalers <id>_scaler.sav to <id>.npz.")
+    parser.add_argument("folders", nargs="+", help="Folders with the models.")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Maximal relative difference to the prediction of Keras.")
+    args = parser.parse_args()
+
+    failed = 0
+    for folder in args.folders:
+        for pathToModel in sorted(glob.glob(os.path.join(folder, "*.h5"))):
+            try:
+                fExportModel(pathToModel, args.tolerance)
+            except Exception as e:
+                logger.error(f"Could not export {pathToModel}: {e}")
+                failed += 1
+
+    if failed > 0:
+        raise SystemExit(f"{failed} models could not be exported.")
+
+
+if __name__ == '__main__':
+    main()
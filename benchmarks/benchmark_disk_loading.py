@@ -0,0 +1,59 @@
+"""Measure how loading the parquet files with SOAIDiskHandler scales with the
+number of threads, on the bundled data/openair and data/lanuv sets and on a
+synthetic set of 100 files.
+
+Run from the repository root:
+    python benchmarks/benchmark_disk_loading.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'air-quality-backend'))
+
+from SOAI.handler.SOAIDiskHandler import SOAIDiskHandler  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(__file__), '..', 'air-quality-backend', 'data')
+
+
+def make_synthetic(path, n_files=100, rows=20000):
+    rng = np.random.RandomState(0)
+    start = pd.Timestamp('2019-01-01', tz='UTC')
+    for i in range(n_files):
+        df = pd.DataFrame({
+            'timestamp': start + pd.to_timedelta(np.arange(rows) + i * rows, unit='min'),
+            'feed': ['807f%04x-0000-0000' % (j % 40) for j in range(rows)],
+        })
+        for column in ('hum', 'pm10', 'pm25', 'r1', 'r2', 'rssi', 'temp'):
+            df[column] = rng.rand(rows) * 100
+        df.to_parquet(os.path.join(path, f'df_openair{i}.parquet'))
+
+
+def main():
+    threads = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    with tempfile.TemporaryDirectory() as synthetic:
+        make_synthetic(synthetic)
+
+        sets = [
+            ('openair', lambda h: h.fGetOpenAir(os.path.join(DATA, 'openair') + '/')),
+            ('lanuv', lambda h: h.fGetLanuv(os.path.join(DATA, 'lanuv') + '/')),
+            ('synthetic 100', lambda h: h.fGetOpenAir(synthetic + '/')),
+        ]
+
+        print(f'{"set":<16}' + ''.join(f'{str(n) + " thr ms":>12}' for n in threads))
+        for name, load in sets:
+            times = []
+            for n in threads:
+                handler = SOAIDiskHandler(nThreads=n)
+                load(handler)
+                times.append(min(timeit.repeat(lambda: load(handler), number=1, repeat=3)) * 1e3)
+            print(f'{name:<16}' + ''.join(f'{t:>12.1f}' for t in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare the decode time of an InfluxDB response for the OpenAir query
+(GROUP BY feed, time(1h)) between the per-feed DataFrame path and the
+columnar SOAIInfluxDecoder.
+
+Run from the repository root:
+    python benchmarks/benchmark_influx_decoding.py
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'air-quality-backend'))
+
+from SOAI.handler.SOAIInfluxDecoder import SOAIInfluxDecoder  # noqa: E402
+
+COLUMNS = ['time', 'hum', 'pm10', 'pm25', 'r1', 'r2', 'rssi', 'temp']
+HOURS = 24 * 10
+
+
+def make_response(n_feeds, epoch_ms):
+    random.seed(0)
+    start = pd.Timestamp('2020-03-01', tz='UTC')
+    times = [start + pd.Timedelta(hours=h) for h in range(HOURS)]
+    if epoch_ms:
+        times = [int(t.value // 10 ** 6) for t in times]
+    else:
+        times = [t.strftime('%Y-%m-%dT%H:%M:%SZ') for t in times]
+
+    series = []
+    for i in range(n_feeds):
+        values = [[t] + [random.random() * 100 for _ in COLUMNS[1:]] for t in times]
+        series.append({'name': 'all_openair', 'tags': {'feed': '807f%04x-0000-0000' % i},
+                       'columns': COLUMNS, 'values': values})
+    return json.dumps({'results': [{'statement_id': 0, 'series': series}]}).encode('utf-8')
+
+
+def legacy_decode(body):
+    # What DataFrameClient.query returns: one frame per series keyed by (name, tags)
+    result = {}
+    for s in json.loads(body)['results'][0]['series']:
+        df = pd.DataFrame(s['values'], columns=s['columns'])
+        df['time'] = pd.to_datetime(df['time'], utc=True)
+        result[(s['name'], tuple(s['tags'].items()))] = df.set_index('time')
+
+    # The former assembly in __fGetOpenAirData
+    openair_dict_clean = {k[1][0][1]: result[k] for k in result.keys()}
+    df_openair = pd.DataFrame()
+    for feed in list(openair_dict_clean.keys()):
+        df_feed = pd.DataFrame.from_dict(openair_dict_clean[feed]) \
+            .assign(feed=feed) \
+            .rename_axis('timestamp').reset_index()
+        df_openair = pd.concat([df_openair, df_feed])
+    return df_openair
+
+
+def main():
+    decoder = SOAIInfluxDecoder(tag='feed')
+
+    print(f'{"feeds":>6}{"rows":>9}{"legacy ms":>12}{"columnar ms":>13}{"speedup":>9}')
+    for n_feeds in (40, 200, 1000):
+        legacy_body = make_response(n_feeds, epoch_ms=False)
+        body = make_response(n_feeds, epoch_ms=True)
+        number = 5 if n_feeds < 1000 else 2
+
+        assert len(legacy_decode(legacy_body)) == len(decoder.fDecode(body))
+
+        t_legacy = timeit.timeit(lambda: legacy_decode(legacy_body), number=number) / number * 1e3
+        t_new = timeit.timeit(lambda: decoder.fDecode(body), number=number) / number * 1e3
+        print(f'{n_feeds:>6}{n_feeds * HOURS:>9}{t_legacy:>12.1f}{t_new:>13.1f}{t_legacy / t_new:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare encode/decode time and message size of the payload encoders.
+
+Run from the repository root:
+    python benchmarks/benchmark_payload_encoding.py
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+import simplejson
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lib.PayloadEncoder import get_encoder, lz4  # noqa: E402
+
+
+def make_message(n_sensors):
+    random.seed(0)
+    n_lanuv = max(1, n_sensors // 10)
+    sensor_type = ['openair_cologne'] * (n_sensors - n_lanuv) + ['lanuv'] * n_lanuv
+    return {
+        'sensors': {
+            'sensor_type': sensor_type,
+            'sensor_id': ['807f%04x' % i for i in range(n_sensors)],
+            'lat': [50.9 + random.random() / 10 for _ in range(n_sensors)],
+            'lon': [6.9 + random.random() / 10 for _ in range(n_sensors)],
+            'no': [random.random() * 50 if t == 'lanuv' else -1 for t in sensor_type],
+            'no2': [random.random() * 80 if i % 7 else float('nan') for i in range(n_sensors)],
+            'ozon': [random.random() * 40 if t == 'lanuv' else -1 for t in sensor_type],
+        }
+    }
+
+
+def legacy_json(message):
+    # The path before the pluggable encoders: NaN scrub round trip per column plus json.dumps
+    scrubbed = {'sensors': {k: json.loads(simplejson.dumps(v, ignore_nan=True))
+                            for k, v in message['sensors'].items()}}
+    return json.dumps(scrubbed, ensure_ascii=False).encode('utf-8')
+
+
+def main():
+    configs = [('json', None), ('json', 'zlib'), ('binary', None), ('binary', 'zlib')]
+    if lz4 is not None:
+        configs += [('json', 'lz4'), ('binary', 'lz4')]
+
+    for n_sensors in (40, 1000):
+        message = make_message(n_sensors)
+        number = 2000 if n_sensors == 40 else 100
+
+        print(f'\n{n_sensors} sensors')
+        print(f'{"encoder":<16}{"bytes":>10}{"encode us":>12}{"decode us":>12}')
+
+        body = legacy_json(message)
+        t_enc = timeit.timeit(lambda: legacy_json(message), number=number) / number * 1e6
+        t_dec = timeit.timeit(lambda: json.loads(body), number=number) / number * 1e6
+        print(f'{"legacy json":<16}{len(body):>10}{t_enc:>12.1f}{t_dec:>12.1f}')
+
+        for name, compression in configs:
+            encoder = get_encoder(name, compression)
+            body = encoder.encode(message)
+            t_enc = timeit.timeit(lambda: encoder.encode(message), number=number) / number * 1e6
+            t_dec = timeit.timeit(lambda: encoder.decode(body), number=number) / number * 1e6
+            label = name if compression is None else f'{name}+{compression}'
+            print(f'{label:<16}{len(body):>10}{t_enc:>12.1f}{t_dec:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0111,C0103,R0205
+
+import collections
+import logging
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DeliveryTracker(object):
+    """Keeps track of published messages which are not yet confirmed by
+    RabbitMQ.
+
+    Delivery tags on a channel are increasing integers, so the unconfirmed
+    tags are kept in insertion order. A single ack or nack removes its tag in
+    O(1), a multiple ack or nack pops all tags up to and including the
+    delivery tag from the front.
+    """
+
+    def __init__(self, max_unconfirmed=None, history=1000,
+                 clock=time.monotonic):
+        """
+        :param int max_unconfirmed: Maximum number of unconfirmed messages
+            before is_full returns True. None means unbounded.
+        :param int history: Number of confirmations kept for latency stats
+        :param callable clock: Monotonic clock used to measure latencies
+        """
+        self.max_unconfirmed = max_unconfirmed
+        self._clock = clock
+        self._unconfirmed = collections.OrderedDict()
+        self.latencies = collections.deque(maxlen=history)
+        self.acked = 0
+        self.nacked = 0
+        self.published = 0
+
+    def __len__(self):
+        return len(self._unconfirmed)
+
+    def __contains__(self, delivery_tag):
+        return delivery_tag in self._unconfirmed
+
+    def reset(self):
+        """Forget all unconfirmed messages and counters, e.g. when a new
+        channel is opened and the delivery tags start at 1 again.
+        """
+        self._unconfirmed.clear()
+        self.latencies.clear()
+        self.published = 0
+        self.acked = 0
+        self.nacked = 0
+
+    def add(self, delivery_tag=None):
+        """Register a published message.
+        :param int delivery_tag: The tag of the message, defaults to the next
+            tag of the channel
+        :rtype: int
+        :return: The delivery tag
+        """
+        self.published += 1
+        if delivery_tag is None:
+            delivery_tag = self.published
+        self._unconfirmed[delivery_tag] = self._clock()
+        return delivery_tag
+
+    def is_full(self, pending=0):
+        """Return True if no further message should be produced.
+        :param int pending: Number of messages which are produced but not
+            yet published
+        :rtype: bool
+        """
+        if self.max_unconfirmed is None:
+            return False
+        return len(self._unconfirmed) + pending >= self.max_unconfirmed
+
+    def confirm(self, delivery_tag, multiple=False, acked=True):
+        """Mark one or, if multiple is set, all messages up to delivery_tag
+        as confirmed.
+        :param int delivery_tag: The delivery tag of the Basic.Ack/Nack
+        :param bool multiple: The multiple flag of the Basic.Ack/Nack
+        :param bool acked: True for Basic.Ack, False for Basic.Nack
+        :rtype: list
+        :return: List of (delivery_tag, latency in seconds) tuples
+        """
+        now = self._clock()
+        confirmed = []
+        if multiple:
+            while self._unconfirmed:
+                tag = next(iter(self._unconfirmed))
+                if tag > delivery_tag:
+                    break
+                confirmed.append((tag, now - self._unconfirmed.pop(tag)))
+        else:
+            published = self._unconfirmed.pop(delivery_tag, None)
+            if published is None:
+                LOGGER.warning('Confirmation for unknown delivery tag %i',
+                               delivery_tag)
+            else:
+                confirmed.append((delivery_tag, now - published))
+
+        confirmation_type = 'ack' if acked else 'nack'
+        for tag, latency in confirmed:
+            self.latencies.append((tag, confirmation_type, latency))
+        if acked:
+            self.acked += len(confirmed)
+        else:
+            self.nacked += len(confirmed)
+
+        return confirmed
+
+    def latency(self, delivery_tag):
+        """Return the confirmation latency of a recently confirmed message or
+        None if it is unknown.
+        :param int delivery_tag: The delivery tag
+        :rtype: float
+        """
+        for tag, _unused_type, latency in reversed(self.latencies):
+            if tag == delivery_tag:
+                return latency
+        return None
+
+    def stats(self):
+        """Return counters and latency statistics of the recent
+        confirmations.
+        :rtype: dict
+        """
+        latencies = sorted(latency for _, _, latency in self.latencies)
+        stats = {
+            'published': self.published,
+            'unconfirmed': len(self._unconfirmed),
+            'acked': self.acked,
+            'nacked': self.nacked,
+        }
+        if latencies:
+            stats['latency_mean'] = sum(latencies) / len(latencies)
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_max'] = latencies[-1]
+        return stats
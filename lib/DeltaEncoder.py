@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0111,C0103,R0205
+
+import logging
+import math
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DeltaEncoder(object):
+    """Turns the full column dicts of the fetch service into delta messages.
+
+    The last published state of every sensor is kept. A keyframe contains
+    all sensors with all columns, a delta only the sensors whose values
+    changed since the previous message, without the static coordinates.
+    A keyframe is sent every keyframe_interval messages and whenever a
+    sensor shows up, disappears or moves. Every message carries a sequence
+    number, so consumers can detect gaps and wait for the next keyframe.
+    """
+
+    KEY_COLUMNS = ('sensor_type', 'sensor_id')
+    STATIC_COLUMNS = ('lat', 'lon')
+
+    def __init__(self, keyframe_interval=60):
+        """
+        :param int keyframe_interval: Send a full snapshot every N messages
+        """
+        self.keyframe_interval = keyframe_interval
+        self._state = {}
+        self._seq = 0
+        self._keyframe_seq = None
+        self._force_keyframe = True
+
+    def request_keyframe(self):
+        """Make the next message a keyframe, e.g. after messages were lost."""
+        self._force_keyframe = True
+
+    @staticmethod
+    def _same(a, b):
+        if isinstance(a, float) and isinstance(b, float) and \
+                math.isnan(a) and math.isnan(b):
+            return True
+        return a == b
+
+    def encode(self, data):
+        """Return the message for the next tick.
+        :param dict data: Payload of the fetch service with the column dict
+            data['sensors']
+        :rtype: dict
+        """
+        sensors = data['sensors']
+        columns = list(sensors.keys())
+        value_columns = [c for c in columns if c not in self.KEY_COLUMNS]
+        n = len(sensors[self.KEY_COLUMNS[1]])
+
+        rows = {}
+        for i in range(n):
+            key = tuple(sensors[c][i] for c in self.KEY_COLUMNS)
+            rows[key] = (i, tuple(sensors[c][i] for c in value_columns))
+
+        static_idx = [value_columns.index(c) for c in self.STATIC_COLUMNS
+                      if c in value_columns]
+        keyframe = (self._force_keyframe or self._keyframe_seq is None or
+                    self._seq - self._keyframe_seq >= self.keyframe_interval or
+                    any(key not in rows for key in self._state))
+
+        changed = []
+        for key, (i, values) in rows.items():
+            previous = self._state.get(key)
+            if previous is None or \
+                    any(not self._same(values[j], previous[j])
+                        for j in static_idx):
+                keyframe = True
+                break
+            if any(not self._same(v, p) for v, p in zip(values, previous)):
+                changed.append(i)
+
+        self._seq += 1
+        self._state = {key: values for key, (i, values) in rows.items()}
+        message = {'seq': self._seq, 'keyframe': keyframe}
+
+        if keyframe:
+            self._keyframe_seq = self._seq
+            self._force_keyframe = False
+            message['sensors'] = sensors
+        else:
+            delta_columns = [c for c in columns
+                             if c not in self.STATIC_COLUMNS]
+            message['sensors'] = {c: [sensors[c][i] for i in changed]
+                                  for c in delta_columns}
+            LOGGER.debug('Delta %i contains %i of %i sensors', self._seq,
+                         len(changed), n)
+
+        message['keyframe_seq'] = self._keyframe_seq
+        return message
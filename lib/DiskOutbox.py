@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0111,C0103,R0205
+
+import array
+import glob
+import json
+import logging
+import os
+import struct
+import zlib
+
+LOGGER = logging.getLogger(__name__)
+
+
+class OutboxRecord(object):
+    """One message stored in the DiskOutbox.
+    :param int record_id: Position of the record in the outbox
+    :param str routing_key: Routing key the message is published with
+    :param bytes body: Message body
+    :param str content_type: Content type of the body
+    :param dict headers: Message headers
+    :param str content_encoding: Compression of the body
+    """
+
+    def __init__(self, record_id, routing_key, body, content_type, headers,
+                 content_encoding=None):
+        self.record_id = record_id
+        self.routing_key = routing_key
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers
+        self.content_encoding = content_encoding
+
+
+class DiskOutbox(object):
+    """Append-only local spool for messages which are not yet confirmed by
+    RabbitMQ.
+
+    Records are appended to segment files (<first id>.seg). For every
+    segment an index file (<first id>.idx) holds the byte offset of each
+    record as unsigned 64 bit integers, so a record is found by its id
+    without scanning. The id below which all records are confirmed is kept
+    in a cursor file; segments which lie completely below it are deleted.
+    Records confirmed out of order are only kept in memory, so after a
+    restart they are delivered again (at-least-once).
+    """
+
+    RECORD_HEADER = struct.Struct('>III')  # meta length, body length, crc32
+    CURSOR_FILE = 'cursor'
+
+    def __init__(self, path, segment_size=64 * 1024 * 1024, fsync=False):
+        """
+        :param str path: Folder the segments are written to
+        :param int segment_size: Size in bytes after which a new segment is
+            started
+        :param bool fsync: Whether every append is synced to disk
+        """
+        self.path = path
+        self.segment_size = segment_size
+        self.fsync = fsync
+
+        self._segments = []  # list of (first id, offsets)
+        self._confirmed = set()
+        self._watermark = 0
+        self._next_id = 0
+        self._data_file = None
+        self._index_file = None
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, first_id, extension):
+        return os.path.join(self.path, '%020d.%s' % (first_id, extension))
+
+    def _load(self):
+        """Read the cursor and the indices of the existing segments. Records
+        at the end of a segment whose data was not completely written or
+        does not match its checksum are dropped.
+        """
+        cursor_path = os.path.join(self.path, self.CURSOR_FILE)
+        if os.path.exists(cursor_path):
+            with open(cursor_path) as f:
+                self._watermark = int(json.load(f)['watermark'])
+        self._next_id = self._watermark
+
+        for data_path in sorted(glob.glob(os.path.join(self.path, '*.seg'))):
+            first_id = int(os.path.basename(data_path).split('.')[0])
+            offsets = array.array('Q')
+            index_path = self._segment_path(first_id, 'idx')
+            if os.path.exists(index_path):
+                with open(index_path, 'rb') as f:
+                    raw = f.read()
+                raw = raw[:len(raw) - len(raw) % offsets.itemsize]
+                offsets.frombytes(raw)
+
+            # Drop index entries whose record is not completely on disk
+            size = os.path.getsize(data_path)
+            while offsets and not self._is_valid(data_path, offsets[-1],
+                                                 size):
+                offsets.pop()
+
+            if not offsets:
+                os.remove(data_path)
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+                continue
+
+            self._segments.append((first_id, offsets))
+            self._next_id = max(self._next_id, first_id + len(offsets))
+        self._drop_segments()
+
+        LOGGER.info('Outbox %s opened with %i pending messages', self.path,
+                    len(self))
+
+    def _is_valid(self, data_path, offset, size):
+        header_size = self.RECORD_HEADER.size
+        if offset + header_size > size:
+            return False
+        with open(data_path, 'rb') as f:
+            f.seek(offset)
+            meta_length, body_length, crc = self.RECORD_HEADER.unpack(
+                f.read(header_size))
+            if offset + header_size + meta_length + body_length > size:
+                return False
+            meta = f.read(meta_length)
+            body = f.read(body_length)
+        return zlib.crc32(body, zlib.crc32(meta)) == crc
+
+    def _open_segment(self):
+        """Start a new segment for the next record."""
+        self.close()
+        first_id = self._next_id
+        self._segments.append((first_id, array.array('Q')))
+        self._data_file = open(self._segment_path(first_id, 'seg'), 'ab')
+        self._index_file = open(self._segment_path(first_id, 'idx'), 'ab')
+
+    def close(self):
+        """Close the files of the active segment."""
+        if self._data_file is not None:
+            self._data_file.close()
+            self._index_file.close()
+        self._data_file = None
+        self._index_file = None
+
+    def __len__(self):
+        return self._next_id - self._watermark - len(self._confirmed)
+
+    def append(self, routing_key, body, content_type=None, headers=None,
+               content_encoding=None):
+        """Append a message to the outbox.
+        :param str routing_key: Routing key the message is published with
+        :param bytes|str body: Message body
+        :param str content_type: Content type of the body
+        :param dict headers: Message headers, need to be JSON serializable
+        :param str content_encoding: Compression of the body
+        :rtype: int
+        :return: Id of the record
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        meta = json.dumps({'routing_key': routing_key,
+                           'content_type': content_type,
+                           'content_encoding': content_encoding,
+                           'headers': headers or {}}).encode('utf-8')
+
+        if (self._data_file is None or
+                self._data_file.tell() >= self.segment_size):
+            self._open_segment()
+
+        offset = self._data_file.seek(0, os.SEEK_END)
+        crc = zlib.crc32(body, zlib.crc32(meta))
+        self._data_file.write(
+            self.RECORD_HEADER.pack(len(meta), len(body), crc) + meta + body)
+        self._data_file.flush()
+        self._index_file.write(struct.pack('=Q', offset))
+        self._index_file.flush()
+        if self.fsync:
+            os.fsync(self._data_file.fileno())
+            os.fsync(self._index_file.fileno())
+
+        record_id = self._next_id
+        self._segments[-1][1].append(offset)
+        self._next_id += 1
+        return record_id
+
+    def _locate(self, record_id):
+        for first_id, offsets in reversed(self._segments):
+            if first_id <= record_id < first_id + len(offsets):
+                return first_id, offsets[record_id - first_id]
+        raise KeyError(record_id)
+
+    def read(self, record_id):
+        """Read one record from disk.
+        :param int record_id: Id of the record
+        :rtype: OutboxRecord
+        """
+        first_id, offset = self._locate(record_id)
+        with open(self._segment_path(first_id, 'seg'), 'rb') as f:
+            f.seek(offset)
+            meta_length, body_length, crc = self.RECORD_HEADER.unpack(
+                f.read(self.RECORD_HEADER.size))
+            meta = f.read(meta_length)
+            body = f.read(body_length)
+
+        if zlib.crc32(body, zlib.crc32(meta)) != crc:
+            raise IOError('Outbox record %i is corrupt' % record_id)
+
+        meta = json.loads(meta.decode('utf-8'))
+        return OutboxRecord(record_id, meta['routing_key'], body,
+                            meta['content_type'], meta['headers'],
+                            meta.get('content_encoding'))
+
+    def pending(self, start_id=0):
+        """Yield the ids of all unconfirmed records from start_id on in
+        order. Records appended while iterating are yielded as well.
+        :param int start_id: First id to consider
+        """
+        record_id = max(start_id, self._watermark)
+        while record_id < self._next_id:
+            if record_id >= self._watermark and \
+                    record_id not in self._confirmed:
+                yield record_id
+            record_id += 1
+
+    def confirm(self, record_id):
+        """Mark a record as delivered. Segments which only contain delivered
+        records are removed.
+        :param int record_id: Id of the record
+        """
+        if record_id < self._watermark:
+            return
+        self._confirmed.add(record_id)
+
+        watermark = self._watermark
+        while watermark in self._confirmed:
+            self._confirmed.discard(watermark)
+            watermark += 1
+        if watermark == self._watermark:
+            return
+
+        self._watermark = watermark
+        self._write_cursor()
+        self._drop_segments()
+
+    def _write_cursor(self):
+        cursor_path = os.path.join(self.path, self.CURSOR_FILE)
+        with open(cursor_path + '.tmp', 'w') as f:
+            json.dump({'watermark': self._watermark}, f)
+        os.replace(cursor_path + '.tmp', cursor_path)
+
+    def _drop_segments(self):
+        # The last segment is kept, it is the one which is appended to
+        while len(self._segments) > 1:
+            first_id, offsets = self._segments[0]
+            if first_id + len(offsets) > self._watermark:
+                break
+            os.remove(self._segment_path(first_id, 'seg'))
+            os.remove(self._segment_path(first_id, 'idx'))
+            self._segments.pop(0)
+            LOGGER.debug('Removed delivered outbox segment %020d', first_id)
@@ -3,10 +3,13 @@
 
 import functools
 import logging
-import json
 import pika
 
 from lib.SOIADataFetcherService import SOIADataFetcherService
+from lib.PublishScheduler import PublishScheduler
+from lib.DeliveryTracker import DeliveryTracker
+from lib.PayloadEncoder import JsonPayloadEncoder
+from lib.TopicRouter import TopicRouter
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
@@ -28,18 +31,50 @@ class ExamplePublisher(object):
     PUBLISH_INTERVAL = 1
     QUEUE = ''
 
-    def __init__(self, amqp_url, routing_key, exchange_id):
+    def __init__(self, amqp_url, routing_key, exchange_id, service=None,
+                 executor=None, max_pending_fetches=1, publish_interval=None,
+                 slot_offset=0, max_unconfirmed=None, outbox=None,
+                 replay_rate=10, delta_encoder=None, payload_encoder=None,
+                 fanout_precision=None):
         """Setup the example publisher object, passing in the URL we will use
         to connect to RabbitMQ.
         :param str amqp_url: The URL for connecting to RabbitMQ
+        :param SOIADataFetcherService service: Long-lived service which
+            computes the payloads. It is created once if not given and reused
+            for every message, also across reconnects.
+        :param concurrent.futures.Executor executor: If given, the payloads
+            are computed in this executor instead of on the IOLoop. The
+            service is shared with the workers, so use a thread pool.
+        :param int max_pending_fetches: Maximum number of fetches which may
+            run in the executor at the same time
+        :param float publish_interval: Seconds between two messages. The
+            messages are sent on wall clock aligned slots, e.g. 3600 sends
+            on every full hour. Defaults to PUBLISH_INTERVAL.
+        :param float slot_offset: Seconds the slots are shifted against the
+            full interval
+        :param int max_unconfirmed: Maximum number of messages which may be
+            unconfirmed by RabbitMQ. While the window is full no new
+            payloads are produced. None means unbounded.
+        :param DiskOutbox outbox: If given, every message is written to this
+            spool before it is published and removed once RabbitMQ confirms
+            it. Messages produced while RabbitMQ is unreachable or left
+            unconfirmed are replayed in order after the next reconnect.
+        :param float replay_rate: Maximum number of messages per second
+            which are replayed from the outbox
+        :param DeltaEncoder delta_encoder: If given, only the sensors which
+            changed since the previous message are sent, with a keyframe of
+            all sensors in between. Messages carry sequence numbers.
+        :param PayloadEncoder payload_encoder: Encoder of the message body,
+            JSON by default. Its content type and compression are sent as
+            content_type and content_encoding.
+        :param int fanout_precision: If given, every tick is split into one
+            message per sensor type and geohash cell of this precision,
+            published with the routing key <routing_key>.<type>.<cell>
         """
         self._connection = None
         self._channel = None
 
-        self._deliveries = None
-        self._acked = None
-        self._nacked = None
-        self._message_number = None
+        self._deliveries = DeliveryTracker(max_unconfirmed)
 
         self._stopping = False
         self._url = amqp_url
@@ -47,6 +82,36 @@ class ExamplePublisher(object):
         self.routing_key = routing_key
         self.exchange_id = exchange_id
 
+        if service is None:
+            service = SOIADataFetcherService()
+        self._service = service
+
+        self._executor = executor
+        self._max_pending_fetches = max_pending_fetches
+        self._pending_fetches = set()
+        self._paused_ticks = 0
+
+        self._outbox = outbox
+        self._replay_interval = 1.0 / replay_rate
+        self._outbox_tags = {}
+        self._outbox_in_flight = set()
+        self._replay = None
+        self._replay_rewind = False
+
+        self._delta = delta_encoder
+
+        if payload_encoder is None:
+            payload_encoder = JsonPayloadEncoder()
+        self._encoder = payload_encoder
+
+        self._router = None
+        if fanout_precision is not None:
+            self._router = TopicRouter(routing_key, fanout_precision)
+
+        if publish_interval is None:
+            publish_interval = self.PUBLISH_INTERVAL
+        self._scheduler = PublishScheduler(publish_interval, slot_offset)
+
     def connect(self):
         """This method connects to RabbitMQ, returning the connection handle.
         When the connection is established, the on_connection_open method
@@ -180,12 +245,15 @@ class ExamplePublisher(object):
         be invoked by pika.
         :param pika.frame.Method method_frame: The Queue.DeclareOk frame
         """
+        binding_key = self.routing_key
+        if self._router is not None:
+            binding_key = self._router.binding_key
         LOGGER.info('Binding %s to %s with %s', self.EXCHANGE, self.QUEUE,
-                    self.routing_key)
+                    binding_key)
         self._channel.queue_bind(
             self.QUEUE,
             self.EXCHANGE,
-            routing_key=self.routing_key,
+            routing_key=binding_key,
             callback=self.on_bindok)
 
     def on_bindok(self, _unused_frame):
@@ -196,12 +264,63 @@ class ExamplePublisher(object):
         self.start_publishing()
 
     def start_publishing(self):
-        """This method will enable delivery confirmations and schedule the
-        first message to be sent to RabbitMQ
+        """This method will enable delivery confirmations and replay the
+        messages which are still in the outbox. The messages themselves are
+        scheduled as soon as the connection is created, see run.
         """
         LOGGER.info('Issuing consumer related RPC commands')
         self.enable_delivery_confirmations()
-        self.schedule_next_message()
+        if self._delta is not None and self._outbox is None:
+            # Messages of the outage are lost, consumers need a new keyframe
+            self._delta.request_keyframe()
+        self.start_replay()
+
+    def start_replay(self):
+        """Start to publish the unconfirmed messages of the outbox in order.
+        New messages are appended to the outbox and published by the replay
+        as well until it has caught up.
+        """
+        if self._outbox is None or self._replay is not None:
+            return
+        if len(self._outbox) > len(self._outbox_in_flight):
+            LOGGER.info('Replaying %i messages from the outbox',
+                        len(self._outbox) - len(self._outbox_in_flight))
+        self._replay = self._outbox.pending()
+        self._replay_rewind = False
+        self.replay_next_message()
+
+    def replay_next_message(self):
+        """Publish the next message of the outbox and schedule the following
+        one, so that at most replay_rate messages are sent per second.
+        """
+        if self._channel is None or not self._channel.is_open:
+            self._replay = None
+            return
+
+        if self._deliveries.is_full():
+            self._connection.ioloop.call_later(self._replay_interval,
+                                               self.replay_next_message)
+            return
+
+        if self._replay_rewind:
+            # A message was nacked during the replay, the generator may
+            # already be past it, so start again at the oldest pending one
+            self._replay = self._outbox.pending()
+            self._replay_rewind = False
+
+        for record_id in self._replay:
+            if record_id not in self._outbox_in_flight:
+                break
+        else:
+            self._replay = None
+            return
+
+        record = self._outbox.read(record_id)
+        self.publish_body(record.routing_key, record.body,
+                          record.content_type, record.headers, record_id,
+                          record.content_encoding)
+        self._connection.ioloop.call_later(self._replay_interval,
+                                           self.replay_next_message)
 
     def enable_delivery_confirmations(self):
         """Send the Confirm.Select RPC method to RabbitMQ to enable delivery
@@ -222,31 +341,49 @@ class ExamplePublisher(object):
         is an integer counter indicating the message number that was sent
         on the channel via Basic.Publish. Here we're just doing house keeping
         to keep track of stats and remove message numbers that we expect
-        a delivery confirmation of from the list used to keep track of messages
-        that are pending confirmation.
+        a delivery confirmation of from the tracker used to keep track of
+        messages that are pending confirmation. With the multiple flag set,
+        RabbitMQ confirms all messages up to and including the delivery tag.
         :param pika.frame.Method method_frame: Basic.Ack or Basic.Nack frame
         """
         confirmation_type = method_frame.method.NAME.split('.')[1].lower()
-        LOGGER.info('Received %s for delivery tag: %i', confirmation_type,
-                    method_frame.method.delivery_tag)
-        if confirmation_type == 'ack':
-            self._acked += 1
-        elif confirmation_type == 'nack':
-            self._nacked += 1
-        self._deliveries.remove(method_frame.method.delivery_tag)
+        multiple = getattr(method_frame.method, 'multiple', False)
+        LOGGER.info('Received %s for delivery tag: %i (multiple: %s)',
+                    confirmation_type, method_frame.method.delivery_tag,
+                    multiple)
+        confirmed = self._deliveries.confirm(
+            method_frame.method.delivery_tag, multiple,
+            confirmation_type == 'ack')
+        for delivery_tag, latency in confirmed:
+            LOGGER.debug('Delivery tag %i was %sed after %0.3f seconds',
+                         delivery_tag, confirmation_type, latency)
+            record_id = self._outbox_tags.pop(delivery_tag, None)
+            if record_id is None:
+                continue
+            self._outbox_in_flight.discard(record_id)
+            if confirmation_type == 'ack':
+                self._outbox.confirm(record_id)
+        if confirmation_type == 'nack' and self._outbox is not None:
+            # Nacked messages are still in the outbox, send them again. A
+            # running replay is rewound before it sends its next message.
+            if self._replay is not None:
+                self._replay_rewind = True
+            self.start_replay()
         LOGGER.info(
             'Published %i messages, %i have yet to be confirmed, '
-            '%i were acked and %i were nacked', self._message_number,
-            len(self._deliveries), self._acked, self._nacked)
+            '%i were acked and %i were nacked', self._deliveries.published,
+            len(self._deliveries), self._deliveries.acked,
+            self._deliveries.nacked)
 
     def schedule_next_message(self):
         """If we are not closing our connection to RabbitMQ, schedule another
-        message to be delivered in PUBLISH_INTERVAL seconds.
+        message to be delivered at the next slot of the scheduler. The delay
+        is computed from the wall clock, so the time spent fetching does not
+        shift the following messages.
         """
-        LOGGER.info('Scheduling next message for %0.1f seconds',
-                    self.PUBLISH_INTERVAL)
-        self._connection.ioloop.call_later(self.PUBLISH_INTERVAL,
-                                           self.publish_message)
+        delay = self._scheduler.delay()
+        LOGGER.info('Scheduling next message for %0.1f seconds', delay)
+        self._connection.ioloop.call_later(delay, self.publish_message)
 
     def publish_message(self):
         """If the class is not stopping, publish a message to RabbitMQ,
@@ -258,44 +395,175 @@ class ExamplePublisher(object):
         of how the process is flowing by slowing down and speeding up the
         delivery intervals by changing the PUBLISH_INTERVAL constant in the
         class.
+        If an executor was given, the payload is computed in the executor and
+        the next message is scheduled right away, so the IOLoop keeps serving
+        heartbeats and confirmations while the data is fetched.
         """
 
-        if self._channel is None or not self._channel.is_open:
+        if self._stopping:
             return
 
-        service = SOIADataFetcherService()
-        service.update_sensor_setwork()
-        data = service.fetch_data()
-        print('DATA:')
-        print(data)
+        if self._outbox is None and (self._channel is None or
+                                     not self._channel.is_open):
+            self._scheduler.skip_tick()
+            self.schedule_next_message()
+            return
+
+        if self._deliveries.is_full(len(self._pending_fetches)):
+            LOGGER.warning('%i messages are not yet confirmed, pausing '
+                           'production for this tick', len(self._deliveries))
+            self._paused_ticks += 1
+            self._scheduler.skip_tick()
+            self.schedule_next_message()
+            return
+
+        if (self._executor is not None and
+                len(self._pending_fetches) >= self._max_pending_fetches):
+            LOGGER.warning('%i fetches are still running, skipping this tick',
+                           len(self._pending_fetches))
+            self._scheduler.skip_tick()
+            self.schedule_next_message()
+            return
+
+        tick = self._scheduler.start_tick()
 
-        hdrs = {}
+        if self._executor is None:
+            self.send_message(self._service.fetch_data(), tick)
+            self.schedule_next_message()
+            return
+
+        future = self._executor.submit(self._service.fetch_data)
+        self._pending_fetches.add(future)
+        future.add_done_callback(functools.partial(
+            self.on_fetch_done, connection=self._connection, tick=tick))
+        self.schedule_next_message()
+
+    def on_fetch_done(self, future, connection, tick):
+        """Invoked in the executor thread when a fetch has finished. The
+        publish itself is handed over to the IOLoop of the connection the
+        fetch was started on, since pika is not thread safe.
+        :param concurrent.futures.Future future: The finished fetch
+        :param pika.SelectConnection connection: The connection of the tick
+        :param PublishTick tick: The tick the fetch belongs to
+        """
+        try:
+            connection.ioloop.add_callback_threadsafe(
+                functools.partial(self.on_fetch_result, future, tick))
+        except Exception as err:
+            self._pending_fetches.discard(future)
+            self._scheduler.fail_tick(tick)
+            LOGGER.warning('Dropping fetched data, IOLoop is gone: %s', err)
+
+    def on_fetch_result(self, future, tick):
+        """Invoked on the IOLoop with a finished fetch. Publishes the payload
+        if the fetch succeeded and the channel is still open.
+        :param concurrent.futures.Future future: The finished fetch
+        :param PublishTick tick: The tick the fetch belongs to
+        """
+        self._pending_fetches.discard(future)
+        try:
+            data = future.result()
+        except Exception:
+            LOGGER.exception('Fetching data failed')
+            self._scheduler.fail_tick(tick)
+            return
+
+        if self._outbox is None and (self._channel is None or
+                                     not self._channel.is_open):
+            LOGGER.warning('Channel closed while fetching, dropping data')
+            self._scheduler.fail_tick(tick)
+            return
+
+        self.send_message(data, tick)
+
+    def send_message(self, data, tick):
+        """Publish one payload to RabbitMQ and keep track of its delivery tag.
+        The slot and lateness of the tick are sent along as headers.
+        With an outbox the message is spooled first. It is only published
+        right away if the channel is open and no replay is running,
+        otherwise the replay picks it up in order.
+        :param dict data: The payload returned by the fetch service
+        :param PublishTick tick: The tick the payload belongs to
+        """
+        LOGGER.debug('Sending data: %s', data)
+
+        tick_hdrs = tick.headers()
+        if self._router is not None:
+            self._router.update_locations(data['sensors'])
+        if self._delta is not None:
+            data = self._delta.encode(data)
+            tick_hdrs['seq'] = data['seq']
+            tick_hdrs['keyframe'] = data['keyframe']
+
+        if self._router is not None:
+            messages = self._router.split(data)
+        else:
+            messages = [(self.routing_key, data)]
+
+        content_type = self._encoder.content_type
+        content_encoding = self._encoder.content_encoding
+        publish_now = (self._channel is not None and self._channel.is_open
+                       and self._replay is None)
+
+        for routing_key, message in messages:
+            hdrs = dict(tick_hdrs)
+            body = self._encoder.encode(message)
+
+            record_id = None
+            if self._outbox is not None:
+                record_id = self._outbox.append(routing_key, body,
+                                                content_type, hdrs,
+                                                content_encoding)
+            if publish_now:
+                self.publish_body(routing_key, body, content_type, hdrs,
+                                  record_id, content_encoding)
+
+        if not publish_now:
+            LOGGER.info('Spooled %i messages, %i messages in the outbox',
+                        len(messages), len(self._outbox))
+        self._scheduler.finish_tick(tick)
+
+    def publish_body(self, routing_key, body, content_type, hdrs,
+                     record_id=None, content_encoding=None):
+        """Send one message with Basic.Publish and register its delivery tag.
+        :param str routing_key: The routing key of the message
+        :param bytes|str body: The encoded message
+        :param str content_type: The content type of the body
+        :param dict hdrs: The message headers
+        :param int record_id: Id of the message in the outbox, if any
+        :param str content_encoding: The compression of the body, if any
+        """
         properties = pika.BasicProperties(
             app_id='example-publisher',
-            content_type='application/json',
+            content_type=content_type,
+            content_encoding=content_encoding,
             headers=hdrs)
 
-        message = data
-        self._channel.basic_publish(self.EXCHANGE, self.routing_key,
-                                    json.dumps(message, ensure_ascii=False),
+        self._channel.basic_publish(self.EXCHANGE, routing_key, body,
                                     properties)
-        self._message_number += 1
-        self._deliveries.append(self._message_number)
-        LOGGER.info('Published message # %i', self._message_number)
-        self.schedule_next_message()
+        delivery_tag = self._deliveries.add()
+        if record_id is not None:
+            self._outbox_tags[delivery_tag] = record_id
+            self._outbox_in_flight.add(record_id)
+        LOGGER.info('Published message # %i', delivery_tag)
 
     def run(self):
         """Run the example code by connecting and then starting the IOLoop.
         """
         while not self._stopping:
             self._connection = None
-            self._deliveries = []
-            self._acked = 0
-            self._nacked = 0
-            self._message_number = 0
+            self._deliveries.reset()
+            self._pending_fetches = set()
+            self._outbox_tags = {}
+            self._outbox_in_flight = set()
+            self._replay = None
+            self._replay_rewind = False
 
             try:
                 self._connection = self.connect()
+                # Messages are produced on the IOLoop of every connection
+                # attempt, so that they can be spooled during an outage
+                self.schedule_next_message()
                 self._connection.ioloop.start()
             except KeyboardInterrupt:
                 self.stop()
@@ -304,6 +572,8 @@ class ExamplePublisher(object):
                     # Finish closing
                     self._connection.ioloop.start()
 
+        if self._outbox is not None:
+            self._outbox.close()
         LOGGER.info('Stopped')
 
     def stop(self):
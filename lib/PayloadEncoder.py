@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0111,C0103,R0205
+
+import json
+import logging
+import struct
+import zlib
+
+import numpy as np
+import simplejson
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PayloadEncoder(object):
+    """Base class of the message encoders. An encoder turns the message dict
+    of a tick into bytes and back and optionally compresses the bytes.
+    """
+    CONTENT_TYPE = None
+
+    # content_encoding sent for a compression. zlib streams use the
+    # registered token 'deflate'; 'lz4' (LZ4 frame format) is not a
+    # registered token and needs consumers which know this publisher.
+    CONTENT_ENCODINGS = {
+        'zlib': 'deflate',
+        'lz4': 'lz4',
+    }
+
+    def __init__(self, compression=None):
+        """
+        :param str compression: None, 'zlib' (or 'deflate') or 'lz4'
+        """
+        if compression == 'deflate':
+            compression = 'zlib'
+        if compression not in (None, 'zlib', 'lz4'):
+            raise ValueError('Unknown compression %s' % compression)
+        if compression == 'lz4' and lz4 is None:
+            raise ImportError('lz4 compression needs the lz4 package')
+        self.compression = compression
+
+    @property
+    def content_type(self):
+        return self.CONTENT_TYPE
+
+    @property
+    def content_encoding(self):
+        return self.CONTENT_ENCODINGS.get(self.compression)
+
+    def _compress(self, body):
+        if self.compression == 'zlib':
+            return zlib.compress(body)
+        if self.compression == 'lz4':
+            return lz4.frame.compress(body)
+        return body
+
+    def _decompress(self, body):
+        if self.compression == 'zlib':
+            return zlib.decompress(body)
+        if self.compression == 'lz4':
+            return lz4.frame.decompress(body)
+        return body
+
+    def encode(self, message):
+        """Encode one message.
+        :param dict message: The message with the column dict 'sensors'
+        :rtype: bytes
+        """
+        return self._compress(self._encode(message))
+
+    def decode(self, body):
+        """Decode one message, NaN values are returned as None.
+        :param bytes body: The encoded message
+        :rtype: dict
+        """
+        return self._decode(self._decompress(body))
+
+    def _encode(self, message):
+        raise NotImplementedError
+
+    def _decode(self, body):
+        raise NotImplementedError
+
+
+class JsonPayloadEncoder(PayloadEncoder):
+    """Encodes the message as JSON. NaN values are written as null."""
+    CONTENT_TYPE = 'application/json'
+
+    def _encode(self, message):
+        return simplejson.dumps(message, ignore_nan=True,
+                                ensure_ascii=False).encode('utf-8')
+
+    def _decode(self, body):
+        return json.loads(body.decode('utf-8'))
+
+
+class BinaryPayloadEncoder(PayloadEncoder):
+    """Packs the column dict into a compact binary format.
+
+    Layout (all integers big endian):
+        magic b'SOAI' | version u8 | row count u32 | meta length u32
+        meta: JSON with the non sensor keys of the message, the column
+              order and a dictionary of the values of each string column
+        one column after the other: string columns as uint16 dictionary
+        codes (None is an entry of the dictionary), all other columns as
+        little endian float32 (None is NaN)
+    """
+    CONTENT_TYPE = 'application/x-soai-sensors'
+    MAGIC = b'SOAI'
+    VERSION = 1
+    HEADER = struct.Struct('>4sBII')
+
+    def _encode(self, message):
+        sensors = message['sensors']
+        columns = list(sensors.keys())
+        n = len(sensors[columns[0]]) if columns else 0
+
+        meta = {k: v for k, v in message.items() if k != 'sensors'}
+        meta['columns'] = columns
+        meta['dictionaries'] = {}
+        chunks = []
+        for column in columns:
+            values = sensors[column]
+            if any(isinstance(v, str) for v in values):
+                # None is kept in the dictionary and sorted first
+                dictionary = sorted(set(values),
+                                    key=lambda v: (v is not None, v))
+                codes = {v: i for i, v in enumerate(dictionary)}
+                meta['dictionaries'][column] = dictionary
+                chunks.append(np.fromiter((codes[v] for v in values),
+                                          dtype='<u2', count=n).tobytes())
+            else:
+                chunks.append(np.array(
+                    [np.nan if v is None else v for v in values],
+                    dtype='<f4').tobytes())
+
+        meta = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+        return b''.join(
+            [self.HEADER.pack(self.MAGIC, self.VERSION, n, len(meta)),
+             meta] + chunks)
+
+    def _decode(self, body):
+        magic, version, n, meta_length = self.HEADER.unpack_from(body)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('Not a SOAI binary payload')
+
+        offset = self.HEADER.size
+        meta = json.loads(body[offset:offset + meta_length].decode('utf-8'))
+        offset += meta_length
+
+        sensors = {}
+        for column in meta.pop('columns'):
+            dictionary = meta['dictionaries'].get(column)
+            if dictionary is not None:
+                codes = np.frombuffer(body, dtype='<u2', count=n,
+                                      offset=offset)
+                sensors[column] = [dictionary[c] for c in codes.tolist()]
+                offset += 2 * n
+            else:
+                values = np.frombuffer(body, dtype='<f4', count=n,
+                                       offset=offset)
+                sensors[column] = [None if v != v else v
+                                   for v in values.tolist()]
+                offset += 4 * n
+        del meta['dictionaries']
+
+        meta['sensors'] = sensors
+        return meta
+
+
+ENCODERS = {
+    'json': JsonPayloadEncoder,
+    'binary': BinaryPayloadEncoder,
+}
+
+
+def get_encoder(name='json', compression=None):
+    """Return the encoder for a configuration value.
+    :param str name: 'json' or 'binary'
+    :param str compression: None, 'zlib' (sent as content_encoding
+        'deflate') or 'lz4' (sent as the custom content_encoding 'lz4')
+    :rtype: PayloadEncoder
+    """
+    if name not in ENCODERS:
+        raise ValueError('Unknown payload encoding %s' % name)
+    return ENCODERS[name](compression)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0111,C0103,R0205
+
+import logging
+import math
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PublishTick(object):
+    """One fired slot of the PublishScheduler.
+    :param int number: Running number of the tick
+    :param float slot: Wall clock time (epoch seconds) the tick was planned for
+    :param float started: Wall clock time the tick actually started
+    :param float deadline: Wall clock time by which the tick should be done
+    :param int skipped: Number of slots skipped right before this tick
+    """
+
+    def __init__(self, number, slot, started, deadline, skipped):
+        self.number = number
+        self.slot = slot
+        self.started = started
+        self.deadline = deadline
+        self.skipped = skipped
+
+    @property
+    def lateness(self):
+        """Seconds between the planned slot and the actual start."""
+        return self.started - self.slot
+
+    def headers(self):
+        """Return the tick information as AMQP message headers. The slot
+        (epoch) and the lateness are sent as integer milliseconds, since
+        AMQP field tables have no float type in pika.
+        """
+        return {
+            'tick': self.number,
+            'slot': int(round(self.slot * 1000)),
+            'lateness': int(round(self.lateness * 1000)),
+            'skipped_slots': self.skipped,
+        }
+
+
+class PublishScheduler(object):
+    """Fixed-rate scheduler which fires on wall clock aligned slots.
+
+    Slots are at offset + k * interval seconds since the epoch, e.g. an
+    interval of 3600 fires on every full hour. The next slot is always
+    computed from the wall clock, so the time spent in a tick does not add up
+    over time. If a tick overruns one or more slots, the missed slots are
+    skipped and counted instead of being fired back to back.
+    """
+
+    def __init__(self, interval, offset=0, clock=time.time):
+        """
+        :param float interval: Seconds between two slots
+        :param float offset: Seconds the slots are shifted against the epoch
+        :param callable clock: Returns the current wall clock time
+        """
+        if interval <= 0:
+            raise ValueError('interval has to be positive')
+
+        self.interval = float(interval)
+        self.offset = float(offset) % self.interval
+        self._clock = clock
+
+        self._next_slot = None
+        self._pending_skipped = 0
+        self.ticks = 0
+        self.skipped_slots = 0
+        self.overruns = 0
+        self.failed_ticks = 0
+        self.max_lateness = 0.0
+
+    def _slot_after(self, now):
+        """Return the first slot strictly after now."""
+        k = math.floor((now - self.offset) / self.interval) + 1
+        return self.offset + k * self.interval
+
+    def _catch_up(self, now):
+        """Move the next slot forward to the latest slot which is not in the
+        future, counting the slots which are skipped on the way.
+        """
+        if self._next_slot is None:
+            self._next_slot = self._slot_after(now)
+            return
+
+        missed = int((now - self._next_slot) // self.interval)
+        if missed > 0:
+            self._next_slot += missed * self.interval
+            self._pending_skipped += missed
+            self.skipped_slots += missed
+            LOGGER.warning('Publisher is behind schedule, skipping %i slots',
+                           missed)
+
+    def delay(self):
+        """Return the seconds until the next slot. If slots were missed, only
+        the latest of them is kept and fired right away.
+        :rtype: float
+        """
+        now = self._clock()
+        self._catch_up(now)
+        return max(0.0, self._next_slot - now)
+
+    def start_tick(self):
+        """Mark the start of the tick for the current slot.
+        :rtype: PublishTick
+        """
+        now = self._clock()
+        self._catch_up(now)
+        slot = self._next_slot
+
+        self.ticks += 1
+        tick = PublishTick(self.ticks, slot, now, slot + self.interval,
+                           self._pending_skipped)
+        self.max_lateness = max(self.max_lateness, tick.lateness)
+        self._pending_skipped = 0
+        self._next_slot = slot + self.interval
+
+        LOGGER.info('Tick %i for slot %0.3f started %0.3f seconds late',
+                    tick.number, tick.slot, tick.lateness)
+        return tick
+
+    def skip_tick(self):
+        """Skip the current slot without firing a tick, e.g. when production
+        is paused. The skipped slot is reported with the next tick.
+        """
+        self._catch_up(self._clock())
+        self._next_slot += self.interval
+        self._pending_skipped += 1
+        self.skipped_slots += 1
+
+    def finish_tick(self, tick):
+        """Mark a tick as done and account for it if it missed its deadline.
+        :param PublishTick tick: The tick returned by start_tick
+        :rtype: bool
+        :return: True if the tick finished within its deadline
+        """
+        overrun = self._clock() - tick.deadline
+        if overrun > 0:
+            self.overruns += 1
+            LOGGER.warning('Tick %i overran its deadline by %0.3f seconds',
+                           tick.number, overrun)
+            return False
+        return True
+
+    def fail_tick(self, tick):
+        """Mark a tick as done without a message, e.g. because its fetch
+        failed or its data had to be dropped. Failed ticks are counted
+        instead of being checked against their deadline.
+        :param PublishTick tick: The tick returned by start_tick
+        """
+        self.failed_ticks += 1
+        LOGGER.warning('Tick %i failed without publishing', tick.number)
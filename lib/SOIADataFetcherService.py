@@ -1,94 +1,214 @@
 import logging
 import simplejson
 import os
-import json
+import numpy as np
+import pandas as pd
 
 from SOAI.handler.SOAIDBHandler import SOAIDBHandler
 from SOAI.handler.SOAIDiskHandler import SOAIDiskHandler
 from SOAI.sensors.SOAISensorNetwork import SOAISensorNetwork
+from SOAI.models.SOAIModelRegistry import SOAIModelRegistry
+from SOAI.tools.SOAIRingBuffer import SOAIRingBufferStore
 
 
 logger = logging.getLogger()
 
 
 class SOIADataFetcherService():
+  """Long-lived service which fetches the latest sensor data for the stream.
+
+  The sensor network, its calibration models and the sensor meta data are
+  loaded once when the service is created and reused on every call of
+  fetch_data. Use refresh_sensor_network to pick up a changed configuration
+  or changed model files.
+
+  The values of the look-back window are kept per sensor in ring buffers
+  between two calls, so the latest values are read without rebuilding data
+  frames. In incremental mode only the rows newer than the latest timestamp
+  minus an overlap (for late arriving points) are queried from the DB.
+  In latest-only mode only the latest complete bucket of every sensor is
+  queried, so the query does not depend on the look-back window at all.
+  Sensors which are missing from the latest buckets keep their value until
+  it is older than the look-back window, then they are removed from the
+  ring buffers.
+  """
+
+  OPENAIR_FIELDS = ['r1', 'r2', 'hum', 'temp', 'no2']
+  LANUV_FIELDS = ['no2', 'NO', 'OZON']
+
+  def __init__(self, sensor_network_config_path=None, look_back_range_in_days=10,
+               incremental=True, overlap=pd.Timedelta(hours=2), store_capacity=None,
+               latest_only=False):
+    if sensor_network_config_path is None:
+      sensor_network_config_path = os.getenv('SENSOR_NETWORK_CONFIG_PATH')
+    self.sensor_network_config_path = sensor_network_config_path
+
+    self.look_back_range_in_days = look_back_range_in_days
+    self.incremental = incremental
+    self.overlap = pd.Timedelta(overlap)
+    self.latest_only = latest_only
+    # One value per hour of the look-back window
+    if store_capacity is None:
+      store_capacity = look_back_range_in_days * 24
+    self.store_oac = SOAIRingBufferStore(self.OPENAIR_FIELDS, store_capacity)
+    self.store_lanuv = SOAIRingBufferStore(self.LANUV_FIELDS, store_capacity)
+
+    self.model_registry = SOAIModelRegistry()
+    self.soaiSensorNetwork = None
+
+    self.sOAIDBHandler = SOAIDBHandler()
+    self.sOAIDBHandler.fSetupDB()
+    self.sOAIDiskHandler = SOAIDiskHandler()
+
+    self.refresh_sensor_network()
+
+  def refresh_sensor_network(self):
+    """Re-read the sensor network configuration and the sensor meta data.
+    Models whose files did not change are taken from the model registry
+    instead of being loaded again.
+    """
+    loads = self.model_registry.loads
+    soaiSensorNetwork = SOAISensorNetwork(self.sensor_network_config_path, self.model_registry)
+    soaiSensorNetwork.fCheckNetwork()
+    self.model_registry.fPrune(soaiSensorNetwork.fGetModels())
+    self.soaiSensorNetwork = soaiSensorNetwork
+    # The NO2 values of the kept rows were computed with the old calibrations
+    self.store_oac.fClear()
+
+    self.mapping_frame_oac = self.sOAIDiskHandler.fGetOpenAirSensors()
+    self.mapping_frame_lanuv = self.sOAIDiskHandler.fGetLanuvSensors()
+
+    logger.info('sensor network refreshed, %i models loaded, %i models in registry',
+                self.model_registry.loads - loads, len(self.model_registry))
 
   def update_sensor_setwork(self):
-    self.soaiSensorNetwork = SOAISensorNetwork(os.getenv('SENSOR_NETWORK_CONFIG_PATH'))
-    self.soaiSensorNetwork.fCheckNetwork()
+    self.refresh_sensor_network()
+
+  def close(self):
+    """Close the connections to the DB."""
+    logger.info('closing DB clients, pool stats: %s', self.sOAIDBHandler.fGetPoolStats())
+    self.sOAIDBHandler.fCloseDB()
+
+  @staticmethod
+  def latest_per_sensor(data, mapping_frame, columns):
+    """Return the sensor meta data with the latest value of the given columns
+    for every sensor. The data is sorted once and the last row of every
+    sensor is taken in one pass. Sensors without data get -1.
+    """
+    latest = mapping_frame[['sensorID', 'lat', 'lon']].reset_index(drop=True)
+    if len(data) == 0 or 'sensorID' not in data.columns:
+      for column in columns:
+        latest[column] = -1
+      return latest
+
+    last_rows = data[['sensorID'] + columns] \
+      .iloc[np.argsort(data.index.values, kind='mergesort')] \
+      .drop_duplicates('sensorID', keep='last')
+
+    latest = latest.merge(last_rows, on='sensorID', how='left', indicator=True)
+    missing = latest['_merge'] == 'left_only'
+    for column in columns:
+      latest.loc[missing, column] = -1
+    return latest.drop(columns='_merge')
+
+  def look_back_cutoff(self, store):
+    """Return the oldest timestamp which is still in the look-back window of
+    a store (its watermark minus look_back_range_in_days) or None if the
+    store is empty. Sensors whose latest value is older are treated as
+    missing, like sensors which are not in the look-back query.
+    """
+    watermark = store.fWatermark()
+    if watermark is None:
+      return None
+    return watermark - pd.Timedelta(days=self.look_back_range_in_days)
+
+  def evict_stale(self, store):
+    """Remove the sensors whose latest value is older than the look-back
+    window from a store. In latest-only mode the store is never rebuilt
+    from a look-back query, so stale sensors are dropped here.
+    """
+    evicted = store.fEvict(self.look_back_cutoff(store))
+    if evicted > 0:
+      logger.info('removed %i sensors without data in the look-back window', evicted)
+
+  def fetch_openair(self):
+    """Fetch the OpenAir rows, compute their NO2 values and append them to
+    the ring buffers. Only new rows are queried and converted in
+    incremental mode, only the latest bucket in latest-only mode.
+    """
+    watermark = self.store_oac.fWatermark()
+    if self.latest_only:
+      new = self.sOAIDBHandler.fGetOpenAirLatest()
+    elif not self.incremental or watermark is None:
+      new = self.sOAIDBHandler.fGetOpenAir(self.look_back_range_in_days)
+      self.store_oac.fClear()
+    else:
+      new = self.sOAIDBHandler.fGetOpenAirSince(watermark - self.overlap)
+
+    if len(new) > 0:
+      new = self.soaiSensorNetwork.fDataToNO2(new)
+    self.store_oac.fAppendFrame(new)
+    if self.latest_only:
+      self.evict_stale(self.store_oac)
+    return self.store_oac
+
+  def fetch_lanuv(self):
+    """Fetch the LANUV rows and append them to the ring buffers. Only new
+    rows are queried in incremental mode, only the latest value in
+    latest-only mode.
+    """
+    watermark = self.store_lanuv.fWatermark()
+    if self.latest_only:
+      new = self.sOAIDBHandler.fGetLanuvLatest()
+    elif not self.incremental or watermark is None:
+      new = self.sOAIDBHandler.fGetLanuv(self.look_back_range_in_days)
+      self.store_lanuv.fClear()
+    else:
+      new = self.sOAIDBHandler.fGetLanuvSince(watermark - self.overlap)
+
+    self.store_lanuv.fAppendFrame(new)
+    if self.latest_only:
+      self.evict_stale(self.store_lanuv)
+    return self.store_lanuv
 
   def fetch_data(self):
-    sOAIDBHandler = SOAIDBHandler()
-    sOAIDBHandler.fSetupDB()
-    sOAIDiskHandler = SOAIDiskHandler()
+    mapping_frame_oac = self.mapping_frame_oac
+    mapping_frame_lanuv = self.mapping_frame_lanuv
 
-    mapping_frame_oac = sOAIDiskHandler.fGetOpenAirSensors()
-
-    look_back_range_in_days = 10
-
-    data_oac = sOAIDBHandler.fGetOpenAir(look_back_range_in_days)
-    data_oac = self.soaiSensorNetwork.fDataToNO2(data_oac)
-
-    data_lanuv = sOAIDBHandler.fGetLanuv(look_back_range_in_days)
-    mapping_frame_lanuv = sOAIDiskHandler.fGetLanuvSensors()
-
-    sensor_no = []
-    sensor_no2 = []
-    sensor_ozon = []
-
-    sensor_type = []
-    sensor_id = []
-    sensor_lat = []
-    sensor_lon = []
+    store_oac = self.fetch_openair()
+    store_lanuv = self.fetch_lanuv()
+    data_oac = store_oac.fLatestFrame(since=self.look_back_cutoff(store_oac))
+    data_lanuv = store_lanuv.fLatestFrame(since=self.look_back_cutoff(store_lanuv))
+    logger.debug('DB pool stats: %s', self.sOAIDBHandler.fGetPoolStats())
 
     logger.debug('process oac data')
-
-    # process openaircologne data
-    for index, row in mapping_frame_oac.iterrows():
-      data_station = data_oac[data_oac['sensorID'] == row['sensorID']]
-
-      sensor_type.append('openair_cologne')
-      sensor_id.append(row['sensorID'])
-      sensor_lat.append(row['lat'])
-      sensor_lon.append(row['lon'])
-
-      if data_station.shape[0] > 0:
-        sensor_no2.append(data_station['no2'].iloc[-1])
-      else:
-        sensor_no2.append(-1)
-
-      sensor_ozon.append(-1)
-      sensor_no.append(-1)
+    latest_oac = self.latest_per_sensor(data_oac, mapping_frame_oac, ['no2'])
+    latest_oac['NO'] = -1
+    latest_oac['OZON'] = -1
 
     logger.debug('process lanuf data')
+    latest_lanuv = self.latest_per_sensor(data_lanuv, mapping_frame_lanuv, ['NO', 'no2', 'OZON'])
 
-    # process lanuf data
-    for index, row in mapping_frame_lanuv.iterrows():
-      data_station = data_lanuv[data_lanuv['sensorID'] == row['sensorID']]
-
-      sensor_type.append('lanuv')
-      sensor_id.append(row['sensorID'])
-      sensor_lat.append(row['lat'])
-      sensor_lon.append(row['lon'])
-
-      if data_station.shape[0] > 0:
-        sensor_no.append(data_station['NO'].iloc[-1])
-        sensor_no2.append(data_station['no2'].iloc[-1])
-        sensor_ozon.append(data_station['OZON'].iloc[-1])
-      else:
-        sensor_no2.append(-1)
+    sensor_type = ['openair_cologne'] * len(latest_oac) + ['lanuv'] * len(latest_lanuv)
+    latest = pd.concat([latest_oac, latest_lanuv], ignore_index=True, sort=False)
 
-    print(sensor_no2)
+    sensor_id = latest['sensorID'].tolist()
+    sensor_lat = latest['lat'].tolist()
+    sensor_lon = latest['lon'].tolist()
+    sensor_no = latest['NO'].tolist()
+    sensor_no2 = latest['no2'].tolist()
+    sensor_ozon = latest['OZON'].tolist()
 
+    # NaN values are kept, the payload encoder takes care of them
     data = {
       'sensors': {
-        'sensor_type': json.loads(simplejson.dumps(sensor_type, ignore_nan=True)),
-        'sensor_id': json.loads(simplejson.dumps(sensor_id, ignore_nan=True)),
-        'lat': json.loads(simplejson.dumps(sensor_lat, ignore_nan=True)),
-        'lon': json.loads(simplejson.dumps(sensor_lon, ignore_nan=True)),
-        'no': json.loads(simplejson.dumps(sensor_no, ignore_nan=True)),
-        'no2': json.loads(simplejson.dumps(sensor_no2, ignore_nan=True)),
-        'ozon': json.loads(simplejson.dumps(sensor_ozon, ignore_nan=True)),
+        'sensor_type': sensor_type,
+        'sensor_id': [str(x) for x in sensor_id],
+        'lat': [float(x) for x in sensor_lat],
+        'lon': [float(x) for x in sensor_lon],
+        'no': [float(x) for x in sensor_no],
+        'no2': [float(x) for x in sensor_no2],
+        'ozon': [float(x) for x in sensor_ozon],
       }
     }
     logger.debug(simplejson.dumps(sensor_no2, ignore_nan=True))
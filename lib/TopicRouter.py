@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=C0111,C0103,R0205
+
+import logging
+import math
+
+from lib import Geohash
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TopicRouter(object):
+    """Splits the message of one tick into one message per sensor type and
+    geohash cell, e.g. soai.data.no2.lanuv.u1hc for the LANUV stations in
+    the cell u1hc. Consumers then subscribe to the cells they need instead
+    of filtering the whole city.
+
+    The cell of a sensor is computed once from its coordinates and kept,
+    so messages without coordinates (deltas) can be routed as well.
+    """
+
+    UNKNOWN_CELL = 'unknown'
+
+    def __init__(self, base_routing_key, precision=4):
+        """
+        :param str base_routing_key: Prefix of all routing keys
+        :param int precision: Number of geohash characters of a cell
+        """
+        self.base_routing_key = base_routing_key
+        self.precision = precision
+        self._cells = {}
+
+    @property
+    def binding_key(self):
+        """Binding key which matches all routing keys of the router."""
+        return self.base_routing_key + '.#'
+
+    def update_locations(self, sensors):
+        """Remember the cell of every sensor with coordinates.
+        :param dict sensors: Column dict with sensor_type, sensor_id, lat, lon
+        """
+        if 'lat' not in sensors or 'lon' not in sensors:
+            return
+        for sensor_type, sensor_id, lat, lon in zip(
+                sensors['sensor_type'], sensors['sensor_id'],
+                sensors['lat'], sensors['lon']):
+            if lat is None or lon is None or math.isnan(lat) or \
+                    math.isnan(lon):
+                cell = self.UNKNOWN_CELL
+            else:
+                cell = Geohash.encode(lat, lon, self.precision)
+            self._cells[(sensor_type, sensor_id)] = cell
+
+    def routing_key(self, sensor_type, cell):
+        return '%s.%s.%s' % (self.base_routing_key, sensor_type, cell)
+
+    def split(self, message):
+        """Split a message into one message per sensor type and cell. Every
+        known cell gets a message, also if it has no sensors in it, so
+        consumers see every tick.
+        :param dict message: Message with the column dict 'sensors'
+        :rtype: list
+        :return: List of (routing key, message) tuples
+        """
+        sensors = message['sensors']
+        columns = list(sensors.keys())
+
+        groups = {key: [] for key in
+                  {(t, cell) for (t, _), cell in self._cells.items()}}
+        for i, key in enumerate(zip(sensors['sensor_type'],
+                                    sensors['sensor_id'])):
+            cell = self._cells.get(key, self.UNKNOWN_CELL)
+            groups.setdefault((key[0], cell), []).append(i)
+
+        routed = []
+        for (sensor_type, cell), rows in sorted(groups.items()):
+            part = {k: v for k, v in message.items() if k != 'sensors'}
+            part['sensors'] = {c: [sensors[c][i] for i in rows]
+                               for c in columns}
+            routed.append((self.routing_key(sensor_type, cell), part))
+
+        LOGGER.debug('Split message into %i topics', len(routed))
+        return routed
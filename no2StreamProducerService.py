@@ -11,8 +11,12 @@ import os
 import json
 import simplejson
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from lib.SOIADataFetcherService import SOIADataFetcherService
 from lib.ExamplePublisher import ExamplePublisher
+from lib.DiskOutbox import DiskOutbox
+from lib.DeltaEncoder import DeltaEncoder
+from lib.PayloadEncoder import get_encoder
 
 
 rabbitmq_host = os.getenv("RABBITMQ_HOST")
@@ -24,7 +28,52 @@ exchange_id = 'amq.topic'
 url = "amqp://{}:{}@{}:5672/%2F?connection_attempts=10&heartbeat=3600"\
         .format(rabbitmq_user, rabbitmq_password, rabbitmq_host)
 
-example_publisher = ExamplePublisher(url, routing_key, exchange_id)
+service = SOIADataFetcherService(
+    incremental=os.getenv("FETCH_INCREMENTAL", "1") == "1",
+    overlap=pd.Timedelta(hours=float(os.getenv("FETCH_OVERLAP_HOURS", 2))),
+    latest_only=os.getenv("FETCH_LATEST_ONLY", "0") == "1")
+
+executor = None
+if os.getenv("FETCH_IN_WORKER", "0") == "1":
+    executor = ThreadPoolExecutor(max_workers=1)
+
+publish_interval = float(os.getenv("PUBLISH_INTERVAL", ExamplePublisher.PUBLISH_INTERVAL))
+slot_offset = float(os.getenv("PUBLISH_SLOT_OFFSET", 0))
+max_unconfirmed = os.getenv("MAX_UNCONFIRMED")
+if max_unconfirmed is not None:
+    max_unconfirmed = int(max_unconfirmed)
+
+outbox = None
+if os.getenv("OUTBOX_PATH") is not None:
+    outbox = DiskOutbox(os.getenv("OUTBOX_PATH"))
+replay_rate = float(os.getenv("OUTBOX_REPLAY_RATE", 10))
+
+delta_encoder = None
+if os.getenv("DELTA_KEYFRAME_INTERVAL") is not None:
+    delta_encoder = DeltaEncoder(int(os.getenv("DELTA_KEYFRAME_INTERVAL")))
+
+payload_encoder = get_encoder(os.getenv("PAYLOAD_ENCODING", "json"),
+                              os.getenv("PAYLOAD_COMPRESSION"))
+
+fanout_precision = os.getenv("FANOUT_GEOHASH_PRECISION")
+if fanout_precision is not None:
+    fanout_precision = int(fanout_precision)
+
+example_publisher = ExamplePublisher(url, routing_key, exchange_id, service,
+                                     executor=executor,
+                                     publish_interval=publish_interval,
+                                     slot_offset=slot_offset,
+                                     max_unconfirmed=max_unconfirmed,
+                                     outbox=outbox,
+                                     replay_rate=replay_rate,
+                                     delta_encoder=delta_encoder,
+                                     payload_encoder=payload_encoder,
+                                     fanout_precision=fanout_precision)
 
 example_publisher.run()
 
+if executor is not None:
+    executor.shutdown(wait=False)
+
+service.close()
+
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The SOAI package is installed from air-quality-backend (see Dockerfile), make it importable without installing it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "air-quality-backend"))
@@ -0,0 +1,38 @@
+import unittest
+
+from lib.DeliveryTracker import DeliveryTracker
+
+
+class DeliveryTrackerTest(unittest.TestCase):
+
+    def test_multiple_confirms(self):
+        tracker = DeliveryTracker(max_unconfirmed=3, clock=lambda: 0.0)
+        for _ in range(4):
+            tracker.add()
+        self.assertTrue(tracker.is_full())
+
+        confirmed = tracker.confirm(2, multiple=True)
+        self.assertEqual([tag for tag, _ in confirmed], [1, 2])
+        tracker.confirm(4, acked=False)
+        self.assertEqual(len(tracker), 1)
+        self.assertIn(3, tracker)
+        self.assertEqual(tracker.stats(), {
+            'published': 4, 'unconfirmed': 1, 'acked': 2, 'nacked': 1,
+            'latency_mean': 0.0, 'latency_p50': 0.0, 'latency_max': 0.0})
+
+    def test_reset_clears_counters(self):
+        tracker = DeliveryTracker()
+        tracker.add()
+        tracker.add()
+        tracker.confirm(1)
+        tracker.confirm(2, acked=False)
+
+        tracker.reset()
+        self.assertEqual(tracker.stats(), {
+            'published': 0, 'unconfirmed': 0, 'acked': 0, 'nacked': 0})
+        self.assertIsNone(tracker.latency(1))
+        self.assertEqual(tracker.add(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import glob
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from lib.DiskOutbox import DiskOutbox
+
+
+class DiskOutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def fill(self, outbox, n):
+        return [outbox.append('sensors', 'message %i' % i, 'application/json',
+                              {'seq': i}) for i in range(n)]
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.path, '*.seg')))
+
+    def test_reopen_after_crash(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 5)
+        outbox.confirm(0)
+        outbox.confirm(1)
+        # No close, the process dies here
+
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [2, 3, 4])
+        self.assertEqual(len(outbox), 3)
+
+        record = outbox.read(3)
+        self.assertEqual(record.body, b'message 3')
+        self.assertEqual(record.routing_key, 'sensors')
+        self.assertEqual(record.content_type, 'application/json')
+        self.assertEqual(record.headers, {'seq': 3})
+
+        self.assertEqual(outbox.append('sensors', 'message 5'), 5)
+        self.assertEqual(list(outbox.pending()), [2, 3, 4, 5])
+        self.assertEqual(outbox.read(5).body, b'message 5')
+
+    def test_truncated_final_record(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 3)
+        outbox.close()
+
+        segment = self.segments()[0]
+        with open(segment, 'r+b') as f:
+            f.truncate(os.path.getsize(segment) - 4)
+
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [0, 1])
+        self.assertEqual(outbox.read(1).body, b'message 1')
+
+        self.assertEqual(outbox.append('sensors', 'message 2 again'), 2)
+        self.assertEqual(outbox.read(2).body, b'message 2 again')
+
+        outbox.close()
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [0, 1, 2])
+        self.assertEqual(outbox.read(2).body, b'message 2 again')
+
+    def test_truncated_index(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 3)
+        outbox.close()
+
+        index = self.segments()[0][:-len('seg')] + 'idx'
+        with open(index, 'r+b') as f:
+            f.truncate(os.path.getsize(index) - 3)
+
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [0, 1])
+
+    def test_corrupt_final_record(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 3)
+        outbox.close()
+
+        segment = self.segments()[0]
+        with open(segment, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xff]))
+
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [0, 1])
+        self.assertEqual(outbox.append('sensors', 'message 2 again'), 2)
+        self.assertEqual(outbox.read(2).body, b'message 2 again')
+
+    def test_corrupt_record_is_detected_on_read(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 3)
+        outbox.close()
+
+        # The last byte of record 1 is in front of the offset of record 2
+        segment = self.segments()[0]
+        with open(segment[:-len('seg')] + 'idx', 'rb') as f:
+            offset = struct.unpack('=3Q', f.read())[2] - 1
+        with open(segment, 'r+b') as f:
+            f.seek(offset)
+            value = f.read(1)
+            f.seek(offset)
+            f.write(bytes([value[0] ^ 0xff]))
+
+        outbox = DiskOutbox(self.path)
+        with self.assertRaises(IOError):
+            outbox.read(1)
+
+    def test_out_of_order_confirms(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 5)
+
+        outbox.confirm(2)
+        outbox.confirm(3)
+        self.assertEqual(list(outbox.pending()), [0, 1, 4])
+        self.assertEqual(len(outbox), 3)
+
+        # Confirms above the watermark are only kept in memory
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [0, 1, 2, 3, 4])
+
+        outbox.confirm(3)
+        outbox.confirm(1)
+        self.assertEqual(list(outbox.pending()), [0, 2, 4])
+        outbox.confirm(0)
+        self.assertEqual(list(outbox.pending()), [2, 4])
+        outbox.confirm(2)
+        self.assertEqual(list(outbox.pending()), [4])
+
+        # The watermark moved to 4 and survives a restart
+        outbox = DiskOutbox(self.path)
+        self.assertEqual(list(outbox.pending()), [4])
+        outbox.confirm(1)
+        self.assertEqual(list(outbox.pending()), [4])
+
+    def test_pending_during_appends(self):
+        outbox = DiskOutbox(self.path)
+        self.fill(outbox, 2)
+
+        pending = outbox.pending()
+        self.assertEqual(next(pending), 0)
+        outbox.confirm(1)
+        outbox.append('sensors', 'message 2')
+        self.assertEqual(list(pending), [2])
+
+    def test_delivered_segments_are_removed(self):
+        outbox = DiskOutbox(self.path, segment_size=1)
+        self.fill(outbox, 4)
+        self.assertEqual(len(self.segments()), 4)
+
+        for record_id in range(3):
+            outbox.confirm(record_id)
+        self.assertEqual(len(self.segments()), 1)
+
+        outbox = DiskOutbox(self.path, segment_size=1)
+        self.assertEqual(list(outbox.pending()), [3])
+        self.assertEqual(outbox.read(3).body, b'message 3')
+
+
+if __name__ == '__main__':
+    unittest.main()
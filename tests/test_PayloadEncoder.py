@@ -0,0 +1,36 @@
+import unittest
+
+from lib.PayloadEncoder import BinaryPayloadEncoder, get_encoder
+
+
+class BinaryPayloadEncoderTest(unittest.TestCase):
+
+    message = {
+        'seq': 3,
+        'keyframe': False,
+        'sensors': {
+            'sensor_type': ['lanuv', None, 'openair_cologne', 'lanuv'],
+            'sensor_id': ['VKCL', 'a1', None, 'RODE'],
+            'no2': [21.5, None, 0.25, -1.0],
+        },
+    }
+
+    def test_round_trip(self):
+        encoder = BinaryPayloadEncoder()
+        self.assertEqual(encoder.decode(encoder.encode(self.message)),
+                         self.message)
+
+    def test_round_trip_compressed(self):
+        encoder = get_encoder('binary', 'deflate')
+        self.assertEqual(encoder.content_encoding, 'deflate')
+        self.assertEqual(encoder.decode(encoder.encode(self.message)),
+                         self.message)
+
+    def test_empty_message(self):
+        encoder = BinaryPayloadEncoder()
+        message = {'sensors': {'sensor_id': [], 'no2': []}}
+        self.assertEqual(encoder.decode(encoder.encode(message)), message)
+
+
+if __name__ == '__main__':
+    unittest.main()
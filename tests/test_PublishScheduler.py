@@ -0,0 +1,65 @@
+import unittest
+
+import pika
+
+from lib.PublishScheduler import PublishScheduler
+
+
+class FakeClock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class PublishSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(1000.25)
+        self.scheduler = PublishScheduler(0.5, clock=self.clock)
+
+    def test_headers_are_integer_milliseconds(self):
+        self.scheduler.delay()
+        self.clock.now = 1000.5123
+        tick = self.scheduler.start_tick()
+
+        headers = tick.headers()
+        self.assertEqual(headers['tick'], 1)
+        self.assertEqual(headers['slot'], 1000500)
+        self.assertEqual(headers['lateness'], 12)
+        self.assertEqual(headers['skipped_slots'], 0)
+
+    def test_headers_can_be_encoded(self):
+        self.scheduler.delay()
+        self.clock.now = 1002.1
+        tick = self.scheduler.start_tick()
+        headers = tick.headers()
+        headers['seq'] = 7
+        headers['keyframe'] = True
+
+        properties = pika.BasicProperties(
+            app_id='example-publisher',
+            content_type='application/json',
+            headers=headers)
+        decoded = pika.BasicProperties()
+        decoded.decode(b''.join(properties.encode()))
+
+        self.assertEqual(decoded.headers, headers)
+        self.assertEqual(decoded.headers['skipped_slots'], 3)
+
+    def test_skipped_and_failed_ticks(self):
+        self.scheduler.delay()
+        self.scheduler.skip_tick()
+        self.clock.now = 1001.0
+        tick = self.scheduler.start_tick()
+        self.assertEqual(tick.skipped, 1)
+
+        self.scheduler.fail_tick(tick)
+        self.assertEqual(self.scheduler.failed_ticks, 1)
+        self.assertEqual(self.scheduler.overruns, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from SOAI.models.SOAICalibrationEngine import SOAICalibrationEngine
+from SOAI.models.SOAINumpyModel import SOAINumpyModel
+from SOAI.sensors.SOAISensorNetwork import SOAISensorNetwork
+
+
+## Returns a model with the architecture of SOAIOpenAirCalibrationModel.fCreateModel and random weights
+def fRandomModel(rng, nHidden=8):
+    model = SOAINumpyModel()
+    model.layers = [(rng.normal(size=(3, nHidden)), rng.normal(size=nHidden)),
+                    (rng.normal(size=(nHidden, 1)), rng.normal(size=1))]
+    model.activationNames = ["relu", "linear"]
+    model.scalerScale = rng.uniform(0.01, 0.1, size=3)
+    model.scalerOffset = rng.uniform(-1, 1, size=3)
+    return model
+
+
+class SOAICalibrationEngineTest(unittest.TestCase):
+
+    def test_same_as_numpy_model(self):
+        rng = np.random.RandomState(0)
+        models = [fRandomModel(rng) for _ in range(3)]
+        # Sensors c and d share one model instance
+        sensorModels = {"a": models[0], "b": models[1], "c": models[2], "d": models[2]}
+
+        engine = SOAICalibrationEngine(blockSize=7)
+        self.assertEqual(engine.fBuild(sensorModels), ["a", "b", "c", "d"])
+        self.assertEqual(engine.parameters["W1"].shape, (3, 3, 8))
+
+        sensorIDs = rng.choice(list(sensorModels), size=100)
+        features = rng.uniform(0, 100, size=(100, 3))
+        no2 = engine.fPredict(sensorIDs, features)
+
+        for ID, model in sensorModels.items():
+            rows = sensorIDs == ID
+            np.testing.assert_allclose(no2[rows], model.fPredict(features[rows])[:, 0], rtol=1e-12, atol=1e-12)
+
+    def test_unusable_models_are_skipped(self):
+        rng = np.random.RandomState(1)
+        other = fRandomModel(rng, nHidden=4)
+        engine = SOAICalibrationEngine()
+        self.assertEqual(engine.fBuild({"a": fRandomModel(rng), "b": other, "c": SOAINumpyModel()}), ["a"])
+
+        self.assertTrue(engine.fHasSensor("a"))
+        self.assertFalse(engine.fHasSensor("b"))
+        with self.assertRaises(Exception):
+            engine.fPredict(["a", "b"], np.zeros((2, 3)))
+
+
+class SOAISensorNetworkEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        pathToConfigFile = os.path.join(self.path, "sensorNetwork.conf")
+        with open(pathToConfigFile, "w") as f:
+            f.write("OpenAirCologne a 50.93 6.95 1\n")
+            f.write("OpenAirCologne b 50.94 6.96 1\n")
+
+        rng = np.random.RandomState(2)
+        self.models = {"a": fRandomModel(rng), "b": fRandomModel(rng), "new": fRandomModel(rng)}
+        self.network = SOAISensorNetwork(pathToConfigFile)
+        self.network.fFindSensorFromID("a").fSetCalibration(self.models["a"])
+        self.network.fFindSensorFromID("b").fSetCalibration(self.models["b"])
+
+        rows = 20
+        self.data = pd.DataFrame({"sensorID": ["a", "b"] * (rows // 2),
+                                  "hum": rng.uniform(20, 90, rows), "temp": rng.uniform(0, 30, rows),
+                                  "r2": rng.uniform(0, 500, rows)})
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def fExpected(self, data, ID, model):
+        rows = (data["sensorID"] == ID).values
+        return model.fPredict(data.loc[rows, ["hum", "temp", "r2"]].values)[:, 0], rows
+
+    def test_swapped_model_falls_back_to_the_sensor(self):
+        no2 = self.network.fDataToNO2(self.data.copy())["no2"].values
+        engine = self.network.calibrationEngine
+        for ID in ("a", "b"):
+            expected, rows = self.fExpected(self.data, ID, self.models[ID])
+            np.testing.assert_allclose(no2[rows], expected, rtol=1e-12)
+
+        # The engine still has the old model of b, the rows of b are converted with the new model of the sensor
+        self.network.fFindSensorFromID("b").fSetCalibration(self.models["new"])
+        no2 = self.network.fDataToNO2(self.data.copy())["no2"].values
+        self.assertIs(self.network.calibrationEngine, engine)
+        self.assertTrue(engine.fHasSensor("b"))
+
+        expected, rows = self.fExpected(self.data, "a", self.models["a"])
+        np.testing.assert_allclose(no2[rows], expected, rtol=1e-12)
+        expected, rows = self.fExpected(self.data, "b", self.models["new"])
+        np.testing.assert_allclose(no2[rows], expected, rtol=1e-12)
+
+        # After a rebuild the engine uses the new model
+        self.network.fBuildCalibrationEngine()
+        np.testing.assert_allclose(self.network.fDataToNO2(self.data.copy())["no2"].values, no2, rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
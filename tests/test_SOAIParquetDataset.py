@@ -0,0 +1,89 @@
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from SOAI.handler.SOAIDBHandler import SOAIDBHandler
+from SOAI.handler.SOAIParquetDataset import SOAIParquetDataset
+
+
+def fFrame(timestamps, sensorIDs, no2):
+    return pd.DataFrame({"timestamp": pd.to_datetime(timestamps, utc=True), "sensorID": sensorIDs, "no2": no2})
+
+
+class SOAIParquetDatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.dataset = SOAIParquetDataset(self.path, rowGroupSize=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def files(self, partition):
+        return glob.glob(os.path.join(self.path, partition, "*.parquet"))
+
+    def test_partitions(self):
+        files = self.dataset.fWrite(fFrame(["2019-12-31 23:00", "2020-01-01 00:00", "2020-02-15 12:00"], ["a", "a", "b"], [1.0, 2.0, 3.0]))
+        self.assertEqual(len(files), 3)
+
+        partitions = [os.path.relpath(p, self.path) for p in self.dataset.fPartitions()]
+        self.assertEqual(partitions, [os.path.join("year=2019", "month=12"), os.path.join("year=2020", "month=01"),
+                                      os.path.join("year=2020", "month=02")])
+        self.assertEqual(len(self.dataset.fPartitions(tStart="2020-01-15")), 2)
+        self.assertEqual(len(self.dataset.fPartitions(tStart="2020-01-15", tEnd="2020-01-20")), 1)
+
+        frames = list(self.dataset.fIterPartitions(tStart="2020-01-01"))
+        self.assertEqual([len(df) for df in frames], [1, 1])
+        self.assertEqual(self.dataset.fLatestTimestamp(), pd.Timestamp("2020-02-15 12:00", tz="UTC"))
+
+    def test_newest_file_wins(self):
+        self.dataset.fWrite(fFrame(["2020-01-01 00:00", "2020-01-01 01:00"], ["a", "a"], [1.0, 2.0]))
+        self.dataset.fWrite(fFrame(["2020-01-01 01:00", "2020-01-01 02:00"], ["a", "a"], [20.0, 3.0]))
+        # Duplicates within one write, the last row wins as well
+        self.dataset.fWrite(fFrame(["2020-01-01 02:00", "2020-01-01 02:00"], ["a", "a"], [30.0, 31.0]))
+
+        df = self.dataset.fReadPartition(self.dataset.fPartitions()[0]).sort_values("timestamp")
+        self.assertEqual(df["no2"].tolist(), [1.0, 20.0, 31.0])
+
+    def test_compact(self):
+        self.dataset.fWrite(fFrame(["2020-01-01 02:00", "2020-01-01 00:00", "2020-02-01 00:00"], ["a", "b", "a"], [1.0, 2.0, 3.0]))
+        self.dataset.fWrite(fFrame(["2020-01-01 02:00", "2020-01-01 01:00"], ["a", "a"], [10.0, 4.0]))
+        expected = self.dataset.fReadPartition(self.dataset.fPartitions()[0]).sort_values("timestamp", kind="mergesort")
+
+        self.assertEqual(self.dataset.fCompact(), 1)
+        self.assertEqual(len(self.files(os.path.join("year=2020", "month=01"))), 1)
+        self.assertEqual(len(self.files(os.path.join("year=2020", "month=02"))), 1)
+
+        df = self.dataset.fReadPartition(self.dataset.fPartitions()[0])
+        self.assertTrue(df["timestamp"].is_monotonic_increasing)
+        pd.testing.assert_frame_equal(df, expected.reset_index(drop=True))
+        self.assertEqual(self.dataset.fCompact(), 0)
+
+    def test_compact_dtypes_are_normalized(self):
+        data = fFrame(["2020-01-01 00:00"], ["a"], [1.0])
+        # Compact frames have the timestamps as int64 nanoseconds (see SOAIDataHandler._fCompactDtypes)
+        data = data.assign(timestamp=data["timestamp"].values.astype("datetime64[ns]").astype(np.int64), sensorID=data["sensorID"].astype("category"),
+                           no2=data["no2"].astype(np.float32))
+        self.dataset.fWrite(data)
+
+        df = self.dataset.fReadPartition(self.dataset.fPartitions()[0])
+        self.assertEqual(df["timestamp"].iloc[0], pd.Timestamp("2020-01-01", tz="UTC"))
+        self.assertEqual(df["no2"].dtype, np.float64)
+
+
+class SOAIUpdateDiskDataTest(unittest.TestCase):
+
+    def test_days_since_empty_folder(self):
+        handler = SOAIDBHandler()
+        self.assertEqual(handler._SOAIDBHandler__fDaysSince(None, 30, "data/openair"), 30)
+        latest = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=3, hours=1)
+        self.assertIn(handler._SOAIDBHandler__fDaysSince(latest, 30, "data/openair"), (2, 3, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
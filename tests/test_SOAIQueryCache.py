@@ -0,0 +1,159 @@
+import glob
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from SOAI.handler.SOAIDBHandler import SOAIDBHandler
+from SOAI.handler.SOAIQueryCache import SOAIQueryCache
+
+
+class FakeDB():
+
+    def __init__(self, shift=pd.Timedelta(0)):
+        self.shift = shift
+        self.queries = []
+        self.now = None
+
+    ## Returns one row per hour in the time condition, the timestamps are shifted like the OpenAir data
+    def fLoad(self, condition):
+        times = re.findall(r"'([^']+)'", condition)
+        tStart = pd.Timestamp(times[0])
+        tEnd = pd.Timestamp(times[1]) if len(times) > 1 else self.now
+        self.queries.append((tStart, None if len(times) == 1 else tEnd))
+
+        timestamps = pd.date_range(tStart, tEnd, freq="1h", inclusive="left")
+        return pd.DataFrame({"timestamp": timestamps + self.shift, "sensorID": "a", "no2": range(len(timestamps))})
+
+
+class SOAIGetCachedDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.handler = SOAIDBHandler()
+        self.handler.fSetupDB(cachePath=self.path, cacheBlock="1d", cacheSettle="6h")
+        self.db = FakeDB()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def fGet(self, now, dStart=3, dEnd=0, shift=pd.Timedelta(0)):
+        self.db.now = pd.Timestamp(now, tz="UTC")
+        self.db.shift = shift
+        self.db.queries = []
+        return self.handler._SOAIDBHandler__fGetCachedData("m", self.db.fLoad, dStart, dEnd, "1h", shift=shift, now=self.db.now)
+
+    def files(self):
+        return sorted(os.path.basename(f) for f in glob.glob(os.path.join(self.path, "*.parquet")))
+
+    def stats(self):
+        stats = self.handler.fGetCacheStats()
+        return stats["hits"], stats["misses"]
+
+    def test_closed_blocks_are_stored(self):
+        df = self.fGet("2020-03-10 12:30")
+        utc = lambda t: pd.Timestamp(t, tz="UTC")
+
+        # One query for the run of closed blocks, one for the open block
+        self.assertEqual(self.db.queries, [(utc("2020-03-07"), utc("2020-03-10")), (utc("2020-03-10"), None)])
+        self.assertEqual(self.stats(), (0, 3))
+        self.assertEqual(self.files(), ["m_1h_20200307T000000.parquet", "m_1h_20200308T000000.parquet",
+                                        "m_1h_20200309T000000.parquet"])
+        self.assertEqual(df["timestamp"].iloc[0], utc("2020-03-07 12:00"))
+        self.assertEqual(df["timestamp"].iloc[-1], utc("2020-03-10 12:00"))
+        self.assertTrue(df["timestamp"].is_unique)
+
+        cached = self.fGet("2020-03-10 12:30")
+        self.assertEqual(self.db.queries, [(utc("2020-03-10"), None)])
+        self.assertEqual(self.stats(), (3, 3))
+        pd.testing.assert_frame_equal(cached, df)
+
+    def test_blocks_settle_before_they_are_stored(self):
+        self.fGet("2020-03-10 03:00")
+        # The block of 2020-03-09 ended only 3 hours ago, late data may still arrive
+        self.assertEqual(self.files(), ["m_1h_20200307T000000.parquet", "m_1h_20200308T000000.parquet"])
+        self.assertEqual(self.db.queries[-1], (pd.Timestamp("2020-03-09", tz="UTC"), None))
+
+        self.fGet("2020-03-10 06:00")
+        self.assertEqual(len(self.files()), 3)
+
+    def test_missing_runs_are_merged(self):
+        self.fGet("2020-03-12 12:00", dStart=5)
+        for day in ("20200307", "20200309", "20200310"):
+            os.remove(os.path.join(self.path, f"m_1h_{day}T000000.parquet"))
+
+        utc = lambda t: pd.Timestamp(t, tz="UTC")
+        df = self.fGet("2020-03-12 12:00", dStart=5)
+        self.assertEqual(self.db.queries, [(utc("2020-03-07"), utc("2020-03-08")), (utc("2020-03-09"), utc("2020-03-11")),
+                                           (utc("2020-03-12"), None)])
+        # From 2020-03-07 12:00 up to the last hour before now
+        self.assertEqual(len(df), 5 * 24)
+        self.assertTrue(df["timestamp"].is_monotonic_increasing)
+
+    def test_shifted_timestamps(self):
+        shift = pd.Timedelta("1h")
+        df = self.fGet("2020-03-10 12:30", shift=shift)
+
+        block = self.handler.queryCache.fGet("m", "1h", pd.Timestamp("2020-03-08", tz="UTC"))
+        self.assertEqual(len(block), 24)
+        self.assertEqual(block["timestamp"].iloc[0], pd.Timestamp("2020-03-08 01:00", tz="UTC"))
+        self.assertEqual(block["timestamp"].iloc[-1], pd.Timestamp("2020-03-09 00:00", tz="UTC"))
+        self.assertEqual(df["timestamp"].iloc[0], pd.Timestamp("2020-03-07 13:00", tz="UTC"))
+        self.assertTrue(df["timestamp"].is_unique)
+
+    def test_end_of_time_frame(self):
+        df = self.fGet("2020-03-10 12:30", dStart=3, dEnd=1)
+        self.assertEqual(df["timestamp"].iloc[-1], pd.Timestamp("2020-03-09 11:00", tz="UTC"))
+        # The time frame ends in a closed block, nothing is loaded without the cache
+        self.assertNotIn(None, [q[1] for q in self.db.queries])
+
+
+class SOAIQueryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_least_recently_used_files_are_evicted(self):
+        data = pd.DataFrame({"timestamp": pd.date_range("2020-01-01", periods=24, freq="1h", tz="UTC"), "no2": 1.0})
+        days = pd.date_range("2020-01-01", periods=4, freq="1D", tz="UTC")
+
+        cache = SOAIQueryCache(self.path, maxSize=10 ** 9)
+        cache.fPut("m", "1h", days[0], data)
+        size = cache.fGetStats()["size"]
+        cache.maxSize = int(3.5 * size)
+
+        for i, day in enumerate(days[:3]):
+            cache.fPut("m", "1h", day, data)
+            filename = glob.glob(os.path.join(self.path, f"*{day.strftime('%Y%m%d')}*"))[0]
+            os.utime(filename, (1000 + i, 1000 + i))
+
+        # Reading the oldest file makes the second file the least recently used one
+        self.assertIsNotNone(cache.fGet("m", "1h", days[0]))
+        cache.fPut("m", "1h", days[3], data)
+
+        self.assertIsNone(cache.fGet("m", "1h", days[1]))
+        for day in (days[0], days[2], days[3]):
+            self.assertIsNotNone(cache.fGet("m", "1h", day))
+        self.assertEqual(cache.fGetStats()["files"], 3)
+
+    def test_unreadable_file_is_a_miss(self):
+        cache = SOAIQueryCache(self.path)
+        day = pd.Timestamp("2020-01-01", tz="UTC")
+        cache.fPut("m", "1h", day, pd.DataFrame({"no2": [1.0]}))
+        filename = glob.glob(os.path.join(self.path, "*.parquet"))[0]
+        with open(filename, "r+b") as f:
+            f.truncate(10)
+
+        self.assertIsNone(cache.fGet("m", "1h", day))
+        self.assertFalse(os.path.exists(filename))
+        self.assertEqual(cache.fGetStats()["misses"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
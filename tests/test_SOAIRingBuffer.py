@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from SOAI.tools.SOAIRingBuffer import SOAIRingBuffer, SOAIRingBufferStore
+
+
+class SOAIRingBufferTest(unittest.TestCase):
+
+    fields = ["r2", "no2"]
+
+    def assertBufferEqual(self, buffer, reference):
+        timestamps = sorted(reference)
+        self.assertEqual(len(buffer), len(timestamps))
+        for i, field in enumerate(self.fields):
+            windowTimestamps, windowValues = buffer.fWindow(field)
+            np.testing.assert_array_equal(windowTimestamps, timestamps)
+            np.testing.assert_array_equal(windowValues, [reference[t][i] for t in timestamps])
+
+    def test_empty_append(self):
+        buffer = SOAIRingBuffer(self.fields, 4)
+        buffer.fAppend(np.array([], dtype=np.int64), np.empty((2, 0)))
+        self.assertEqual(len(buffer), 0)
+        self.assertIsNone(buffer.fLatestTimestamp())
+
+        buffer.fAppend([5], [[1.0], [2.0]])
+        buffer.fAppend([], [])
+        self.assertEqual(buffer.fLatestTimestamp(), 5)
+
+    def test_against_dict(self):
+        capacity = 8
+        rng = np.random.RandomState(0)
+        buffer = SOAIRingBuffer(self.fields, capacity)
+        reference = {}
+        latest = 0
+
+        for _ in range(200):
+            # Batches overlap the newest values, contain duplicates and are sometimes longer than the capacity
+            n = rng.randint(0, 2 * capacity)
+            timestamps = latest - rng.randint(0, capacity + 4) + rng.randint(0, 3 * capacity, size=n)
+            values = rng.uniform(size=(len(self.fields), n))
+            buffer.fAppend(timestamps, values)
+
+            batch = {}
+            for i, t in enumerate(timestamps):
+                batch[int(t)] = tuple(values[:, i])
+            newest = max(reference) if reference else None
+            for t in sorted(batch):
+                if newest is None or t > newest:
+                    reference[t] = batch[t]
+                elif t in reference:
+                    reference[t] = batch[t]
+            reference = {t: reference[t] for t in sorted(reference)[-capacity:]}
+            latest = max(reference) if reference else 0
+
+            self.assertBufferEqual(buffer, reference)
+            self.assertEqual(buffer.fLatestTimestamp(), max(reference) if reference else None)
+
+    def test_window_is_a_view(self):
+        buffer = SOAIRingBuffer(self.fields, 3)
+        buffer.fAppend([1, 2, 3, 4], [[1, 2, 3, 4], [5, 6, 7, 8]])
+        timestamps, values = buffer.fWindow("no2", 2)
+        np.testing.assert_array_equal(timestamps, [3, 4])
+        np.testing.assert_array_equal(values, [7, 8])
+        self.assertIs(values.base, buffer.values)
+
+
+class SOAIRingBufferStoreTest(unittest.TestCase):
+
+    def test_latest_frame_and_evict(self):
+        store = SOAIRingBufferStore(["no2"], 4)
+        index = pd.to_datetime(["2020-01-01 10:00", "2020-01-01 11:00", "2020-01-02 10:00"], utc=True)
+        store.fAppendFrame(pd.DataFrame({"sensorID": ["a", "a", "b"], "no2": [1.0, 2.0, 3.0]}, index=index))
+
+        latest = store.fLatestFrame()
+        self.assertEqual(latest["sensorID"].tolist(), ["a", "b"])
+        self.assertEqual(latest["no2"].tolist(), [2.0, 3.0])
+        self.assertEqual(store.fWatermark(), pd.Timestamp("2020-01-02 10:00", tz="UTC"))
+
+        self.assertEqual(store.fLatestFrame(since="2020-01-02")["sensorID"].tolist(), ["b"])
+        self.assertEqual(store.fEvict(pd.Timestamp("2020-01-02", tz="UTC")), 1)
+        self.assertEqual(len(store), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
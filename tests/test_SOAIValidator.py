@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from SOAI.handler.SOAIDataHandler import SOAIDataHandler
+from SOAI.handler.SOAIValidator import SOAIValidator, SOAIRangeRule, SOAISentinelRule, SOAIMonotonicRule, SOAIDuplicateRule
+
+
+class SOAIValidatorTest(unittest.TestCase):
+
+    def test_rejected_rows_per_rule(self):
+        data = pd.DataFrame({"hum": [50, 101, 120, 80, np.nan],
+                             "r1": [1, -1, 2, 3, 4],
+                             "r2": [1, 2, -1, 3, 4]})
+        validator = SOAIValidator(SOAIDataHandler.RULES_OPENAIR)
+
+        df = validator.fValidate(data)
+        self.assertEqual(df["hum"].tolist(), [50, 80])
+        self.assertEqual(df.index.tolist(), [0, 1])
+
+        # A row which fails several rules is counted for every rule
+        stats = validator.fGetStats()
+        self.assertEqual(stats["rows"], 5)
+        self.assertEqual(stats["rejected"], 3)
+        self.assertEqual(stats["rules"], {"hum in [-inf, 100]": 3, "r1 not in [-1]": 1, "r2 not in [-1]": 1})
+
+        validator.fValidate(data.drop(columns="r2"))
+        stats = validator.fGetStats()
+        self.assertEqual(stats["rows"], 10)
+        self.assertEqual(stats["rules"]["r2 not in [-1]"], 1)
+
+    def test_nan_handling(self):
+        data = pd.DataFrame({"x": [np.nan, -1.0, 5.0, 20.0]})
+
+        np.testing.assert_array_equal(SOAIRangeRule("x", 0, 10).fMask(data), [False, False, True, False])
+        np.testing.assert_array_equal(SOAIRangeRule("x", 0, 10, allowNaN=True).fMask(data), [True, False, True, False])
+        np.testing.assert_array_equal(SOAIRangeRule("x", low=0).fMask(data), [False, False, True, True])
+        np.testing.assert_array_equal(SOAISentinelRule("x").fMask(data), [True, False, True, True])
+        np.testing.assert_array_equal(SOAISentinelRule("x", [-1, 20], allowNaN=False).fMask(data), [False, False, True, False])
+
+    def test_same_as_query(self):
+        rng = np.random.RandomState(0)
+        n = 2000
+        data = pd.DataFrame({"hum": rng.choice([np.nan, 99.5, 100, 100.5, 40], n),
+                             "r1": rng.choice([np.nan, -1, 0, 7], n),
+                             "r2": rng.choice([np.nan, -1, 1, -1.5], n),
+                             "temp": rng.uniform(size=n)})
+
+        expected = data.query("hum <= 100 and r1!=-1 and r2!=-1").reset_index(drop=True)
+        pd.testing.assert_frame_equal(SOAIValidator(SOAIDataHandler.RULES_OPENAIR).fValidate(data), expected)
+
+    def test_monotonic(self):
+        data = pd.DataFrame({"timestamp": pd.to_datetime(["2020-01-01 01:00", "2020-01-01 00:00", "2020-01-01 02:00",
+                                                          "2020-01-01 02:00", "2020-01-01 01:30"], utc=True),
+                             "sensorID": ["a", "b", "a", "b", "b"]})
+
+        np.testing.assert_array_equal(SOAIMonotonicRule(by=None).fMask(data), [True, False, True, False, False])
+        np.testing.assert_array_equal(SOAIMonotonicRule(by=None, strict=False).fMask(data), [True, False, True, True, False])
+        np.testing.assert_array_equal(SOAIMonotonicRule(by="sensorID").fMask(data), [True, True, True, True, False])
+
+        integers = data.assign(timestamp=data["timestamp"].values.astype("datetime64[ns]").astype(np.int64))
+        np.testing.assert_array_equal(SOAIMonotonicRule(by="sensorID").fMask(integers), [True, True, True, True, False])
+        self.assertEqual(len(SOAIMonotonicRule().fMask(data.iloc[:0])), 0)
+
+    def test_duplicates(self):
+        data = pd.DataFrame({"timestamp": pd.to_datetime(["2020-01-01 00:00", "2020-01-01 00:00", "2020-01-01 00:00",
+                                                          "2020-01-01 01:00"], utc=True),
+                             "sensorID": ["a", "b", "a", "a"]})
+
+        np.testing.assert_array_equal(SOAIDuplicateRule().fMask(data), [False, True, True, True])
+        np.testing.assert_array_equal(SOAIDuplicateRule(keep="first").fMask(data), [True, True, False, True])
+        np.testing.assert_array_equal(SOAIDuplicateRule(by=None).fMask(data), [False, False, True, True])
+
+    def test_lanuv_keeps_the_last_duplicate(self):
+        # Unsorted, with more rows than the size below which pandas uses insertion sort
+        timestamps = pd.date_range("2020-01-01", periods=200, freq="1h", tz="UTC")
+        data = pd.DataFrame({"timestamp": np.concatenate([timestamps[::-1], timestamps]),
+                             "station": "VKCL",
+                             "no2": np.concatenate([np.zeros(200), np.ones(200)])})
+
+        df = SOAIDataHandler()._fCheckLanuv(data)
+        self.assertEqual(len(df), 200)
+        self.assertTrue(df["timestamp"].is_monotonic_increasing)
+        self.assertEqual(df["no2"].unique().tolist(), [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()